@@ -0,0 +1,144 @@
+"""
+录制范围：全屏、屏幕区域或单个窗口，并转换为屏幕采集设备（gdigrab / x11grab）自身的参数，
+让 ffmpeg 只抓取需要的像素，而不是抓取整个桌面后再缩放。
+
+录制范围用 dict 表示：
+    {"mode": "desktop"}
+    {"mode": "region", "x": 100, "y": 50, "width": 1280, "height": 720}
+    {"mode": "window", "title": "Black Myth: Wukong", "x": ..., "y": ..., "width": ..., "height": ...}
+窗口模式的坐标是开始录制时窗口客户区在屏幕上的位置，仅用于记录和换算鼠标坐标，
+ffmpeg 会按标题跟随窗口。键鼠事件中的坐标始终是屏幕坐标，减去 x/y 即为画面内坐标。
+"""
+import os
+import sys
+
+CAPTURE_DESKTOP = "desktop"
+CAPTURE_REGION = "region"
+CAPTURE_WINDOW = "window"
+
+
+def _even(v):
+    # libx264 + yuv420p 要求宽高为偶数
+    return max(2, int(v) // 2 * 2)
+
+
+def desktop_capture(screen_size):
+    return {"mode": CAPTURE_DESKTOP, "x": 0, "y": 0, "width": screen_size[0], "height": screen_size[1]}
+
+
+def region_capture(x, y, width, height, screen_size):
+    """构造区域录制范围：裁剪到屏幕内并把宽高取为偶数。区域为空时抛出 ValueError。"""
+    screen_width, screen_height = screen_size
+    x0, y0 = max(0, min(x, x + width)), max(0, min(y, y + height))
+    x1, y1 = min(screen_width, max(x, x + width)), min(screen_height, max(y, y + height))
+    if x1 - x0 < 2 or y1 - y0 < 2:
+        raise ValueError(f"录制区域无效: {x},{y} {width}x{height}")
+    return {"mode": CAPTURE_REGION, "x": int(x0), "y": int(y0), "width": _even(x1 - x0), "height": _even(y1 - y0)}
+
+
+def window_capture(title, window_id=None):
+    """
+    构造窗口录制范围。Windows 下同时记录窗口客户区的屏幕坐标，找不到窗口时抛出 ValueError；
+    Linux 下 x11grab 按 window_id 抓取，未提供时抛出 ValueError。
+    """
+    capture = {"mode": CAPTURE_WINDOW, "title": title}
+    if sys.platform != "win32":
+        if window_id is None:
+            raise ValueError("Linux 下窗口录制需要提供 window_id")
+        capture["window_id"] = window_id
+    rect = get_window_rect(title)
+    if sys.platform == "win32" and rect is None:
+        raise ValueError(f"未找到窗口: {title}")
+    if rect:
+        x, y, width, height = rect
+        capture.update({"x": x, "y": y, "width": _even(width), "height": _even(height)})
+    return capture
+
+
+def even_size_filter(capture, output_size=None):
+    """
+    窗口模式的视频滤镜：ffmpeg 抓取的是窗口实际的客户区尺寸，可能是奇数，而 capture 中记录的是取偶后的尺寸，
+    因此总是加滤镜：需要缩小时缩放到 output_size，否则裁掉多出的一行/一列，保证 libx264 + yuv420p 可以编码。
+    """
+    if output_size and tuple(output_size) != capture_size(capture):
+        return f'scale={output_size[0]}:{output_size[1]}'
+    return 'crop=trunc(iw/2)*2:trunc(ih/2)*2'
+
+
+def capture_size(capture):
+    """录制画面的尺寸；窗口尺寸未知时返回 None。"""
+    if "width" in capture and "height" in capture:
+        return capture["width"], capture["height"]
+    return None
+
+
+def fit_within(size, bound):
+    """等比缩小 size 使其不超过 bound，不放大，宽高取偶数。"""
+    width, height = size
+    factor = min(1.0, bound[0] / width, bound[1] / height)
+    return _even(width * factor), _even(height * factor)
+
+
+def grabber_input_args(capture, framerate):
+    """录制范围对应的屏幕采集输入参数（从 -f 到 -i）。"""
+    mode = capture["mode"]
+    if sys.platform == "win32":
+        args = ['-f', 'gdigrab', '-framerate', str(framerate)]
+        if mode == CAPTURE_WINDOW:
+            return args + ['-i', f'title={capture["title"]}']
+        if mode == CAPTURE_REGION:
+            args += ['-offset_x', str(capture["x"]), '-offset_y', str(capture["y"])]
+        return args + ['-video_size', f'{capture["width"]}x{capture["height"]}', '-i', 'desktop']
+
+    # Linux: x11grab，区域偏移写在显示名后面
+    display = os.environ.get("DISPLAY", ":0.0")
+    args = ['-f', 'x11grab', '-framerate', str(framerate)]
+    if mode == CAPTURE_WINDOW:
+        if "window_id" not in capture:
+            raise ValueError("Linux 下窗口录制需要提供 window_id")
+        return args + ['-window_id', str(capture["window_id"]), '-i', display]
+    args += ['-video_size', f'{capture["width"]}x{capture["height"]}']
+    if mode == CAPTURE_REGION:
+        display = f'{display}+{capture["x"]},{capture["y"]}'
+    return args + ['-i', display]
+
+
+############################## Windows 窗口枚举
+def list_windows():
+    """返回所有可见且有标题的顶层窗口标题（仅 Windows，其他平台返回空列表）。"""
+    if sys.platform != "win32":
+        return []
+    import ctypes
+    from ctypes import wintypes
+    user32 = ctypes.windll.user32
+    titles = []
+
+    @ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HWND, wintypes.LPARAM)
+    def callback(hwnd, _):
+        if user32.IsWindowVisible(hwnd):
+            length = user32.GetWindowTextLengthW(hwnd)
+            if length:
+                buf = ctypes.create_unicode_buffer(length + 1)
+                user32.GetWindowTextW(hwnd, buf, length + 1)
+                titles.append(buf.value)
+        return True
+
+    user32.EnumWindows(callback, 0)
+    return sorted(set(titles))
+
+
+def get_window_rect(title):
+    """窗口客户区在屏幕上的 (x, y, width, height)（仅 Windows），找不到时返回 None。"""
+    if sys.platform != "win32":
+        return None
+    import ctypes
+    from ctypes import wintypes
+    user32 = ctypes.windll.user32
+    hwnd = user32.FindWindowW(None, title)
+    if not hwnd:
+        return None
+    rect = wintypes.RECT()
+    user32.GetClientRect(hwnd, ctypes.byref(rect))
+    origin = wintypes.POINT(0, 0)
+    user32.ClientToScreen(hwnd, ctypes.byref(origin))
+    return origin.x, origin.y, rect.right - rect.left, rect.bottom - rect.top
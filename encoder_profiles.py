@@ -0,0 +1,142 @@
+"""
+录屏编码配置，以及在本机上比较各配置编码开销的基准测试。
+
+    python encoder_profiles.py --benchmark [--duration 20] [--size 1920x1080] [--profiles default,low_cpu]
+
+基准测试用 ffmpeg 的 lavfi testsrc 作为画面源（加一路正弦波作为音频），按各配置编码到临时文件，
+报告编码帧率、相对实时的倍数、CPU 占用（100% = 一个核）和每分钟视频的字节数。
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# 每个配置的字段：
+# - preset / tune: x264 的 preset 与可选的 tune
+# - crf 或 bitrate: 二选一，bitrate 形如 "4000k"，给定时使用码率控制
+# - framerate: 录制帧率
+# - keyint: 关键帧间隔（帧）
+# - threads: 编码线程数，0 表示由 x264 自动决定
+# - audio_bitrate: mp3 音频码率
+ENCODER_PROFILES = {
+    # 原先写死的参数
+    "default": {"preset": "ultrafast", "crf": 18, "framerate": 24, "keyint": 250, "threads": 0, "tune": None, "audio_bitrate": "192k"},
+    # 配置较弱的机器：降低帧率、限制线程，尽量不抢游戏的 CPU
+    "low_cpu": {"preset": "ultrafast", "crf": 26, "framerate": 15, "keyint": 150, "threads": 2, "tune": "zerolatency", "audio_bitrate": "128k"},
+    # 用更多 CPU 换更小的文件
+    "balanced": {"preset": "veryfast", "crf": 23, "framerate": 24, "keyint": 240, "threads": 0, "tune": None, "audio_bitrate": "160k"},
+    # 固定码率，磁盘占用可预估
+    "small_files": {"preset": "veryfast", "bitrate": "2500k", "framerate": 24, "keyint": 240, "threads": 0, "tune": None, "audio_bitrate": "128k"},
+    # 高帧率，适合快节奏游戏
+    "high_fps": {"preset": "ultrafast", "crf": 20, "framerate": 60, "keyint": 600, "threads": 0, "tune": "zerolatency", "audio_bitrate": "192k"},
+}
+DEFAULT_PROFILE = "default"
+
+
+def get_profile(name):
+    try:
+        return ENCODER_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"未知的编码配置: {name}") from None
+
+
+def video_encoder_args(profile):
+    """配置对应的 ffmpeg 视频编码参数（不含输入与帧率）。"""
+    args = ['-c:v', 'libx264', '-preset', profile["preset"]]
+    if profile.get("tune"):
+        args += ['-tune', profile["tune"]]
+    if profile.get("bitrate"):
+        rate = profile["bitrate"]
+        bufsize = f"{int(rate.rstrip('kK')) * 2}k"
+        args += ['-b:v', rate, '-maxrate', rate, '-bufsize', bufsize]
+    else:
+        args += ['-crf', str(profile["crf"])]
+    args += ['-g', str(profile["keyint"]), '-threads', str(profile["threads"]), '-pix_fmt', 'yuv420p']
+    return args
+
+
+def audio_encoder_args(profile):
+    return ['-c:a', 'libmp3lame', '-b:a', profile["audio_bitrate"]]
+
+
+############################## 基准测试
+_BENCH_RE = re.compile(r"bench: utime=([\d.]+)s stime=([\d.]+)s rtime=([\d.]+)s")
+_FRAME_RE = re.compile(r"frame=\s*(\d+)")
+
+
+def benchmark_profile(ffmpeg_path, name, duration=20, size="1920x1080", source="testsrc"):
+    """用 lavfi 测试源按指定配置编码 duration 秒，返回测量结果 dict。"""
+    profile = get_profile(name)
+    fps = profile["framerate"]
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "bench.mp4")
+        cmd = [
+            ffmpeg_path, '-y', '-benchmark',
+            '-f', 'lavfi', '-i', f'{source}=size={size}:rate={fps}',
+            '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=48000',
+            '-t', str(duration),
+            *video_encoder_args(profile),
+            *audio_encoder_args(profile),
+            output,
+        ]
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        stderr = proc.stderr.decode("utf-8", errors="replace")
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg 编码失败（{name}）:\n" + "\n".join(stderr.splitlines()[-10:]))
+        size_bytes = os.path.getsize(output)
+
+    bench = _BENCH_RE.search(stderr)
+    if not bench:
+        raise RuntimeError(f"未能解析 ffmpeg -benchmark 输出（{name}）")
+    utime, stime, rtime = (float(v) for v in bench.groups())
+    frames = [int(v) for v in _FRAME_RE.findall(stderr)]
+    frames = frames[-1] if frames else round(duration * fps)
+    encode_fps = frames / rtime if rtime > 0 else float("inf")
+    return {
+        "profile": name,
+        "frames": frames,
+        "encode_fps": encode_fps,
+        "realtime_factor": encode_fps / fps,
+        "cpu_percent": (utime + stime) / rtime * 100 if rtime > 0 else 0.0,
+        "bytes_per_minute": size_bytes / duration * 60,
+    }
+
+
+def print_results(results):
+    print(f"{'配置':<14}{'编码fps':>10}{'实时倍数':>10}{'CPU%':>10}{'MB/分钟':>12}")
+    for r in results:
+        print(f"{r['profile']:<14}{r['encode_fps']:>10.1f}{r['realtime_factor']:>10.2f}"
+              f"{r['cpu_percent']:>10.0f}{r['bytes_per_minute'] / 1e6:>12.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="录屏编码配置基准测试")
+    parser.add_argument("--benchmark", action="store_true", help="运行基准测试；不指定时只列出配置")
+    parser.add_argument("--profiles", default=",".join(ENCODER_PROFILES), help="逗号分隔的配置名")
+    parser.add_argument("--duration", type=float, default=20, help="每个配置编码的秒数")
+    parser.add_argument("--size", default="1920x1080", help="测试画面尺寸")
+    parser.add_argument("--source", default="testsrc", help="lavfi 画面源，如 testsrc / testsrc2 / mandelbrot")
+    parser.add_argument("--ffmpeg", default=shutil.which("ffmpeg") or "ffmpeg", help="ffmpeg 可执行文件路径")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.profiles.split(",") if n.strip()]
+    for name in names:
+        get_profile(name)
+    if not args.benchmark:
+        for name in names:
+            print(name, ENCODER_PROFILES[name])
+        return 0
+
+    results = []
+    for name in names:
+        print(f"正在测试 {name} ...", file=sys.stderr)
+        results.append(benchmark_profile(args.ffmpeg, name, args.duration, args.size, args.source))
+    print_results(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
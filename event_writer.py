@@ -0,0 +1,205 @@
+import json
+import queue
+import threading
+import time
+
+from random_walk_fool.event_log import BinaryLogWriter
+
+# --- 默认参数 ---
+DEFAULT_QUEUE_SIZE = 65536     # 队列上限，超过后丢弃新事件而不是阻塞监听线程
+DEFAULT_BATCH_SIZE = 512       # 累积多少条事件写一次盘
+DEFAULT_FLUSH_INTERVAL = 0.5   # 最长多少秒必须写一次盘
+FIRST_FRAME_TIMEOUT = 5.0      # 最多等待多少秒 ffmpeg 报告首帧时间
+
+_STOP = object()
+
+
+class _JsonlSink:
+    def __init__(self, path):
+        self._f = open(path, "a", encoding="utf-8")
+
+    def write_many(self, events):
+        self._f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in events))
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+
+# 支持的事件日志格式 -> 写入端
+SINKS = {
+    "jsonl": _JsonlSink,
+    "binary": BinaryLogWriter,
+}
+
+
+class EventWriter:
+    """
+    后台事件写入器：
+    监听回调只调用 put() 把事件放进有界队列，由单独的写线程批量序列化并写入文件。
+    队列满时直接丢弃事件并计数，保证 pynput 的钩子线程永远不会被磁盘 IO 卡住。
+    传入 clock 时，写线程会先等待首帧时间确定，再为每个事件补充 frame_index。
+    分段模式下（segment_frames 不为空）按 frame_index // segment_frames 把事件写入
+    segment_path(index) 对应的文件，每完成一段调用一次 on_rotate(index)。
+    """
+
+    def __init__(self, path, fmt="jsonl", clock=None, max_queue=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, segment_frames=None, segment_path=None, on_rotate=None):
+        if fmt not in SINKS:
+            raise ValueError(f"未知的事件日志格式: {fmt}")
+        if segment_frames and (clock is None or segment_path is None):
+            raise ValueError("分段写入需要 clock 和 segment_path")
+        self.segment_frames = segment_frames
+        self.segment_path = segment_path
+        self.on_rotate = on_rotate
+        self.segment = 0
+        self.path = segment_path(0) if segment_frames else path
+        self.fmt = fmt
+        self.clock = clock
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._sink = None
+        self._closed = False
+        # 统计计数。dropped 与 max_depth 会被多个监听线程和写线程同时修改，更新时持有 _stats_lock
+        self._stats_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.max_depth = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="EventWriter", daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, event):
+        """在监听线程中调用，永不阻塞。返回事件是否成功入队。"""
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._count_dropped()
+            return False
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            with self._stats_lock:
+                self.max_depth = max(self.max_depth, depth)
+        return True
+
+    def _count_dropped(self):
+        with self._stats_lock:
+            self.dropped += 1
+
+    def close(self, timeout=None):
+        """停止接收新事件，等待写线程把队列中剩余事件全部写完。"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None:
+            return
+        # 哨兵必须入队，队列满时阻塞等待写线程腾出位置
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": self.max_depth,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+        }
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # --- 写线程 ---
+    def _write_to_sink(self, events):
+        if not events:
+            return
+        written = len(events)
+        try:
+            self._sink.write_many(events)
+        except (TypeError, ValueError):
+            # 写入端先编码整批再写盘，失败时什么都没写入；改为逐个写入，只丢弃无法编码的那条事件
+            written = 0
+            for event in events:
+                try:
+                    self._sink.write_many((event,))
+                except (TypeError, ValueError) as e:
+                    print("事件写入失败，已丢弃:", e)
+                    self._count_dropped()
+                else:
+                    written += 1
+        self._sink.flush()
+        self.written += written
+        self.batches += 1
+
+    def _rotate(self, segment):
+        """切换到第 segment 段；中间没有事件的分段也生成（空的）文件，保证与视频分段一一对应。"""
+        while self.segment < segment:
+            self._sink.close()
+            finished = self.segment
+            self.segment += 1
+            self.path = self.segment_path(self.segment)
+            self._sink = SINKS[self.fmt](self.path)
+            if self.on_rotate:
+                self.on_rotate(finished)
+
+    def _write_batch(self, batch):
+        if self.clock:
+            for e in batch:
+                e["frame_index"] = self.clock.frame_index(e["time"])
+        if not self.segment_frames:
+            self._write_to_sink(batch)
+            return
+        start = 0
+        for i, e in enumerate(batch):
+            # 只向前轮转：跨线程造成的轻微乱序事件留在当前分段
+            if e["frame_index"] // self.segment_frames > self.segment:
+                self._write_to_sink(batch[start:i])
+                self._rotate(e["frame_index"] // self.segment_frames)
+                start = i
+        self._write_to_sink(batch[start:])
+
+    def _run(self):
+        self._sink = SINKS[self.fmt](self.path)
+        try:
+            # 帧号依赖首帧偏移，确定之前事件留在队列里
+            if self.clock:
+                self.clock.wait_ready(FIRST_FRAME_TIMEOUT)
+            batch = []
+            last_flush = time.monotonic()
+            stopping = False
+            while not stopping:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - last_flush))
+                try:
+                    item = self._queue.get(timeout=timeout)
+                    if item is _STOP:
+                        stopping = True
+                    else:
+                        batch.append(item)
+                except queue.Empty:
+                    pass
+
+                if batch and (stopping or len(batch) >= self.batch_size
+                              or time.monotonic() - last_flush >= self.flush_interval):
+                    self._write_batch(batch)
+                    batch = []
+                if not batch:
+                    last_flush = time.monotonic()
+                    # 没有新事件时也按时钟轮转，分段边界一过就能交付上一段
+                    if self.segment_frames and not stopping:
+                        current = self.clock.frame_index(self.clock.now()) // self.segment_frames
+                        if current > self.segment:
+                            self._rotate(current)
+        finally:
+            self._sink.close()
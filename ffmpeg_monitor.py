@@ -0,0 +1,134 @@
+import collections
+import json
+import re
+import threading
+
+_START_RE = re.compile(r"start:\s*(-?\d+(?:\.\d+)?)")
+_SEGMENT_RE = re.compile(r"\[segment @ [^\]]+\] Opening '(.+?)' for writing")
+
+
+class FfmpegStderrReader:
+    """
+    在后台线程中持续读取 ffmpeg 的 stderr，防止管道写满阻塞 ffmpeg。
+    解析 "Input #0" 的 start 时间（屏幕采集首帧的时间戳）并通过 on_input_start 回调报告；
+    分段录制时 segment muxer 每打开一个新文件，通过 on_segment_opened 回调报告文件名。
+    同时保留最后若干行输出，便于 ffmpeg 异常退出时排查。
+    """
+
+    def __init__(self, stream, on_input_start=None, on_segment_opened=None, tail_lines=50):
+        self._stream = stream
+        self._on_input_start = on_input_start
+        self._on_segment_opened = on_segment_opened
+        self.tail = collections.deque(maxlen=tail_lines)
+        self.input_start = None
+        self._thread = threading.Thread(target=self._run, name="FfmpegStderr", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        in_input0 = False
+        for raw in iter(self._stream.readline, b""):
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            self.tail.append(line)
+            if self._on_segment_opened and line.startswith("[segment @"):
+                m = _SEGMENT_RE.search(line)
+                if m:
+                    self._on_segment_opened(m.group(1))
+                continue
+            if self.input_start is not None:
+                continue
+            if line.startswith("Input #0"):
+                in_input0 = True
+            elif line.startswith(("Input #", "Output #", "Stream mapping")):
+                in_input0 = False
+            elif in_input0:
+                m = _START_RE.search(line)
+                if m:
+                    self.input_start = float(m.group(1))
+                    if self._on_input_start:
+                        self._on_input_start(self.input_start)
+        self._stream.close()
+
+
+# -progress 输出中需要保留的字段及其解析方式
+_PROGRESS_FIELDS = ["out_time_us", "frame", "fps", "speed", "dup_frames", "drop_frames", "bitrate", "total_size"]
+_SLOW_SPEED = 0.98  # 低于该速度认为编码跟不上实时
+
+
+def _parse_number(value):
+    """解析 -progress 中的数值，如 "24.00"、"1.01x"、"2345.6kbits/s"；N/A 返回 None。"""
+    value = value.strip()
+    for suffix in ("kbits/s", "x"):
+        if value.endswith(suffix):
+            value = value[:-len(suffix)]
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    return int(number) if number.is_integer() and "." not in value else number
+
+
+class FfmpegProgressReader:
+    """
+    读取 ffmpeg -progress pipe:1 的输出。ffmpeg 每隔约 0.5 秒输出一组 key=value，
+    以 progress=continue/end 结束。每组解析成一条采样，记录帧数、编码 fps、速度、重复/丢弃帧数和码率，
+    latest 为最新一条，samples 为全部采样（按列存储以节省内存），summary() 给出整场录制的汇总。
+    """
+
+    def __init__(self, stream, on_update=None):
+        self._stream = stream
+        self._on_update = on_update
+        self.latest = {}
+        self.samples = {name: [] for name in _PROGRESS_FIELDS}
+        self._thread = threading.Thread(target=self._run, name="FfmpegProgress", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+    def _run(self):
+        block = {}
+        for raw in iter(self._stream.readline, b""):
+            key, sep, value = raw.decode("utf-8", errors="replace").strip().partition("=")
+            if not sep:
+                continue
+            if key != "progress":
+                if key in _PROGRESS_FIELDS:
+                    block[key] = _parse_number(value)
+                continue
+            sample = {name: block.get(name) for name in _PROGRESS_FIELDS}
+            for name in _PROGRESS_FIELDS:
+                self.samples[name].append(sample[name])
+            self.latest = sample
+            block = {}
+            if self._on_update:
+                self._on_update(sample)
+        self._stream.close()
+
+    def summary(self):
+        speeds = [s for s in self.samples["speed"] if s is not None]
+        latest = self.latest
+        return {
+            "samples": len(self.samples["frame"]),
+            "frames": latest.get("frame"),
+            "duration": (latest.get("out_time_us") or 0) / 1e6,
+            "dup_frames": latest.get("dup_frames"),
+            "drop_frames": latest.get("drop_frames"),
+            "total_size": latest.get("total_size"),
+            "min_speed": min(speeds) if speeds else None,
+            "mean_speed": sum(speeds) / len(speeds) if speeds else None,
+            "slow_fraction": sum(1 for s in speeds if s < _SLOW_SPEED) / len(speeds) if speeds else None,
+        }
+
+    def write_metrics(self, path):
+        """写出指标 sidecar：汇总 + 按列存储的全部采样。"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": self.summary(), "samples": self.samples}, f, ensure_ascii=False)
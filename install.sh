@@ -1,3 +1,4 @@
 pip install pynput mss numpy psutil
+pip install pyautogui
 pip install pyinstaller
 pyinstaller recorder_app.py --onefile --add-binary "C:\Users\wyw\Desktop\ffmpeg\bin\ffmpeg.exe;."
\ No newline at end of file
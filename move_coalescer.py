@@ -0,0 +1,84 @@
+import math
+import threading
+
+# 鼠标移动采样模式（界面下拉框的选项）
+SAMPLING_RAW = "raw"
+SAMPLING_PER_FRAME = "per-frame"
+SAMPLING_CHOICES = [SAMPLING_RAW, SAMPLING_PER_FRAME, "30 Hz", "60 Hz", "120 Hz"]
+
+
+def parse_move_sampling(text, framerate):
+    """
+    解析采样模式文本，返回每秒最多输出的 mouse_move 数量；None 表示不降采样。
+    "raw" -> None，"per-frame" -> 视频帧率，"N Hz" -> N。格式错误时抛出 ValueError。
+    """
+    text = (text or "").strip().lower()
+    if text in ("", SAMPLING_RAW):
+        return None
+    if text == SAMPLING_PER_FRAME:
+        return float(framerate)
+    if text.endswith("hz"):
+        text = text[:-2].strip()
+    rate = float(text)
+    if not math.isfinite(rate) or rate <= 0:
+        raise ValueError(f"采样率必须为正数: {text}")
+    return rate
+
+
+class MouseMoveCoalescer:
+    """
+    采集端的鼠标移动合并器。
+    时间轴从 origin 开始按 1/rate_hz 切成时间桶，每个桶最多输出一条 mouse_move：
+    位置取桶内最后一个采样，dx/dy 为桶内所有原始移动的累计位移，
+    因此即使游戏把光标锁定回屏幕中心，轨迹仍然可以由 dx/dy 还原。
+    per-frame 模式下 rate_hz 取视频帧率，origin 取视频起点，每帧恰好对应一个桶。
+    """
+
+    def __init__(self, emit, rate_hz, origin=0.0):
+        self._emit = emit
+        self._interval = 1.0 / rate_hz
+        self.origin = origin
+        self._lock = threading.Lock()
+        self._pending = None     # [x, y, dx, dy, time]
+        self._bucket = None
+        self._last_pos = None
+        # 统计计数
+        self.received = 0
+        self.emitted = 0
+
+    def push(self, x, y, t):
+        """在鼠标监听线程中调用，记录一次原始移动。"""
+        with self._lock:
+            self.received += 1
+            if self._last_pos is None:
+                dx = dy = 0
+            else:
+                dx, dy = x - self._last_pos[0], y - self._last_pos[1]
+            self._last_pos = (x, y)
+
+            bucket = math.floor((t - self.origin) / self._interval)
+            if self._pending is not None and bucket != self._bucket:
+                self._emit_pending()
+            if self._pending is None:
+                self._pending = [x, y, dx, dy, t]
+                self._bucket = bucket
+            else:
+                p = self._pending
+                p[0], p[1], p[4] = x, y, t
+                p[2] += dx
+                p[3] += dy
+
+    def flush(self):
+        """
+        输出尚未写出的移动。点击、按键之前调用，保证日志仍按时间顺序排列；
+        停止录制时调用，保证最后的位置不会丢失。
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._emit_pending()
+
+    def _emit_pending(self):
+        x, y, dx, dy, t = self._pending
+        self._pending = None
+        self.emitted += 1
+        self._emit({"type": "mouse_move", "position": (x, y), "dx": dx, "dy": dy, "time": t})
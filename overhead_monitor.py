@@ -0,0 +1,116 @@
+import csv
+import threading
+
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖，缺失时不采样
+    psutil = None
+
+DEFAULT_INTERVAL = 1.0  # 采样间隔（秒）
+
+_METRICS = ["cpu", "rss", "read_bytes", "write_bytes", "threads"]
+
+
+class OverheadMonitor:
+    """
+    录制器自身开销监控：定期采样录制器进程和 ffmpeg 子进程的 CPU（100% = 一个核）、
+    常驻内存、磁盘读写字节数和线程数，逐行写入 csv sidecar，结束时给出汇总。
+    没有安装 psutil 时 available 为 False，start()/stop() 不做任何事。
+    """
+
+    available = psutil is not None
+
+    def __init__(self, processes, path, clock, interval=DEFAULT_INTERVAL):
+        """processes: {名称: pid}，例如 {"recorder": os.getpid(), "ffmpeg": ffmpeg_pid}。"""
+        self.path = path
+        self.clock = clock
+        self.interval = interval
+        self.names = list(processes)
+        self._pids = dict(processes)
+        self._procs = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {name: {"samples": 0, "cpu_sum": 0.0, "cpu_max": 0.0, "rss_max": 0,
+                              "read_bytes": 0, "write_bytes": 0, "threads_max": 0} for name in self.names}
+
+    def start(self):
+        if not self.available:
+            return self
+        for name, pid in self._pids.items():
+            try:
+                proc = psutil.Process(pid)
+                proc.cpu_percent(None)  # 第一次调用只建立基准
+                self._procs[name] = proc
+            except psutil.Error:
+                pass
+        self._thread = threading.Thread(target=self._run, name="OverheadMonitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _sample(self, proc):
+        with proc.oneshot():
+            cpu = proc.cpu_percent(None)
+            rss = proc.memory_info().rss
+            try:
+                io = proc.io_counters()
+                read_bytes, write_bytes = io.read_bytes, io.write_bytes
+            except (AttributeError, psutil.AccessDenied):  # macOS 没有 io_counters
+                read_bytes = write_bytes = None
+            threads = proc.num_threads()
+        return [cpu, rss, read_bytes, write_bytes, threads]
+
+    def _record(self, name, values):
+        cpu, rss, read_bytes, write_bytes, threads = values
+        st = self._stats[name]
+        st["samples"] += 1
+        st["cpu_sum"] += cpu
+        st["cpu_max"] = max(st["cpu_max"], cpu)
+        st["rss_max"] = max(st["rss_max"], rss)
+        st["threads_max"] = max(st["threads_max"], threads)
+        if read_bytes is not None:
+            st["read_bytes"], st["write_bytes"] = read_bytes, write_bytes
+
+    def _run(self):
+        with open(self.path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["time"] + [f"{name}_{m}" for name in self.names for m in _METRICS])
+            while not self._stop.wait(self.interval):
+                row = [round(self.clock.now(), 3)]
+                for name in self.names:
+                    proc = self._procs.get(name)
+                    values = [None] * len(_METRICS)
+                    if proc is not None:
+                        try:
+                            values = self._sample(proc)
+                            self._record(name, values)
+                        except psutil.NoSuchProcess:
+                            del self._procs[name]
+                        except psutil.Error:
+                            pass
+                    row += ["" if v is None else (round(v, 1) if isinstance(v, float) else v) for v in values]
+                writer.writerow(row)
+                f.flush()
+
+    def summary(self):
+        """每个进程的平均/峰值 CPU、峰值内存、累计读写字节和最大线程数。"""
+        if not self.available:
+            return {}
+        result = {"cpu_count": psutil.cpu_count()}
+        for name, st in self._stats.items():
+            n = st["samples"]
+            result[name] = {
+                "cpu_mean": st["cpu_sum"] / n if n else None,
+                "cpu_max": st["cpu_max"],
+                "rss_max": st["rss_max"],
+                "read_bytes": st["read_bytes"],
+                "write_bytes": st["write_bytes"],
+                "threads_max": st["threads_max"],
+            }
+        return result
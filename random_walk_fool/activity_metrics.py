@@ -0,0 +1,227 @@
+"""
+录制文件的操作强度指标：滑动窗口 APM、按键多样性和鼠标移动距离，用于在训练前筛掉低质量的录制。
+
+    python activity_metrics.py data/record_xxx.jsonl [更多录制文件或目录] [--window 60] [--step 1] [--min-apm 30]
+
+流式读取事件（与 get_event_space 相同的读取路径），每个窗口量用环形缓冲（deque）维护：
+新事件从右端进入，过期事件从左端弹出，每个事件摊还 O(1)，内存只与窗口内的事件数有关。
+每隔 step 秒记录一次窗口 (t - window, t] 内的指标，写成与录制对齐的时间线 csv（时间与事件的 time 同一时钟，
+取 step 的整数倍，新版录制即为视频时间），默认写到录制文件旁的 <录制文件名>.activity.csv：
+    time,actions,apm,keys,mouse_distance
+动作为按键/按钮的按下和滚轮：按住期间系统自动重复产生的按下不算新动作，只有该键或按钮当前没有按住时才计数
+（与 event_columns.pair_press_release 的配对方式相同）。
+另外给出整个录制的汇总（平均/峰值 APM、活跃时间占比、按键种类数、鼠标总移动距离）。
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from collections import deque
+
+from event_decode import iter_event_records
+from get_event_space import find_recordings
+
+DEFAULT_WINDOW = 60.0  # 滑动窗口长度（秒）
+DEFAULT_STEP = 1.0     # 时间线采样间隔（秒）
+TIMELINE_SUFFIX = ".activity.csv"
+
+_ACTION_TYPES = ("key_press", "mouse_press", "mouse_scroll")
+
+
+class SlidingActivity:
+    """窗口 (now - window, now] 内的动作数、不同按键数和鼠标移动距离，同时累计全程总量。"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+        self.actions = deque()     # 动作时间
+        self.keys = deque()        # (时间, 键)
+        self.key_counts = {}       # 键 -> 窗口内按下次数
+        self.moves = deque()       # (时间, 移动距离)
+        self.distance = 0.0
+        self.last_position = None
+        self.held = set()          # 当前按住的 (类型, 键或按钮)
+        self.total_actions = 0
+        self.all_keys = set()
+        self.total_distance = 0.0
+        self.first_time = None
+        self.last_time = None
+
+    def add(self, event, t):
+        if self.first_time is None:
+            self.first_time = t
+        self.last_time = t
+        etype = event['type']
+        if etype == 'key_press' or etype == 'mouse_press':
+            actor = ('key', event.get('key')) if etype == 'key_press' else ('button', event.get('button'))
+            if actor in self.held:
+                etype = None  # 按住时的自动重复
+            else:
+                self.held.add(actor)
+        elif etype == 'key_release':
+            self.held.discard(('key', event.get('key')))
+        elif etype == 'mouse_release':
+            self.held.discard(('button', event.get('button')))
+        if etype in _ACTION_TYPES:
+            self.actions.append(t)
+            self.total_actions += 1
+            if etype == 'key_press':
+                key = event.get('key')
+                self.keys.append((t, key))
+                self.key_counts[key] = self.key_counts.get(key, 0) + 1
+                self.all_keys.add(key)
+        position = event.get('position')
+        if position is not None:
+            if self.last_position is not None:
+                d = math.hypot(position[0] - self.last_position[0], position[1] - self.last_position[1])
+                if d:
+                    self.moves.append((t, d))
+                    self.distance += d
+                    self.total_distance += d
+            self.last_position = position
+
+    def advance(self, now):
+        """弹出时间不晚于 now - window 的事件。"""
+        cutoff = now - self.window
+        actions, keys, moves = self.actions, self.keys, self.moves
+        while actions and actions[0] <= cutoff:
+            actions.popleft()
+        while keys and keys[0][0] <= cutoff:
+            key = keys.popleft()[1]
+            n = self.key_counts[key] - 1
+            if n:
+                self.key_counts[key] = n
+            else:
+                del self.key_counts[key]
+        while moves and moves[0][0] <= cutoff:
+            self.distance -= moves.popleft()[1]
+        if not moves:
+            self.distance = 0.0  # 清掉浮点累加误差
+
+    def snapshot(self):
+        """(动作数, APM, 不同按键数, 鼠标移动距离)，APM 按完整窗口长度折算。"""
+        n = len(self.actions)
+        return n, n * 60.0 / self.window, len(self.key_counts), self.distance
+
+
+def iter_activity(events, window=DEFAULT_WINDOW, step=DEFAULT_STEP, activity=None):
+    """
+    流式产出时间线 (time, actions, apm, keys, mouse_distance)，time 为 step 的整数倍，
+    从第一个事件所在的那一格开始，到覆盖最后一个事件为止。时间倒退的事件按上一个事件的时间计。
+    给出 activity（SlidingActivity）时使用它，结束后可从中读取全程总量。
+    """
+    if activity is None:
+        activity = SlidingActivity(window)
+    k = None
+    last = None
+    for event in events:
+        t = event['time']
+        if last is not None and t < last:
+            t = last
+        if k is None:
+            k = math.floor(t / step)
+        while k * step < t:
+            now = k * step
+            activity.advance(now)
+            yield (now, *activity.snapshot())
+            k += 1
+        activity.add(event, t)
+        last = t
+    if k is None:
+        return
+    while True:
+        now = k * step
+        activity.advance(now)
+        yield (now, *activity.snapshot())
+        if now >= last:
+            return
+        k += 1
+
+
+class ActivitySummary:
+    """整个录制的汇总，逐行接收 iter_activity 的时间线。"""
+
+    def __init__(self):
+        self.samples = 0
+        self.active_samples = 0
+        self.apm_peak = 0.0
+        self.keys_peak = 0
+
+    def add(self, row):
+        _, actions, apm, keys, _ = row
+        self.samples += 1
+        self.active_samples += actions > 0
+        self.apm_peak = max(self.apm_peak, apm)
+        self.keys_peak = max(self.keys_peak, keys)
+
+
+def summarize_activity(file_path, timeline_path=None, window=DEFAULT_WINDOW, step=DEFAULT_STEP):
+    """
+    计算 file_path 的操作强度时间线与汇总。timeline_path 为 None 时写到录制文件旁，为空字符串时不写。
+    返回汇总 dict；文件不存在时返回 None。
+    """
+    if timeline_path is None:
+        timeline_path = os.path.splitext(file_path)[0] + TIMELINE_SUFFIX
+    activity = SlidingActivity(window)
+    summary = ActivitySummary()
+    rows = iter_activity(iter_event_records(file_path), window, step, activity)
+    try:
+        if timeline_path:
+            with open(timeline_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["time", "actions", "apm", "keys", "mouse_distance"])
+                for row in rows:
+                    summary.add(row)
+                    now, actions, apm, keys, distance = row
+                    writer.writerow([round(now, 3), actions, f"{apm:.1f}", keys, f"{distance:.0f}"])
+        else:
+            for row in rows:
+                summary.add(row)
+    except FileNotFoundError:
+        print(f"错误：文件未找到: {file_path}")
+        return None
+
+    duration = 0.0 if activity.first_time is None else activity.last_time - activity.first_time
+    return {
+        "duration": duration,
+        "actions": activity.total_actions,
+        "apm": activity.total_actions * 60.0 / duration if duration else 0.0,
+        "apm_peak": summary.apm_peak,
+        "active_fraction": summary.active_samples / summary.samples if summary.samples else 0.0,
+        "key_diversity": len(activity.all_keys),
+        "key_diversity_peak": summary.keys_peak,
+        "mouse_distance": activity.total_distance,
+        "timeline": timeline_path or None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="录制文件的滑动窗口操作强度指标")
+    parser.add_argument("inputs", nargs="+", help="录制文件或目录")
+    parser.add_argument("--window", type=float, default=DEFAULT_WINDOW, help="滑动窗口长度（秒）")
+    parser.add_argument("--step", type=float, default=DEFAULT_STEP, help="时间线采样间隔（秒）")
+    parser.add_argument("--no-timeline", action="store_true", help="只输出汇总，不写时间线文件")
+    parser.add_argument("--min-apm", type=float, default=None, help="平均 APM 低于该值的录制标记为低质量，并以返回码 1 结束")
+    args = parser.parse_args(argv)
+    if args.window <= 0 or args.step <= 0:
+        parser.error("--window 和 --step 必须为正数")
+
+    low_quality = []
+    for path in args.inputs:
+        for file_path in find_recordings(path):
+            summary = summarize_activity(file_path, "" if args.no_timeline else None, args.window, args.step)
+            if summary is None:
+                continue
+            if args.min_apm is not None and summary["apm"] < args.min_apm:
+                summary["low_quality"] = True
+                low_quality.append(file_path)
+            print(json.dumps({"recording": file_path, **summary}, ensure_ascii=False))
+    if low_quality:
+        print(f"{len(low_quality)} 个录制的平均 APM 低于 {args.min_apm}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
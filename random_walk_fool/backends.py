@@ -0,0 +1,333 @@
+"""
+foolio 的输出后端：把动作计划中的操作（见 event_sampler）落到实处。
+
+    - PyAutoGuiBackend（默认）：用 pyautogui 注入真实的键鼠输入，需要显示环境；
+    - SyntheticRecorderBackend：不注入，按 recorder_app 写出的 .jsonl 格式把操作记成事件，
+      使用虚拟时间（等待直接把时钟拨到截止时间），以最快速度生成任意长的合成录制，用于给 get_event_space 压测；
+    - NullBackend：虚拟时间，丢弃所有操作只计数，用来测 foolio 自身的开销。
+每个后端提供与计划操作同名的方法、position()、close()，以及调度器使用的 clock / wait_until：
+真实后端 wait_until 为 None，由 DeadlineScheduler 自己 sleep + 忙等；虚拟后端（virtual 为 True）直接推进虚拟时钟，
+也不统计定时误差。
+"""
+import json
+import math
+import time
+
+from event_sampler import KEY_DOWN, KEY_TAP, KEY_UP, MOUSE_DOWN, MOUSE_UP, MOVE_REL, MOVE_TO, SCROLL
+
+DEFAULT_SCREEN_SIZE = (1920, 1080)
+DEFAULT_FRAMERATE = 24        # 与 encoder_profiles 的 default 档一致
+DEFAULT_TAP_DURATION = 0.001  # 合成录制中 press 的按下到松开（秒），注入一次按键的耗时量级
+WRITE_BATCH = 4096            # 合成录制每累积多少行写一次盘
+
+# pyautogui 的键名 -> pynput 的 Key.* 名称（单字符键两边相同，其余同名）
+_PYAUTOGUI_KEY_ALIASES = {
+    "ctrlleft": "ctrl_l", "ctrlright": "ctrl_r", "shiftleft": "shift_l", "shiftright": "shift_r",
+    "altleft": "alt_l", "altright": "alt_r", "option": "alt", "optionleft": "alt_l", "optionright": "alt_r",
+    "win": "cmd", "winleft": "cmd_l", "winright": "cmd_r", "command": "cmd",
+    "return": "enter", "escape": "esc", "del": "delete", "capslock": "caps_lock", "numlock": "num_lock",
+    "scrolllock": "scroll_lock", "pageup": "page_up", "pagedown": "page_down", "pgup": "page_up", "pgdn": "page_down",
+    "printscreen": "print_screen", "prtsc": "print_screen", "prtscr": "print_screen", "prntscrn": "print_screen",
+    "apps": "menu", "playpause": "media_play_pause", "volumemute": "media_volume_mute",
+    "volumedown": "media_volume_down", "volumeup": "media_volume_up",
+    "prevtrack": "media_previous", "nexttrack": "media_next",
+}
+
+
+def pynput_key_name(key):
+    """把事件空间中的键名统一成录制中的写法：已是 pynput 写法（单字符或 Key.*）时原样返回。"""
+    if len(key) == 1 or key.startswith("Key."):
+        return key
+    return "Key." + _PYAUTOGUI_KEY_ALIASES.get(key, key)
+
+
+def pynput_button_name(button):
+    return button if button.startswith("Button.") else "Button." + button
+
+
+# pynput 的 Key.* 名称 -> pyautogui 的键名（未列出的同名，如 Key.enter -> enter）
+_PYNPUT_KEY_ALIASES = {
+    "ctrl_l": "ctrlleft", "ctrl_r": "ctrlright", "shift_l": "shiftleft", "shift_r": "shiftright",
+    "alt_l": "altleft", "alt_r": "altright", "alt_gr": "altright", "cmd": "win", "cmd_l": "winleft", "cmd_r": "winright",
+    "caps_lock": "capslock", "num_lock": "numlock", "scroll_lock": "scrolllock",
+    "page_up": "pageup", "page_down": "pagedown", "print_screen": "printscreen", "menu": "apps",
+    "media_play_pause": "playpause", "media_volume_mute": "volumemute", "media_volume_down": "volumedown",
+    "media_volume_up": "volumeup", "media_previous": "prevtrack", "media_next": "nexttrack",
+}
+_PYAUTOGUI_BUTTONS = frozenset(["left", "middle", "right"])
+
+
+def pyautogui_key_name(key):
+    """把录制中的 pynput 键名（Key.shift、a）转成 pyautogui 的键名；已是 pyautogui 写法时原样返回。"""
+    if key.startswith("Key."):
+        name = key[len("Key."):]
+        return _PYNPUT_KEY_ALIASES.get(name, name)
+    return key
+
+
+def pyautogui_button_name(button):
+    """Button.left -> left；pyautogui 不支持的按钮（Button.x1 等）返回 None。"""
+    if button.startswith("Button."):
+        button = button[len("Button."):]
+    return button if button in _PYAUTOGUI_BUTTONS else None
+
+
+class Backend:
+    """后端基类：ops() 给出 调度器使用的 操作名 -> 方法 映射。"""
+    clock = staticmethod(time.perf_counter)
+    wait_until = None
+    virtual = False
+
+    def ops(self):
+        return {
+            KEY_TAP: self.key_tap, KEY_DOWN: self.key_down, KEY_UP: self.key_up,
+            MOUSE_DOWN: self.mouse_down, MOUSE_UP: self.mouse_up,
+            MOVE_TO: self.move_to, MOVE_REL: self.move_rel, SCROLL: self.scroll,
+        }
+
+    def sleep(self, seconds):
+        """按住、点击间隔等计划外的等待（sample_and_execute 使用）。"""
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class PyAutoGuiBackend(Backend):
+    """
+    用 pyautogui 注入。导入推迟到创建时，无显示环境下也能使用其他后端。
+    键名和按钮名可以是 pyautogui 或 pynput（录制、由录制生成的事件空间）的写法；
+    pyautogui 不支持的按钮跳过并计入 skipped。
+    """
+
+    def __init__(self):
+        import pyautogui
+        # 节奏由调度器按截止时间控制，pyautogui 每次调用后的固定停顿会累加成漂移
+        pyautogui.PAUSE = 0
+        self.pyautogui = pyautogui
+        self.position = pyautogui.position
+        self.skipped = 0
+        self._keys = {}
+        self._buttons = {}
+
+    def _key(self, key):
+        name = self._keys.get(key)
+        if name is None:
+            name = self._keys[key] = pyautogui_key_name(key)
+        return name
+
+    def _button(self, button):
+        if button not in self._buttons:
+            self._buttons[button] = pyautogui_button_name(button)
+        name = self._buttons[button]
+        if name is None:
+            self.skipped += 1
+        return name
+
+    def key_tap(self, key):
+        self.pyautogui.press(self._key(key))
+
+    def key_down(self, key):
+        self.pyautogui.keyDown(self._key(key))
+
+    def key_up(self, key):
+        self.pyautogui.keyUp(self._key(key))
+
+    def mouse_down(self, button):
+        button = self._button(button)
+        if button is not None:
+            self.pyautogui.mouseDown(button=button)
+
+    def mouse_up(self, button):
+        button = self._button(button)
+        if button is not None:
+            self.pyautogui.mouseUp(button=button)
+
+    def move_to(self, x, y, duration=0):
+        self.pyautogui.moveTo(x, y, duration=duration)
+
+    def move_rel(self, dx, dy, duration=0):
+        self.pyautogui.moveRel(dx, dy, duration=duration)
+
+    def scroll(self, dx, dy):
+        if dx:
+            self.pyautogui.hscroll(dx)
+        if dy:
+            self.pyautogui.vscroll(dy)
+
+
+class VirtualBackend(Backend):
+    """
+    虚拟时间的后端：clock() 返回虚拟时间，等待直接把时钟拨到目标时刻，不真正 sleep。
+    维护一个限制在屏幕范围内的虚拟鼠标位置（screen_size 为 None 时不限制，如回放多显示器的录制），统计各操作的次数。
+    """
+
+    virtual = True
+
+    def __init__(self, start_time=0.0, screen_size=DEFAULT_SCREEN_SIZE):
+        self.now = float(start_time)
+        self.screen_size = None if screen_size is None else tuple(screen_size)
+        self.x, self.y = (0, 0) if screen_size is None else (self.screen_size[0] // 2, self.screen_size[1] // 2)
+        self.counts = {}
+
+    def clock(self):
+        return self.now
+
+    def wait_until(self, t):
+        if t > self.now:
+            self.now = t
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def position(self):
+        return self.x, self.y
+
+    def _count(self, op):
+        self.counts[op] = self.counts.get(op, 0) + 1
+
+    def _move(self, x, y):
+        """移到 (x, y)（限制在屏幕内），返回位置是否变化。"""
+        x, y = int(x), int(y)
+        if self.screen_size is not None:
+            x = min(max(x, 0), self.screen_size[0] - 1)
+            y = min(max(y, 0), self.screen_size[1] - 1)
+        moved = (x, y) != (self.x, self.y)
+        self.x, self.y = x, y
+        return moved
+
+    def key_tap(self, key):
+        self._count(KEY_TAP)
+
+    def key_down(self, key):
+        self._count(KEY_DOWN)
+
+    def key_up(self, key):
+        self._count(KEY_UP)
+
+    def mouse_down(self, button):
+        self._count(MOUSE_DOWN)
+
+    def mouse_up(self, button):
+        self._count(MOUSE_UP)
+
+    def move_to(self, x, y, duration=0):
+        self._count(MOVE_TO)
+        self._move(x, y)
+        self.sleep(duration)
+
+    def move_rel(self, dx, dy, duration=0):
+        self._count(MOVE_REL)
+        self._move(self.x + dx, self.y + dy)
+        self.sleep(duration)
+
+    def scroll(self, dx, dy):
+        self._count(SCROLL)
+
+
+class NullBackend(VirtualBackend):
+    """丢弃所有操作，只计数。"""
+
+
+class SyntheticRecorderBackend(VirtualBackend):
+    """
+    把操作写成 recorder_app 的 .jsonl 事件日志（逐行 json.dumps(ensure_ascii=False)，字段顺序与录制一致）：
+        {"type": "key_press" / "key_release", "key": ..., "time": ..., "frame_index": ...}
+        {"type": "mouse_press" / "mouse_release", "position": [x, y], "button": ..., "time": ..., "frame_index": ...}
+        {"type": "mouse_move", "position": [x, y], "time": ..., "frame_index": ...}
+    键名和按钮名转成 pynput 的写法（Key.ctrl、Button.left）。time 为虚拟时间（秒，默认从 0 开始，
+    与新版录制的 "距 ffmpeg 启动的秒数" 一致），frame_index 按 framerate 换算，framerate 为 None 时不写（旧版录制）。
+    recorder_app 不录制滚轮，scroll 只计数不写出。key_tap 写成间隔 tap_duration 的按下和松开，并推进虚拟时钟。
+    """
+
+    def __init__(self, path, start_time=0.0, screen_size=DEFAULT_SCREEN_SIZE, framerate=DEFAULT_FRAMERATE,
+                 tap_duration=DEFAULT_TAP_DURATION):
+        super().__init__(start_time, screen_size)
+        self.path = path
+        self.framerate = framerate
+        self.tap_duration = tap_duration
+        self.events = 0
+        self._keys = {}     # 键名 -> 转义后的 json 字符串
+        self._buttons = {}  # 按钮名 -> 转义后的 json 字符串
+        self._lines = []
+        self._f = open(path, "w", encoding="utf-8")
+
+    @staticmethod
+    def _name(cache, name, convert):
+        encoded = cache.get(name)
+        if encoded is None:
+            encoded = cache[name] = json.dumps(convert(name), ensure_ascii=False)
+        return encoded
+
+    def _emit(self, body):
+        # body 为除 time / frame_index 外的字段；float 的 repr 即 json.dumps 的输出
+        t = self.now
+        if self.framerate is None:
+            line = f'{{{body}, "time": {t!r}}}\n'
+        else:
+            line = f'{{{body}, "time": {t!r}, "frame_index": {math.floor(t * self.framerate)}}}\n'
+        self._lines.append(line)
+        self.events += 1
+        if len(self._lines) >= WRITE_BATCH:
+            self.flush()
+
+    def _key(self, etype, key):
+        self._emit(f'"type": "{etype}", "key": {self._name(self._keys, key, pynput_key_name)}')
+
+    def _button(self, etype, button):
+        self._emit(f'"type": "{etype}", "position": [{self.x}, {self.y}], '
+                   f'"button": {self._name(self._buttons, button, pynput_button_name)}')
+
+    def key_tap(self, key):
+        super().key_tap(key)
+        self._key("key_press", key)
+        self.sleep(self.tap_duration)
+        self._key("key_release", key)
+
+    def key_down(self, key):
+        super().key_down(key)
+        self._key("key_press", key)
+
+    def key_up(self, key):
+        super().key_up(key)
+        self._key("key_release", key)
+
+    def mouse_down(self, button):
+        super().mouse_down(button)
+        self._button("mouse_press", button)
+
+    def mouse_up(self, button):
+        super().mouse_up(button)
+        self._button("mouse_release", button)
+
+    def _move(self, x, y):
+        moved = super()._move(x, y)
+        if moved:
+            self._emit(f'"type": "mouse_move", "position": [{self.x}, {self.y}]')
+        return moved
+
+    def flush(self):
+        if self._lines:
+            self._f.write("".join(self._lines))
+            self._lines.clear()
+
+    def close(self):
+        if not self._f.closed:
+            self.flush()
+            self._f.close()
+
+
+# 后端名称 -> 类，SyntheticRecorderBackend 需要输出路径
+BACKENDS = {
+    "pyautogui": PyAutoGuiBackend,
+    "synthetic": SyntheticRecorderBackend,
+    "null": NullBackend,
+}
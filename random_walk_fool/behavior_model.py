@@ -0,0 +1,426 @@
+"""
+从录制学习动作序列的 n 阶马尔可夫（n-gram）模型，供 foolio 生成有先后关系的动作，而不是逐个独立随机。
+
+    python behavior_model.py data/recordings --game "Black Myth: Wukong" [--order 2] [-o data/game_behavior_model.npz]
+    python behavior_model.py --manifest sessions.json [--workers 8]
+
+动作的划分与 get_event_space 相同：按下开启的动作组经 process_group_to_schema_v4 处理，每组归为一个规范动作——
+多键的组为 combo（按 combo_signature 去重），单键的组为该键的 press / hold 或该按钮的 click；独立的 move/scroll 不算动作。
+规范动作本身就是可执行的事件（格式同 game_event_space.json 中的事件，hold / click 带时长直方图），由 event_sampler 编译成计划。
+对每个动作，以它之前的 0..order 个动作为上下文计数转移次数；动作之后到下一个动作开始的间隔按前一个动作分别计入直方图。
+每个录制文件在进程池中独立计数（不跨文件连接上下文），结果按游戏合并，可以流式处理任意多的录制。
+
+模型写成一个 .npz（默认在 game_event_space.json 旁），每个游戏一组数组，名称前缀为 g<序号>_：
+    vocab          规范动作的 JSON 字符串
+    counts         各动作的出现次数
+    context_keys   上下文编码（升序），长度 m 的上下文 (c1..cm) 编码为 Σ (ci + 1)·(V + 1)^(m - i)，空上下文为 0
+    indptr         每个上下文的转移在 next_ids / next_counts 中的范围（CSR）
+    next_ids, next_counts
+    gap_counts     (V + 1) × 桶数，第 v 行为动作 v 之后的间隔直方图计数，最后一行为全部间隔
+    gap_bounds     2 × 桶数，各桶的取值范围（首/末桶延伸到全局最小/最大间隔）
+另有 games（游戏名）与 orders（各游戏的阶数）。
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from event_decode import iter_event_records
+from event_sampler import EventSampler
+from get_event_space import (combo_signature, find_recordings, iter_action_groups, load_manifest, merge_combo,
+                             process_group_to_schema_v4)
+from sketch import duration_histogram
+
+DEFAULT_ORDER = 2
+MODEL_FILENAME = "game_behavior_model.npz"
+
+
+def model_path_for(event_space_path):
+    """事件空间文件旁的模型文件路径。"""
+    return os.path.join(os.path.dirname(event_space_path), MODEL_FILENAME)
+
+
+def canonical_action(group):
+    """动作组的规范动作，返回 (签名, 事件)；不是按键动作组时返回 None。"""
+    if not group[0]['type'].endswith('_press'):
+        return None
+    events = process_group_to_schema_v4(group)
+    for event in events:
+        if event['type'] == 'combo':
+            return combo_signature(event), event
+    event = events[0]
+    if event['type'] == 'keyboard':
+        action = {"type": "keyboard", "action": event['action'], "keys": event['keys']}
+        if event['action'] == 'hold':
+            action["hold_duration"] = event['hold_duration']
+        actors = event['keys']
+    else:
+        action = {"type": "mouse", "action": "click", "buttons": event['buttons'], "clicks": 1,
+                  "click_duration": event['click_duration']}
+        actors = event['buttons']
+    return ((action['type'], action['action'], tuple(actors)),), action
+
+
+# 单键动作的时长字段 -> 事件空间中的 range / hist 字段
+_DURATION_FIELDS = {"hold_duration": ("hold_duration_range", "hold_duration_hist"),
+                    "click_duration": ("interval_range", "click_duration_hist")}
+
+
+class BehaviorCounts:
+    """
+    一个游戏（或一个文件）的计数：规范动作表、(上下文, 下一个动作) -> 次数、各动作之后的间隔直方图。
+    动作按签名去重，merge() 按签名对齐两边的编号，满足结合律。
+    """
+
+    def __init__(self, order=DEFAULT_ORDER):
+        self.order = order
+        self.signatures = []
+        self.index = {}        # 签名 -> 编号
+        self.actions = []      # 编号 -> 事件（含 count；单键动作的时长以 range 保存）
+        self.durations = {}    # 编号 -> 单键动作的时长直方图
+        self.transitions = {}  # (上下文编号元组, 下一个编号) -> 次数
+        self.gaps = {}         # 编号 -> 该动作之后的间隔直方图
+
+    def _intern(self, signature, action):
+        i = self.index.get(signature)
+        if i is not None:
+            self._merge_action(i, action)
+            return i
+        i = self.index[signature] = len(self.signatures)
+        self.signatures.append(signature)
+        if action['type'] == 'combo':
+            self.actions.append({**action, "count": action.get("count", 1)})
+            return i
+        action = dict(action)
+        for field, (range_field, _) in _DURATION_FIELDS.items():
+            if field in action:
+                d = action.pop(field)
+                action[range_field] = [d, d]
+                self.durations[i] = duration_histogram()
+                self.durations[i].add(d)
+        action["count"] = action.get("count", 1)
+        self.actions.append(action)
+        return i
+
+    def _merge_action(self, i, action):
+        target = self.actions[i]
+        if action['type'] == 'combo':
+            merge_combo(target, action)
+            return
+        target["count"] += action.get("count", 1)
+        for field, (range_field, _) in _DURATION_FIELDS.items():
+            if field in action:
+                d = action[field]
+                target[range_field] = [min(target[range_field][0], d), max(target[range_field][1], d)]
+                self.durations[i].add(d)
+
+    def observe(self, events):
+        """流式计数一个录制的事件流。"""
+        history = []
+        prev = None  # 上一个动作，与上下文分开记录（order 为 0 时上下文为空）
+        last_end = None
+        for group in iter_action_groups(events):
+            canonical = canonical_action(group)
+            if canonical is None:
+                continue
+            i = self._intern(*canonical)
+            if prev is not None:
+                gap = self.gaps.get(prev)
+                if gap is None:
+                    gap = self.gaps[prev] = duration_histogram()
+                gap.add(group[0]['time'] - last_end)
+            prev, last_end = i, group[-1]['time']
+            for m in range(min(self.order, len(history)) + 1):
+                key = (tuple(history[len(history) - m:]), i)
+                self.transitions[key] = self.transitions.get(key, 0) + 1
+            history.append(i)
+            if len(history) > self.order:
+                del history[0]
+        return self
+
+    def merge(self, other):
+        """并入另一个计数结果（阶数须相同）。"""
+        if other.order != self.order:
+            raise ValueError(f"阶数不同的模型不能合并: {self.order} / {other.order}")
+        remap = []
+        for j, signature in enumerate(other.signatures):
+            action = dict(other.actions[j])
+            i = self.index.get(signature)
+            if i is None:
+                i = self.index[signature] = len(self.signatures)
+                self.signatures.append(signature)
+                self.actions.append(action)
+                if j in other.durations:
+                    self.durations[i] = duration_histogram().merge(other.durations[j])
+            elif action['type'] == 'combo':
+                merge_combo(self.actions[i], action)
+            else:
+                target = self.actions[i]
+                target["count"] += action["count"]
+                for range_field, _ in _DURATION_FIELDS.values():
+                    if range_field in action:
+                        target[range_field] = [min(target[range_field][0], action[range_field][0]),
+                                               max(target[range_field][1], action[range_field][1])]
+                if j in other.durations:
+                    self.durations[i].merge(other.durations[j])
+            remap.append(i)
+        for (context, j), n in other.transitions.items():
+            key = (tuple(remap[c] for c in context), remap[j])
+            self.transitions[key] = self.transitions.get(key, 0) + n
+        for j, hist in other.gaps.items():
+            i = remap[j]
+            if i in self.gaps:
+                self.gaps[i].merge(hist)
+            else:
+                self.gaps[i] = duration_histogram().merge(hist)
+        return self
+
+    def vocab(self):
+        """规范动作的可执行事件列表（单键动作附上时长直方图）。"""
+        out = []
+        for i, action in enumerate(self.actions):
+            action = dict(action)
+            if i in self.durations:
+                for range_field, hist_field in _DURATION_FIELDS.values():
+                    if range_field in action:
+                        action[hist_field] = self.durations[i].to_dict()
+            out.append(action)
+        return out
+
+    def to_arrays(self):
+        """模型数组（见模块说明）。"""
+        v = len(self.signatures)
+        base = v + 1
+        if base ** (self.order + 1) >= 1 << 63:
+            raise ValueError(f"动作数 {v} 与阶数 {self.order} 的上下文编码超出 int64，请降低 --order")
+        keys = []
+        for context, _ in self.transitions:
+            key = 0
+            for c in context:
+                key = key * base + c + 1
+            keys.append(key)
+        entries = np.array(keys, dtype=np.int64)
+        nexts = np.array([j for _, j in self.transitions], dtype=np.int64)
+        counts = np.array(list(self.transitions.values()), dtype=np.int64)
+        order = np.lexsort((nexts, entries))
+        entries, nexts, counts = entries[order], nexts[order], counts[order]
+        context_keys, starts = np.unique(entries, return_index=True)
+
+        total = duration_histogram()
+        for hist in self.gaps.values():
+            total.merge(hist)
+        gap_counts = np.zeros((v + 1, len(total.counts)), dtype=np.int64)
+        for i, hist in self.gaps.items():
+            gap_counts[i] = hist.counts
+        gap_counts[v] = total.counts
+        gap_bounds = np.zeros((2, len(total.counts)))
+        if total.count:
+            gap_bounds[0] = [total.bin_range(b)[0] for b in range(len(total.counts))]
+            gap_bounds[1] = [total.bin_range(b)[1] for b in range(len(total.counts))]
+        return {
+            "vocab": np.array([json.dumps(a, ensure_ascii=False) for a in self.vocab()], dtype=np.str_),
+            "counts": np.array([a["count"] for a in self.actions], dtype=np.int64),
+            "context_keys": context_keys,
+            "indptr": np.append(starts, len(entries)).astype(np.int64),
+            "next_ids": nexts.astype(np.int32),
+            "next_counts": counts.astype(np.uint32),
+            "gap_counts": gap_counts.astype(np.uint32),
+            "gap_bounds": gap_bounds,
+        }
+
+
+def save_models(path, models):
+    """把 {游戏名: BehaviorCounts} 写成一个压缩的 .npz。有游戏没有任何动作时抛出 ValueError，不写文件。"""
+    empty = [game for game, counts in models.items() if not counts.signatures]
+    if not models or empty:
+        raise ValueError(f"录制中没有按键/按钮动作，无法生成模型: {', '.join(empty) or '（没有游戏）'}")
+    arrays = {"games": np.array(list(models), dtype=np.str_),
+              "orders": np.array([counts.order for counts in models.values()], dtype=np.int64)}
+    for g, counts in enumerate(models.values()):
+        for name, array in counts.to_arrays().items():
+            arrays[f"g{g}_{name}"] = array
+    np.savez_compressed(path, **arrays)
+
+
+class BehaviorModel:
+    """从 .npz 读出的一个游戏的模型。"""
+
+    def __init__(self, arrays, order):
+        self.order = order
+        self.vocab = [json.loads(s) for s in arrays["vocab"].tolist()]
+        for name in ("counts", "context_keys", "indptr", "next_ids", "next_counts", "gap_counts", "gap_bounds"):
+            setattr(self, name, arrays[name])
+
+
+def load_model(path, game=None):
+    """读取 path 中指定游戏（缺省为第一个）的模型。"""
+    with np.load(path, allow_pickle=False) as data:
+        games = data["games"].tolist()
+        if not games:
+            raise ValueError(f"模型文件中没有游戏: {path}")
+        if game is None:
+            game = games[0]
+        if game not in games:
+            raise KeyError(f"模型文件中没有游戏 {game}，可用: {', '.join(games)}")
+        g = games.index(game)
+        arrays = {name[len(f"g{g}_"):]: data[name] for name in data.files if name.startswith(f"g{g}_")}
+        if not len(arrays["vocab"]):
+            raise ValueError(f"模型中游戏 {game} 没有任何动作: {path}")
+        return BehaviorModel(arrays, int(data["orders"][g]))
+
+
+def _row_cdf(indptr, counts):
+    """
+    把按行（CSR）排列的计数转成全局单调的累积值：第 r 行的元素落在 (r, r + 1]，行末恰为 r + 1。
+    于是对任意多条链，np.searchsorted(cdf, 行号 + 均匀随机数) 一次查出各自选中的元素。
+    """
+    counts = counts.astype(np.float64)
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    running = np.cumsum(counts)
+    before = np.concatenate(([0.0], running))[indptr[:-1]]
+    totals = np.add.reduceat(counts, indptr[:-1]) if len(counts) else np.zeros(0)
+    cdf = rows + (running - before[rows]) / totals[rows]
+    cdf[indptr[1:] - 1] = np.arange(1, len(indptr))  # 消除浮点误差，行末精确为 r + 1
+    return cdf
+
+
+class BehaviorSampler:
+    """
+    按模型生成动作序列：每一步对所有链一起查上下文（从最长的上下文开始，没见过时退回更短的），
+    再用累积概率数组一次 searchsorted 选出下一个动作；间隔按前一个动作的间隔直方图同样向量化采样。
+    plans() / sample_with_gaps() 的接口与 EventSampler 相同，可以直接交给 foolio。
+    """
+
+    def __init__(self, model, seed=None):
+        self.model = model
+        self.order = model.order
+        self.rng = np.random.default_rng(seed)
+        self.base = len(model.vocab) + 1
+        self.cdf = _row_cdf(model.indptr, model.next_counts)
+        self.context_keys = model.context_keys
+        self.next_ids = model.next_ids.astype(np.int64)
+        gap_counts = model.gap_counts.astype(np.float64)
+        self.gap_bins = bins = gap_counts.shape[1]
+        self.gap_cdf = None
+        if gap_counts[-1].any():
+            gap_counts[gap_counts.sum(axis=1) == 0] = gap_counts[-1]  # 没有观察到间隔的动作使用全部间隔的分布
+            self.gap_cdf = _row_cdf(np.arange(0, gap_counts.size + 1, bins), gap_counts.ravel())
+        self.gap_lo, self.gap_hi = model.gap_bounds
+        self.events = EventSampler({"events": model.vocab}, model.counts.tolist(), seed=self.rng.integers(1 << 63))
+        self.history = np.full((1, self.order), -1, dtype=np.int64)
+
+    def _rows(self, history):
+        """各条链当前上下文所在的行：取最长的、在模型中出现过的上下文。"""
+        chains = len(history)
+        rows = np.full(chains, -1, dtype=np.int64)
+        for m in range(self.order, -1, -1):
+            key = np.zeros(chains, dtype=np.int64)
+            valid = np.ones(chains, dtype=bool)
+            for c in history[:, self.order - m:].T:
+                key = key * self.base + c + 1
+                valid &= c >= 0
+            pos = np.minimum(np.searchsorted(self.context_keys, key), len(self.context_keys) - 1)
+            found = valid & (rows < 0) & (self.context_keys[pos] == key)
+            rows[found] = pos[found]
+        return rows
+
+    def sample_tokens(self, n, chains=None):
+        """
+        接着 history 为每条链生成 n 个动作编号，返回 (链数, n) 的数组并更新 history。
+        chains 给出时从空上下文开始生成这么多条独立的链。
+        """
+        if chains is not None:
+            self.history = np.full((chains, self.order), -1, dtype=np.int64)
+        history = self.history
+        out = np.empty((len(history), n), dtype=np.int64)
+        for step in range(n):
+            rows = self._rows(history)
+            picks = np.searchsorted(self.cdf, rows + self.rng.random(len(history)), side="right")
+            tokens = self.next_ids[np.minimum(picks, len(self.next_ids) - 1)]
+            out[:, step] = tokens
+            if self.order:
+                history = np.concatenate((history[:, 1:], tokens[:, None]), axis=1)
+        self.history = history
+        return out
+
+    def sample_gaps(self, tokens):
+        """各动作之后的间隔（秒），按动作各自的间隔分布采样。"""
+        tokens = np.asarray(tokens, dtype=np.int64)
+        if self.gap_cdf is None:
+            return np.zeros(tokens.shape)
+        picks = np.searchsorted(self.gap_cdf, tokens + self.rng.random(tokens.shape), side="right")
+        b = np.minimum(picks - tokens * self.gap_bins, self.gap_bins - 1)
+        return self.gap_lo[b] + self.rng.random(tokens.shape) * (self.gap_hi[b] - self.gap_lo[b])
+
+    def sample_with_gaps(self, n):
+        """接着上一次生成 n 个动作，返回 (计划列表, 间隔列表)。"""
+        tokens = self.sample_tokens(n)[0]
+        return self.events.plans(tokens), self.sample_gaps(tokens).tolist()
+
+
+def _count_file(file_path, order):
+    """单个文件的计数（进程池任务）；文件不存在时返回 None。"""
+    try:
+        return BehaviorCounts(order).observe(iter_event_records(file_path))
+    except FileNotFoundError:
+        print(f"错误：文件未找到: {file_path}")
+        return None
+
+
+def build_models(pairs, order=DEFAULT_ORDER, workers=None):
+    """并行计数 [(录制文件, 游戏名), ...] 并按游戏合并，返回 {游戏名: BehaviorCounts}，合并顺序与输入相同。"""
+    pairs = list(pairs)
+    paths = [file_path for file_path, _ in pairs]
+    orders = [order] * len(paths)
+    if workers == 1 or len(paths) <= 1:
+        partials = list(map(_count_file, paths, orders))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            partials = list(pool.map(_count_file, paths, orders))
+    models = {}
+    for (_, game), partial in zip(pairs, partials):
+        merged = models.setdefault(game, BehaviorCounts(order))
+        if partial is not None:
+            merged.merge(partial)
+    return models
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从键鼠事件日志学习动作序列的马尔可夫模型")
+    parser.add_argument("inputs", nargs="*", help="录制文件或目录（配合 --game）")
+    parser.add_argument("--game", help="inputs 对应的游戏名")
+    parser.add_argument("--manifest", help="(录制文件, 游戏名) 清单，JSON 格式")
+    parser.add_argument("-o", "--output", default=os.path.join("data", MODEL_FILENAME), help="输出文件")
+    parser.add_argument("--order", type=int, default=DEFAULT_ORDER, help="上下文长度（阶数）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    args = parser.parse_args(argv)
+    if args.order < 0:
+        parser.error("--order 不能为负数")
+
+    pairs = load_manifest(args.manifest) if args.manifest else []
+    if args.inputs:
+        if not args.game:
+            parser.error("给出录制文件或目录时需要指定 --game")
+        pairs += [(file_path, args.game) for path in args.inputs for file_path in find_recordings(path)]
+    if not pairs:
+        parser.error("没有找到录制文件")
+
+    models = build_models(pairs, args.order, args.workers)
+    for game in [game for game, counts in models.items() if not counts.signatures]:
+        print(f"{game}: 录制中没有按键/按钮动作，跳过")
+        del models[game]
+    if not models:
+        parser.error("所有录制中都没有按键/按钮动作，未生成模型")
+    save_models(args.output, models)
+    for game, counts in models.items():
+        contexts = len({context for context, _ in counts.transitions})
+        print(f"{game}: {len(counts.signatures)} 个动作，{contexts} 个上下文，{len(counts.transitions)} 个转移")
+    print(f"已处理 {len(pairs)} 个文件，{len(models)} 个游戏，输出到 {args.output}（{os.path.getsize(args.output) / 1e3:.1f} KB）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+事件空间构建的基准测试与回归检查。
+
+    python bench_event_space.py --events 10000000 [--seed 0] [--memory]
+    python bench_event_space.py --check data/game_event_space.json "data/record_xxx.jsonl=Black Myth: Wukong" ...
+    python bench_event_space.py --check data/fixtures/event_space.json data/fixtures/recording.jsonl=fixture [--update]
+    python bench_event_space.py --columns data/record_xxx.jsonl
+    python bench_event_space.py --decoders data/record_xxx.jsonl
+
+--columns 比较 dict 路径与 NumPy 列式路径（event_columns）计算简单事件聚合和独立鼠标移动位移的耗时，并核对两者结果一致。
+--decoders 比较标准库逐行 json.loads 得到 dict 与各个已安装解码器（event_decode）得到 EventRecord 的解析和汇总耗时。
+
+基准测试不读写文件，直接把合成事件流送入 summarize_events，报告吞吐量（--memory 时另报峰值内存，会明显变慢）。
+合成事件模拟真实操作：125 Hz 的鼠标移动、WASD 长按、点击、Ctrl/Shift 组合键，
+并在开头按住 W 数分钟，期间夹杂大量移动和点击，用于考察长动作组的开销。
+回归检查按给定的 (录制文件, 游戏名) 重新生成事件空间，与已有的 game_event_space.json 逐项比较；
+--update 时用重新生成的结果覆盖该文件（事件空间格式有意改变后更新 golden 文件）。
+data/fixtures 中是一份提交在仓库里的小录制及其事件空间，test_event_space.py 用它做自动回归测试。
+"""
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from event_decode import DECODERS, iter_jsonl_records
+from event_log import iter_events, iter_jsonl_events
+from get_event_space import aggregate_events, iter_action_groups, summarize_events, summarize_user_actions
+
+MOVE_INTERVAL = 1 / 125
+
+
+def synthetic_events(n, seed=0, long_hold=180.0):
+    """产出 n 条合成事件，时间单调递增（秒）。"""
+    rnd = random.Random(seed)
+    t, x, y = 0.0, 960, 540
+    pending = []  # [(时间, 事件)]：尚未到时的松开事件
+    count = 0
+
+    def emit(event):
+        nonlocal count
+        count += 1
+        return event
+
+    # 开头按住 W long_hold 秒
+    pending.append((t + long_hold, {"type": "key_release", "key": "w"}))
+    yield emit({"type": "key_press", "key": "w", "time": t})
+    while count < n:
+        t += MOVE_INTERVAL
+        while pending and pending[0][0] <= t and count < n:
+            due, event = pending.pop(0)
+            event["time"] = due
+            yield emit(event)
+        if count >= n:
+            break
+        r = rnd.random()
+        if r < 0.9:
+            x += rnd.randint(-8, 8)
+            y += rnd.randint(-6, 6)
+            yield emit({"type": "mouse_move", "position": (x, y), "time": t})
+            continue
+        if r < 0.95:
+            key, hold = rnd.choice("wasd"), rnd.uniform(0.05, 2.0)
+            events = [{"type": "key_press", "key": key}], [{"type": "key_release", "key": key}]
+        elif r < 0.98:
+            button, hold = rnd.choice(["Button.left", "Button.right"]), rnd.uniform(0.03, 0.3)
+            events = ([{"type": "mouse_press", "position": (x, y), "button": button}],
+                      [{"type": "mouse_release", "position": (x, y), "button": button}])
+        else:
+            modifier, key, hold = rnd.choice(["Key.ctrl_l", "Key.shift"]), rnd.choice("ceqr12"), rnd.uniform(0.2, 0.6)
+            events = ([{"type": "key_press", "key": modifier}, {"type": "key_press", "key": key}],
+                      [{"type": "key_release", "key": key}, {"type": "key_release", "key": modifier}])
+        presses, releases = events
+        for i, event in enumerate(presses):
+            event["time"] = t + i * 0.02
+            yield emit(event)
+            if count >= n:
+                return
+        for i, event in enumerate(releases):
+            pending.append((t + hold + i * 0.02, event))
+        pending.sort(key=lambda p: p[0])
+
+
+def run_benchmark(n, seed=0, memory=False):
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    summary = summarize_events(synthetic_events(n, seed))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] if memory else None
+    if memory:
+        tracemalloc.stop()
+    print(f"事件数: {n}")
+    print(f"耗时: {elapsed:.2f} 秒，吞吐量: {n / elapsed / 1e6:.2f} M 事件/秒")
+    if peak is not None:
+        print(f"峰值内存: {peak / 1e6:.1f} MB")
+    print(f"combo 数: {sum(1 for e in summary['events'] if e['type'] == 'combo')}")
+
+
+def run_check(expected_path, pairs, update=False):
+    """
+    按 (录制文件, 游戏名) 重新生成事件空间并与 expected_path 比较，返回不一致的游戏名列表。
+    update 为 True 时把重新生成的结果写回 expected_path。
+    """
+    try:
+        with open(expected_path, "r", encoding="utf-8") as f:
+            expected = json.load(f)
+    except FileNotFoundError:
+        if not update:
+            raise
+        expected = {}
+    mismatched = []
+    for file_path, game_name in pairs:
+        # 经过一次 JSON 往返，使元组/浮点数的表示与文件中一致
+        actual = json.loads(json.dumps(summarize_user_actions(file_path)))
+        if actual != expected.get(game_name):
+            mismatched.append(game_name)
+        print(f"{'一致' if actual == expected.get(game_name) else '不一致'}: {game_name} <- {file_path}")
+        expected[game_name] = actual
+    if update and mismatched:
+        with open(expected_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(expected, indent=4))
+        print(f"已更新 {expected_path}")
+    return mismatched
+
+
+def _dict_path(path):
+    """dict 路径：逐事件分组处理得到简单事件聚合，并逐个计算独立鼠标移动之间的位移。"""
+    aggregator = aggregate_events(iter_events(path))
+    dx, dy, last = [], [], None
+    for group in iter_action_groups(iter_events(path)):
+        event = group[0]
+        if len(group) == 1 and event['type'] == 'mouse_move':
+            if last:
+                dx.append(event['position'][0] - last[0])
+                dy.append(event['position'][1] - last[1])
+            last = event['position']
+    return aggregator, dx, dy
+
+
+def run_columns(path):
+    import numpy as np
+    from event_columns import action_group_ids, load_columns, simple_event_space, standalone_move_deltas
+
+    start = time.perf_counter()
+    aggregator, dx, dy = _dict_path(path)
+    dict_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cols = load_columns(path)
+    load_time = time.perf_counter() - start
+    start = time.perf_counter()
+    group_ids = action_group_ids(cols)
+    vector = simple_event_space(cols)
+    vdx, vdy = standalone_move_deltas(cols, group_ids)
+    vector_time = time.perf_counter() - start
+
+    # 只比较列式路径计算的部分：简单事件及其时长分布
+    keys = ["keyboard_press", "keyboard_press_count", "keyboard_hold", "hold_duration_range", "mouse_click", "click_duration_range"]
+    hists = ["hold_duration", "click_duration"]
+    expected, actual = aggregator.to_state(), vector.to_state()
+    expected = {**{k: expected[k] for k in keys}, **{h: expected["hists"][h] for h in hists}}
+    actual = {**{k: actual[k] for k in keys}, **{h: actual["hists"][h] for h in hists}}
+    same = expected == actual and np.array_equal(vdx, np.array(dx, dtype=float)) and np.array_equal(vdy, np.array(dy, dtype=float))
+    print(f"事件数: {len(cols)}")
+    print(f"dict 路径: {dict_time:.2f} 秒（含 combo 处理）")
+    print(f"列式路径: 载入 {load_time:.2f} 秒 + 计算 {vector_time:.3f} 秒")
+    print(f"结果{'一致' if same else '不一致'}")
+    return 0 if same else 1
+
+
+def run_decoders(path):
+    """逐个解码器测量只解析、以及解析并汇总的耗时，并核对汇总结果与 dict 路径一致。"""
+    backends = [("json -> dict", lambda: iter_jsonl_events(path))]
+    backends += [(f"{name} -> EventRecord", lambda name=name: iter_jsonl_records(path, name)) for name in DECODERS]
+    expected = None
+    same = True
+    for label, events in backends:
+        start = time.perf_counter()
+        n = sum(1 for _ in events())
+        parse_time = time.perf_counter() - start
+        start = time.perf_counter()
+        summary = json.dumps(summarize_events(events()))
+        total_time = time.perf_counter() - start
+        expected = expected or summary
+        same = same and summary == expected
+        print(f"{label:<24} 解析 {parse_time:6.2f} 秒（{n / parse_time / 1e6:.2f} M 事件/秒），解析并汇总 {total_time:6.2f} 秒")
+    print(f"结果{'一致' if same else '不一致'}")
+    return 0 if same else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="事件空间构建的基准测试与回归检查")
+    parser.add_argument("--events", type=int, default=10_000_000, help="合成事件数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", action="store_true", help="用 tracemalloc 统计峰值内存")
+    parser.add_argument("--check", metavar="EXPECTED_JSON", help="与已有的 game_event_space.json 比较")
+    parser.add_argument("--update", action="store_true", help="--check 时用重新生成的结果覆盖 EXPECTED_JSON")
+    parser.add_argument("--columns", metavar="RECORDING", help="比较 dict 路径与 NumPy 列式路径")
+    parser.add_argument("--decoders", metavar="RECORDING", help="比较各 JSON 解码器（jsonl 录制文件）")
+    parser.add_argument("recordings", nargs="*", help="--check 时的输入，形如 录制文件=游戏名")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        pairs = []
+        for item in args.recordings:
+            file_path, sep, game_name = item.rpartition("=")
+            if not sep:
+                parser.error(f"输入应形如 录制文件=游戏名: {item}")
+            pairs.append((file_path, game_name))
+        mismatched = run_check(args.check, pairs, args.update)
+        return 1 if mismatched and not args.update else 0
+
+    if args.columns:
+        return run_columns(args.columns)
+
+    if args.decoders:
+        return run_decoders(args.decoders)
+
+    run_benchmark(args.events, args.seed, args.memory)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+"""
+把事件日志载入为 NumPy 列，并以向量化方式计算事件空间中的统计量。
+
+列：
+    type   uint8    类型码，取值见 COLUMN_TYPES（0 为未知类型）
+    actor  int32    actor id，对应 actors 表；actor 名的取法与 get_event_space 相同（key 或 button，缺省为 "left"），
+                    mouse_move / mouse_scroll 为 -1
+    time   float64  秒
+    x, y   float64  鼠标坐标，没有 position 的事件为 NaN
+
+二进制日志（.gtev）按记录结构直接用 np.frombuffer 解析，不经过逐条的 dict；jsonl 逐行解析后再转成列。
+pair_press_release 按 actor 配对按下/松开；group_actors / simple_event_space 向量化地复现
+process_group_to_schema_v4 中逐个 actor 的按下/松开配对和 EventSpaceAggregator 的简单事件聚合；
+standalone_move_deltas 复现独立鼠标移动的相邻位移。
+"""
+import struct
+
+import numpy as np
+
+from event_log import EVENT_TYPES, FLAG_ACTOR, FLAG_POSITION, is_binary_log, iter_jsonl_events, read_header
+from get_event_space import HOLD_THRESHOLD, EventSpaceAggregator
+
+COLUMN_TYPES = EVENT_TYPES
+_TYPE_CODES = {name: code for code, name in enumerate(COLUMN_TYPES) if name}
+KEY_PRESS, KEY_RELEASE = _TYPE_CODES["key_press"], _TYPE_CODES["key_release"]
+MOUSE_PRESS, MOUSE_RELEASE = _TYPE_CODES["mouse_press"], _TYPE_CODES["mouse_release"]
+MOUSE_MOVE, MOUSE_SCROLL = _TYPE_CODES["mouse_move"], _TYPE_CODES["mouse_scroll"]
+_NS_PER_SEC = 1_000_000_000
+
+
+class EventColumns:
+    def __init__(self, type, actor, time, x, y, actors):
+        self.type = type
+        self.actor = actor
+        self.time = time
+        self.x = x
+        self.y = y
+        self.actors = actors
+
+    def __len__(self):
+        return len(self.type)
+
+    @property
+    def is_press(self):
+        return (self.type == KEY_PRESS) | (self.type == MOUSE_PRESS)
+
+    @property
+    def is_release(self):
+        return (self.type == KEY_RELEASE) | (self.type == MOUSE_RELEASE)
+
+
+def load_columns(path):
+    if is_binary_log(path):
+        return _load_binary_columns(path)
+    return _load_jsonl_columns(path)
+
+
+def _load_jsonl_columns(path):
+    types, actor_ids, times, xs, ys = [], [], [], [], []
+    actors, actor_index = [], {}
+    nan = float("nan")
+    for event in iter_jsonl_events(path):
+        etype = event['type']
+        code = _TYPE_CODES.get(etype, 0)
+        if code in (MOUSE_MOVE, MOUSE_SCROLL) or code == 0:
+            aid = -1
+        else:
+            name = event.get('key') or event.get('button', 'left')
+            aid = actor_index.get(name)
+            if aid is None:
+                aid = actor_index[name] = len(actors)
+                actors.append(name)
+        position = event.get('position')
+        types.append(code)
+        actor_ids.append(aid)
+        times.append(event['time'])
+        xs.append(position[0] if position else nan)
+        ys.append(position[1] if position else nan)
+    return EventColumns(np.array(types, dtype=np.uint8), np.array(actor_ids, dtype=np.int32),
+                        np.array(times, dtype=np.float64), np.array(xs, dtype=np.float64),
+                        np.array(ys, dtype=np.float64), actors)
+
+
+def _record_dtype(header):
+    fmt = header["record_format"]
+    order, codes = fmt[0], fmt[1:]
+    names = header["fields"]
+    if struct.calcsize(fmt) != sum(np.dtype(order + c).itemsize for c in codes):
+        raise ValueError(f"无法映射为 NumPy 结构: {fmt}")
+    return np.dtype([(name, order + c) for name, c in zip(names, codes)])
+
+
+def _load_binary_columns(path):
+    with open(path, "rb") as f:
+        header = read_header(f)
+        data = f.read()
+    dtype = _record_dtype(header)
+    size = dtype.itemsize
+    string_def = header["string_def"]
+    strings = list(header["strings"])
+
+    # 在 STRING_DEF 记录处切开：每段都是连续的定长记录，可以直接 frombuffer
+    chunks = []
+    pos = 0
+    while pos < len(data):
+        count = (len(data) - pos) // size
+        if count == 0:
+            raise ValueError(f"文件末尾存在不完整的记录（{len(data) - pos} 字节）")
+        records = np.frombuffer(data, dtype=dtype, count=count, offset=pos)
+        defs = np.flatnonzero(records["type"] == string_def)
+        if len(defs) == 0:
+            chunks.append(records)
+            break
+        k = int(defs[0])
+        chunks.append(records[:k])
+        sid, length = int(records["actor"][k]), int(records["x"][k])
+        pos += (k + 1) * size
+        if sid != len(strings) or pos + length > len(data):
+            raise ValueError("字符串定义记录损坏")
+        strings.append(data[pos:pos + length].decode("utf-8"))
+        pos += length
+    records = np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype)
+
+    # 类型码按名称重新映射到 COLUMN_TYPES，兼容类型表不同的文件
+    file_types = header["types"]
+    remap = np.zeros(256, dtype=np.uint8)
+    for code, name in enumerate(file_types):
+        remap[code] = _TYPE_CODES.get(name, 0)
+    types = remap[records["type"]]
+
+    # actor：带名称的取字符串表中的名称，没有名称的按 get_event_space 的规则记为 "left"
+    actors = strings + ["left"]
+    left = actors.index("left")
+    has_actor = (records["flags"] & FLAG_ACTOR) != 0
+    actor = np.where(has_actor, records["actor"].astype(np.int32), left).astype(np.int32)
+    actor[(types == MOUSE_MOVE) | (types == MOUSE_SCROLL) | (types == 0)] = -1
+    # 压缩为只包含出现过的 actor
+    used, actor_compact = np.unique(actor[actor >= 0], return_inverse=True)
+    out_actor = np.full(len(actor), -1, dtype=np.int32)
+    out_actor[actor >= 0] = actor_compact
+    actor_names = [actors[i] for i in used]
+
+    time = ns_to_seconds(records["t_ns"])
+    has_pos = (records["flags"] & FLAG_POSITION) != 0
+    x = np.where(has_pos, records["x"], np.nan).astype(np.float64)
+    y = np.where(has_pos, records["y"], np.nan).astype(np.float64)
+    return EventColumns(types, out_actor, time, x, y, actor_names)
+
+
+def ns_to_seconds(t_ns):
+    """int 纳秒数组 -> float64 秒，event_log.ns_to_time 的向量化版本。"""
+    t_ns = np.asarray(t_ns, dtype=np.int64)
+    # |t_ns| < 2^53 时转 float64 无损，除法的正确舍入与 event_log.ns_to_time 相同；
+    # 更大的（墙钟）时间戳把整秒与纳秒部分分开换算，误差在 1 ulp 以内
+    return np.where(np.abs(t_ns) < (1 << 53), t_ns / 1e9,
+                    (t_ns // _NS_PER_SEC).astype(np.float64) + (t_ns % _NS_PER_SEC) / 1e9)
+
+
+def seconds_to_ns(time):
+    """float64 秒数组 -> int 纳秒，event_log.time_to_ns 的向量化版本。"""
+    time = np.asarray(time, dtype=np.float64)
+    whole = np.trunc(time)
+    return whole.astype(np.int64) * _NS_PER_SEC + np.round((time - whole) * 1e9).astype(np.int64)
+
+
+############################## 向量化统计
+def _hold_transitions(cols):
+    """
+    每行事件对"按住中的 actor 数"的增量：actor 由松开变为按住时 +1，由按住变为松开时 -1，其余为 0。
+    actor 的按住状态即其上一条按下/松开事件是否为按下，与 iter_action_groups 的 active_holds 一致。
+    """
+    is_press, is_release = cols.is_press, cols.is_release
+    rows = np.flatnonzero(is_press | is_release)
+    order = rows[np.lexsort((rows, cols.actor[rows]))]
+    pressed = is_press[order]
+    same_actor = np.empty(len(order), dtype=bool)
+    if len(order):
+        same_actor[0] = False
+        same_actor[1:] = cols.actor[order[1:]] == cols.actor[order[:-1]]
+    prev_pressed = np.zeros(len(order), dtype=bool)
+    prev_pressed[1:] = pressed[:-1]
+    prev_pressed &= same_actor
+    delta = np.zeros(len(cols), dtype=np.int64)
+    delta[order] = np.where(pressed & ~prev_pressed, 1, np.where(~pressed & prev_pressed, -1, 0))
+    return delta
+
+
+def action_group_ids(cols):
+    """每行所属的动作组编号（与 iter_action_groups 的分组一致），不属于任何按键组的行为 -1。"""
+    after = np.cumsum(_hold_transitions(cols))
+    before = np.empty_like(after)
+    if len(after):
+        before[0] = 0
+        before[1:] = after[:-1]
+    in_group = (before > 0) | (after > 0)
+    starts = in_group & (before == 0)
+    return np.where(in_group, np.cumsum(starts) - 1, -1)
+
+
+def pair_press_release(cols):
+    """
+    按 actor 配对按下与松开：连续的多次按下（按键自动重复）只算第一次，与其后该 actor 的第一次松开配对。
+    返回 (actor, 按下时间, 松开时间)，直到文件结束都没有松开的按下，其松开时间为 NaN。
+    """
+    is_press, is_release = cols.is_press, cols.is_release
+    rows = np.flatnonzero(is_press | is_release)
+    order = rows[np.lexsort((rows, cols.actor[rows]))]
+    actor = cols.actor[order]
+    pressed = is_press[order]
+    new_actor = np.ones(len(order), dtype=bool)
+    new_actor[1:] = actor[1:] != actor[:-1]
+    prev_pressed = np.zeros(len(order), dtype=bool)
+    prev_pressed[1:] = pressed[:-1]
+    prev_pressed &= ~new_actor
+    starts = np.flatnonzero(pressed & ~prev_pressed)
+    ends = np.flatnonzero(~pressed & prev_pressed)
+    # 每个按下段之后紧跟的松开段（同一 actor 内按下段与松开段交替出现）
+    k = np.searchsorted(ends, starts)
+    matched = k < len(ends)
+    matched[matched] = actor[ends[k[matched]]] == actor[starts[matched]]
+    release_time = np.full(len(starts), np.nan)
+    release_time[matched] = cols.time[order[ends[k[matched]]]]
+    return actor[starts], cols.time[order[starts]], release_time
+
+
+def group_actors(cols, group_ids=None):
+    """
+    每个 (动作组, actor) 的按下次数、最早按下的行号和最晚松开时间，以及所属动作组的结束时间，
+    对应 process_group_to_schema_v4 中逐个 actor 的统计。只包含组内有按下的 actor。
+    返回 dict：actor, presses, first_press_row, last_release（没有松开为 NaN）, group_end。
+    """
+    if group_ids is None:
+        group_ids = action_group_ids(cols)
+    n_actors = max(len(cols.actors), 1)
+    in_group = group_ids >= 0
+    press_rows = np.flatnonzero(in_group & cols.is_press)
+    release_rows = np.flatnonzero(in_group & cols.is_release)
+    press_keys = group_ids[press_rows] * n_actors + cols.actor[press_rows]
+    release_keys = group_ids[release_rows] * n_actors + cols.actor[release_rows]
+
+    # 最早按下：按 (key, 时间, 行号) 排序后每个 key 的第一行
+    order = np.lexsort((press_rows, cols.time[press_rows], press_keys))
+    sorted_keys = press_keys[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    keys = sorted_keys[first]
+    first_press_row = press_rows[order][first]
+    presses = np.diff(np.append(np.flatnonzero(first), len(order)))
+
+    # 最晚松开
+    last_release = np.full(len(keys), -np.inf)
+    idx = np.searchsorted(keys, release_keys)
+    hit = idx < len(keys)
+    hit[hit] = keys[idx[hit]] == release_keys[hit]
+    np.maximum.at(last_release, idx[hit], cols.time[release_rows[hit]])
+    last_release[np.isneginf(last_release)] = np.nan
+
+    # 动作组的结束时间为组内最后一行的时间
+    rows = np.flatnonzero(in_group)
+    gid = group_ids[rows]
+    is_last = np.ones(len(rows), dtype=bool)
+    is_last[:-1] = gid[1:] != gid[:-1]
+    group_end = np.empty(int(gid.max()) + 1 if len(gid) else 0)
+    group_end[gid[is_last]] = cols.time[rows[is_last]]
+
+    return {
+        "group": keys // n_actors,
+        "actor": (keys % n_actors).astype(np.int32),
+        "presses": presses,
+        "first_press_row": first_press_row,
+        "last_release": last_release,
+        "group_end": group_end[keys // n_actors],
+    }
+
+
+def simple_event_space(cols):
+    """向量化计算 EventSpaceAggregator 中的简单事件部分（按键/长按/点击及其时长分布），combo 为空。"""
+    stats = group_actors(cols)
+    has_release = ~np.isnan(stats["last_release"])
+    end = np.where(has_release, stats["last_release"], stats["group_end"])
+    duration = end - cols.time[stats["first_press_row"]]
+    is_hold = (stats["presses"] > 1) | ~has_release | (duration >= HOLD_THRESHOLD)
+    is_key = cols.type[stats["first_press_row"]] == KEY_PRESS
+
+    aggregator = EventSpaceAggregator()
+    names = cols.actors
+    actor = stats["actor"]
+    press = is_key & ~is_hold
+    aggregator.keyboard_press = {names[a] for a in np.unique(actor[press])}
+    aggregator.keyboard_press_count = int(press.sum())
+    hold = is_key & is_hold
+    aggregator.keyboard_hold = {names[a] for a in np.unique(actor[hold])}
+    if hold.any():
+        aggregator.hold_duration_range = (float(duration[hold].min()), float(duration[hold].max()))
+        fill_histogram(aggregator.hists["hold_duration"], duration[hold])
+    click = ~is_key
+    aggregator.mouse_click = {names[a] for a in np.unique(actor[click])}
+    if click.any():
+        aggregator.click_duration_range = (float(duration[click].min()), float(duration[click].max()))
+        fill_histogram(aggregator.hists["click_duration"], duration[click])
+    return aggregator
+
+
+def fill_histogram(hist, values):
+    """向量化地把 values 计入 sketch.Histogram，分桶规则与 Histogram.add 相同。"""
+    if not len(values):
+        return hist
+    edges = np.asarray(hist.edges)
+    idx = np.clip(np.searchsorted(edges, values, side="right") - 1, 0, len(hist.counts) - 1)
+    counts = np.bincount(idx, minlength=len(hist.counts))
+    hist.counts = [a + int(b) for a, b in zip(hist.counts, counts)]
+    hist.count += len(values)
+    lo, hi = float(np.min(values)), float(np.max(values))
+    hist.min = lo if hist.min is None else min(hist.min, lo)
+    hist.max = hi if hist.max is None else max(hist.max, hi)
+    return hist
+
+
+def standalone_move_deltas(cols, group_ids=None):
+    """不在任何按键组内的鼠标移动之间的相邻位移 (dx, dy)。"""
+    if group_ids is None:
+        group_ids = action_group_ids(cols)
+    moves = (cols.type == MOUSE_MOVE) & (group_ids < 0)
+    return np.diff(cols.x[moves]), np.diff(cols.y[moves])
@@ -0,0 +1,102 @@
+"""
+jsonl 事件日志的可插拔解码层。
+
+按 orjson、msgspec、标准库 json 的顺序使用第一个已安装的解码器，也可以按名称指定（见 DECODERS）。
+每行解码后转成 EventRecord：带 __slots__ 的定型事件记录，按键名/按钮名经 sys.intern 驻留，
+同一个键在整份日志中只占一个字符串对象。EventRecord 支持 e['type'] / e.get('key') / 'key' in e，
+可以直接替代 iter_events 产出的 dict 送入 get_event_space 的各阶段。
+解析失败的行与 iter_jsonl_events 一样报告行号和内容后跳过。
+"""
+import json
+import sys
+
+try:
+    import orjson
+except ImportError:  # orjson / msgspec 都是可选依赖，缺失时退回标准库
+    orjson = None
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+from event_log import is_binary_log, iter_binary_events
+
+
+class EventRecord:
+    """一条输入事件。jsonl 中没有的字段不设置，访问时按缺失处理，与 dict 的语义一致；不认识的字段被忽略。"""
+    __slots__ = ("type", "key", "button", "position", "time", "dx", "dy", "scroll", "frame_index")
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def __contains__(self, name):
+        return hasattr(self, name)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__ if hasattr(self, name)}
+
+    def __repr__(self):
+        return f"EventRecord({self.to_dict()})"
+
+
+_FIELDS = frozenset(EventRecord.__slots__)
+_ACTOR_FIELDS = ("key", "button")
+
+
+def to_record(event, intern=sys.intern):
+    """把解码得到的事件 dict 转成 EventRecord。"""
+    record = EventRecord()
+    for name, value in event.items():
+        if name in _FIELDS:
+            if value.__class__ is str and name in _ACTOR_FIELDS:
+                value = intern(value)
+            setattr(record, name, value)
+    return record
+
+
+# 解码器名称 -> (bytes -> 对象, 解析失败时抛出的异常类型)，按优先级排列
+DECODERS = {}
+if orjson is not None:
+    DECODERS["orjson"] = (orjson.loads, orjson.JSONDecodeError)
+if msgspec is not None:
+    DECODERS["msgspec"] = (msgspec.json.Decoder().decode, (msgspec.DecodeError, ValueError))
+# json.loads 接受 bytes；非法 utf-8 抛出的 UnicodeDecodeError 也是 ValueError
+DECODERS["json"] = (json.loads, ValueError)
+
+
+def resolve_decoder(name=None):
+    """返回解码器名称：name 为空时取优先级最高的已安装解码器，未安装或未知时抛出 ValueError。"""
+    if name is None:
+        return next(iter(DECODERS))
+    if name not in DECODERS:
+        raise ValueError(f"解码器 {name} 未安装或不受支持，可用: {', '.join(DECODERS)}")
+    return name
+
+
+def iter_jsonl_records(path, decoder=None):
+    """逐行读取 jsonl 并产出 EventRecord，跳过空行，解析失败时报告行号并跳过。"""
+    loads, errors = DECODERS[resolve_decoder(decoder)]
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                event = loads(line)
+            except errors as e:
+                print(f"警告：第 {line_number} 行JSON解析失败，已跳过。错误：{e}")
+                print(f"   --> 内容: {line.decode('utf-8', 'replace').strip()}")
+                continue
+            yield to_record(event)
+
+
+def iter_event_records(path, decoder=None):
+    """根据文件头自动识别格式，流式产出 EventRecord。二进制日志不经过 JSON 解码，decoder 对其无效。"""
+    if is_binary_log(path):
+        return map(to_record, iter_binary_events(path))
+    return iter_jsonl_records(path, decoder)
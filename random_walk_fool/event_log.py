@@ -0,0 +1,299 @@
+"""
+紧凑二进制事件日志格式，以及与 recorder_app 的 .jsonl 之间的无损互转。
+
+文件布局：
+    MAGIC (8 字节) | 头部长度 uint32 | 头部 JSON (utf-8) | 定长记录 ...
+
+头部 JSON 中包含记录的 struct 格式、字段名、事件类型表和字符串表（按键名/鼠标按钮名）。
+每条记录都是定长的 struct：类型码、标志位、字符串 id、int64 纳秒时间戳、int32 x/y，
+降采样后的鼠标移动携带的累计位移 int32 dx/dy（滚轮事件的滚动量也记在 dx/dy），以及对齐到视频的 int32 帧号。
+读取时按头部声明的字段解析，旧版本文件仍可读取。
+录制时遇到头部字符串表里没有的按键名，会插入一条 STRING_DEF 记录，
+其 actor 为新分配的 id，x 为名称的字节长度，记录后紧跟 utf-8 编码的名称。
+"""
+import json
+import os
+import struct
+import sys
+
+MAGIC = b"GTEVLOG\x00"
+FORMAT_VERSION = 4
+BINARY_SUFFIX = ".gtev"
+
+RECORD_FORMAT = "<BBHqiiiii"
+RECORD_FIELDS = ["type", "flags", "actor", "t_ns", "x", "y", "dx", "dy", "frame_index"]
+
+# 类型码 0 保留，STRING_DEF 为内部记录
+EVENT_TYPES = ["", "key_press", "key_release", "mouse_press", "mouse_release", "mouse_move", "mouse_scroll"]
+STRING_DEF = 255
+
+# 标志位
+FLAG_POSITION = 0x01   # 事件带 position
+FLAG_ACTOR = 0x02      # 事件带 key/button 且不为 null
+FLAG_DELTA = 0x04      # 事件带 dx/dy（降采样后的 mouse_move 的累计位移，或 mouse_scroll 的滚动量）
+FLAG_FRAME = 0x08      # 事件带视频帧号 frame_index
+
+# 每种事件类型在 jsonl 中允许的字段顺序，解码时按此顺序重建 dict 以保证输出逐字节一致
+_TYPE_FIELDS = {
+    "key_press": [("type", "key", "time")],
+    "key_release": [("type", "key", "time")],
+    "mouse_press": [("type", "position", "button", "time")],
+    "mouse_release": [("type", "position", "button", "time")],
+    "mouse_move": [("type", "position", "time"), ("type", "position", "dx", "dy", "time")],
+    "mouse_scroll": [("type", "position", "dx", "dy", "time"), ("type", "dx", "dy", "time")],
+}
+# 录制时对齐了视频的事件在末尾多一个 frame_index
+for _layouts in _TYPE_FIELDS.values():
+    _layouts.extend([fields + ("frame_index",) for fields in _layouts])
+
+_NS_PER_SEC = 1_000_000_000
+_INT32_MIN, _INT32_MAX = -(1 << 31), (1 << 31) - 1
+
+
+def _default_strings():
+    """预置的字符串表：pynput 常见的 Key.* / Button.* 名称和可打印 ASCII 字符。"""
+    keys = [
+        "alt", "alt_l", "alt_r", "alt_gr", "backspace", "caps_lock", "cmd", "cmd_l", "cmd_r",
+        "ctrl", "ctrl_l", "ctrl_r", "delete", "down", "end", "enter", "esc", "home", "insert",
+        "left", "menu", "num_lock", "page_down", "page_up", "pause", "print_screen", "right",
+        "scroll_lock", "shift", "shift_l", "shift_r", "space", "tab", "up",
+        "media_play_pause", "media_volume_mute", "media_volume_down", "media_volume_up",
+        "media_previous", "media_next",
+    ] + [f"f{i}" for i in range(1, 25)]
+    strings = [f"Key.{k}" for k in keys]
+    strings += ["Button.left", "Button.right", "Button.middle", "Button.x1", "Button.x2", "Button.unknown"]
+    strings += [chr(c) for c in range(0x21, 0x7F)]
+    return strings
+
+
+def time_to_ns(t):
+    """float 秒 -> int 纳秒。整数部分单独处理，避免大时间戳乘 1e9 时丢精度。"""
+    whole = int(t)
+    return whole * _NS_PER_SEC + round((t - whole) * 1e9)
+
+
+def ns_to_time(ns):
+    # int / int 在 Python 中是正确舍入的，保证 time_to_ns 的逆运算无损
+    return ns / _NS_PER_SEC
+
+
+def is_binary_log(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class BinaryLogWriter:
+    """流式写入二进制事件日志。接口与文件对象类似：write(event) / flush() / close()。"""
+
+    def __init__(self, path, strings=None, meta=None):
+        self._record = struct.Struct(RECORD_FORMAT)
+        self._type_codes = {name: code for code, name in enumerate(EVENT_TYPES) if name}
+        self._strings = list(strings) if strings is not None else _default_strings()
+        self._string_ids = {s: i for i, s in enumerate(self._strings)}
+        self._f = open(path, "wb")
+        header = {
+            "version": FORMAT_VERSION,
+            "record_format": RECORD_FORMAT,
+            "fields": RECORD_FIELDS,
+            "types": EVENT_TYPES,
+            "string_def": STRING_DEF,
+            "strings": self._strings,
+            "meta": meta or {},
+        }
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        self._f.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+
+    def _intern(self, s):
+        sid = self._string_ids.get(s)
+        if sid is None:
+            sid = len(self._strings)
+            if sid > 0xFFFF:
+                raise ValueError("字符串表已满（最多 65536 项）")
+            data = s.encode("utf-8")
+            self._strings.append(s)
+            self._string_ids[s] = sid
+            self._f.write(self._record.pack(STRING_DEF, 0, sid, 0, len(data), 0, 0, 0, 0) + data)
+        return sid
+
+    def encode(self, event):
+        """把一个 jsonl 事件 dict 编码成定长记录。不能无损表示的事件抛出 ValueError。"""
+        etype = event.get("type")
+        if tuple(event.keys()) not in _TYPE_FIELDS.get(etype, ()):
+            raise ValueError(f"不支持的事件结构: {event}")
+
+        flags, actor, x, y, dx, dy, frame = 0, 0, 0, 0, 0, 0, 0
+        name = event.get("key") if "key" in event else event.get("button")
+        if name is not None:
+            flags |= FLAG_ACTOR
+            actor = self._intern(name)
+        if "position" in event:
+            x, y = event["position"]
+            if type(x) is not int or type(y) is not int or not (_INT32_MIN <= x <= _INT32_MAX and _INT32_MIN <= y <= _INT32_MAX):
+                raise ValueError(f"坐标不是 int32: {event['position']}")
+            flags |= FLAG_POSITION
+        if "dx" in event:
+            dx, dy = event["dx"], event["dy"]
+            if type(dx) is not int or type(dy) is not int or not (_INT32_MIN <= dx <= _INT32_MAX and _INT32_MIN <= dy <= _INT32_MAX):
+                raise ValueError(f"位移不是 int32: {dx}, {dy}")
+            flags |= FLAG_DELTA
+        if "frame_index" in event:
+            frame = event["frame_index"]
+            if type(frame) is not int or not (_INT32_MIN <= frame <= _INT32_MAX):
+                raise ValueError(f"帧号不是 int32: {frame}")
+            flags |= FLAG_FRAME
+
+        t = event["time"]
+        t_ns = time_to_ns(t)
+        if ns_to_time(t_ns) != t:
+            raise ValueError(f"时间戳无法无损表示为纳秒: {t}")
+        return self._record.pack(self._type_codes[etype], flags, actor, t_ns, x, y, dx, dy, frame)
+
+    def write(self, event):
+        self._f.write(self.encode(event))
+
+    def write_many(self, events):
+        self._f.write(b"".join(self.encode(e) for e in events))
+
+    def flush(self):
+        self._f.flush()
+
+    def close(self):
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_header(f):
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("不是 GameTrace 二进制事件日志")
+    (length,) = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+def iter_binary_events(path, chunk_size=1 << 16):
+    """流式读取二进制日志，逐个产出与 jsonl 中一致的事件 dict。内存占用与文件长度无关。"""
+    with open(path, "rb") as f:
+        header = read_header(f)
+        record = struct.Struct(header["record_format"])
+        size = record.size
+        types = header["types"]
+        string_def = header["string_def"]
+        strings = list(header["strings"])
+        # 按头部声明的字段定位各列，兼容字段较少的旧版本文件
+        fields = header["fields"]
+        i_code, i_flags, i_actor, i_t, i_x, i_y = (fields.index(n) for n in ("type", "flags", "actor", "t_ns", "x", "y"))
+        i_dx = fields.index("dx") if "dx" in fields else None
+        i_dy = fields.index("dy") if "dy" in fields else None
+        i_frame = fields.index("frame_index") if "frame_index" in fields else None
+
+        buf = b""
+        pos = 0
+        while True:
+            if len(buf) - pos < size:
+                more = f.read(chunk_size * size)
+                buf = buf[pos:] + more
+                pos = 0
+                if len(buf) < size:
+                    if buf:
+                        raise ValueError(f"文件末尾存在不完整的记录（{len(buf)} 字节）")
+                    return
+            rec = record.unpack_from(buf, pos)
+            pos += size
+            code, flags, actor, x = rec[i_code], rec[i_flags], rec[i_actor], rec[i_x]
+
+            if code == string_def:
+                while len(buf) - pos < x:
+                    more = f.read(chunk_size * size)
+                    if not more:
+                        raise ValueError("字符串定义记录被截断")
+                    buf = buf[pos:] + more
+                    pos = 0
+                name = buf[pos:pos + x].decode("utf-8")
+                pos += x
+                if actor != len(strings):
+                    raise ValueError(f"字符串 id 不连续: {actor}")
+                strings.append(name)
+                continue
+
+            etype = types[code]
+            event = {"type": etype}
+            name = strings[actor] if flags & FLAG_ACTOR else None
+            if etype.startswith("key_"):
+                event["key"] = name
+            else:
+                if flags & FLAG_POSITION:
+                    event["position"] = [x, rec[i_y]]
+                if etype != "mouse_move" and etype != "mouse_scroll":
+                    event["button"] = name
+                if flags & FLAG_DELTA:
+                    event["dx"] = rec[i_dx]
+                    event["dy"] = rec[i_dy]
+            event["time"] = ns_to_time(rec[i_t])
+            if flags & FLAG_FRAME:
+                event["frame_index"] = rec[i_frame]
+            yield event
+
+
+def iter_jsonl_events(path):
+    """逐行读取 jsonl，跳过空行，解析失败时报告行号并跳过。"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"警告：第 {line_number} 行JSON解析失败，已跳过。错误：{e}")
+                print(f"   --> 内容: {line.strip()}")
+
+
+def iter_events(path):
+    """根据文件头自动识别格式，流式产出事件。"""
+    if is_binary_log(path):
+        return iter_binary_events(path)
+    return iter_jsonl_events(path)
+
+
+def jsonl_to_binary(src, dst):
+    """jsonl -> 二进制。先扫描一遍收集字符串，使字符串表完整写入头部。返回写入的事件数。"""
+    strings = _default_strings()
+    seen = set(strings)
+    for event in iter_jsonl_events(src):
+        name = event.get("key") if "key" in event else event.get("button")
+        if name is not None and name not in seen:
+            seen.add(name)
+            strings.append(name)
+
+    count = 0
+    with BinaryLogWriter(dst, strings=strings) as writer:
+        for event in iter_jsonl_events(src):
+            writer.write(event)
+            count += 1
+    return count
+
+
+def binary_to_jsonl(src, dst):
+    """二进制 -> jsonl，输出格式与 recorder_app 写出的完全一致。返回写出的事件数。"""
+    count = 0
+    with open(dst, "w", encoding="utf-8") as f:
+        for event in iter_binary_events(src):
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"用法: python {os.path.basename(__file__)} <输入文件> <输出文件>")
+        print("      输入为 .jsonl 时转换为二进制，输入为二进制日志时转换为 .jsonl")
+        sys.exit(1)
+    src, dst = sys.argv[1], sys.argv[2]
+    if is_binary_log(src):
+        n = binary_to_jsonl(src, dst)
+    else:
+        n = jsonl_to_binary(src, dst)
+    print(f"已转换 {n} 条事件: {src} -> {dst}")
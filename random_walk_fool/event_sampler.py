@@ -0,0 +1,310 @@
+"""
+把事件空间编译成扁平的动作计划，并按权重批量采样。
+
+foolio 逐次执行时要在 dict 上反复按 type/action 分派、在 combo 中递归，按权重选择事件也是 O(事件数)。
+这里在载入时一次性把每个事件编译成固定的步骤序列（combo 展平），每一步的随机参数（按键、按钮、时长、位移）
+都准备好向量化的采样器；事件按权重（默认为事件空间中的 count，也可以自行给出）建立别名表（Vose alias method），
+每次选择 O(1)。批量采样时按事件分组，一次生成一组计划的全部参数。
+
+计划（plan）是按时间排列的操作元组 (offset, op, *args) 组成的元组，offset 为相对计划开始的秒数：
+    (offset, "key_tap", key) / (offset, "key_down", key) / (offset, "key_up", key)
+    (offset, "mouse_down", button) / (offset, "mouse_up", button)
+    (offset, "move_to", x, y, duration) / (offset, "move_rel", dx, dy, duration)
+    (offset, "scroll", dx, dy)
+按住类动作展开为 down / up 两个操作，up 的 offset 加上采样的时长；combo 的各步依次衔接。
+计划只描述要做什么，不依赖 pyautogui，由 foolio 执行。
+
+    python event_sampler.py data/game_event_space.json [--game "Black Myth: Wukong"] [--samples 1000000]
+"""
+import argparse
+import gc
+import json
+import sys
+import time
+from itertools import chain, repeat
+
+import numpy as np
+
+from sketch import bin_bounds
+
+KEY_TAP = "key_tap"
+KEY_DOWN = "key_down"
+KEY_UP = "key_up"
+MOUSE_DOWN = "mouse_down"
+MOUSE_UP = "mouse_up"
+MOVE_TO = "move_to"
+MOVE_REL = "move_rel"
+SCROLL = "scroll"
+
+DEFAULT_ACTION_GAP_RANGE = [0.2, 1.0]
+
+
+def alias_table(weights):
+    """Vose 别名表：返回 (prob, alias)。权重须非负且不全为 0；权重为 0 的项不会被选中。"""
+    w = np.asarray(weights, dtype=np.float64)
+    n = len(w)
+    if n == 0 or (w < 0).any() or not np.isfinite(w).all() or w.sum() <= 0:
+        raise ValueError("权重须为非负有限数且不全为 0")
+    scaled = w * n / w.sum()
+    prob = np.ones(n)
+    alias = np.arange(n)
+    small = [i for i in range(n) if scaled[i] < 1.0]
+    large = [i for i in range(n) if scaled[i] >= 1.0]
+    while small and large:
+        s, g = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], g
+        scaled[g] -= 1.0 - scaled[s]
+        (small if scaled[g] < 1.0 else large).append(g)
+    # 剩下的项只因浮点误差没有配对，其 scaled 都接近 1，prob 保持 1
+    return prob, alias
+
+
+def alias_draw(rng, prob, alias, k):
+    i = rng.integers(len(prob), size=k)
+    return np.where(rng.random(k) < prob[i], i, alias[i])
+
+
+############################## 参数采样器：(rng, k) -> 长度为 k 的数组或标量
+def _choices(items):
+    if len(items) == 1:
+        item = items[0]
+        return lambda rng, k: item
+    values = np.array(items, dtype=object)
+    return lambda rng, k: values[rng.integers(len(values), size=k)]
+
+
+def _histogram(d, integer=False):
+    """按计数选桶、桶内均匀分布，与 sketch.sample_histogram / sample_int 相同。"""
+    prob, alias = alias_table(d["counts"])
+    bounds = bin_bounds(d)
+    lo = np.array([b[0] for b in bounds], dtype=np.float64)
+    hi = np.array([b[1] for b in bounds], dtype=np.float64)
+    if integer:
+        inclusive = np.array([b[2] for b in bounds])
+        lo = np.ceil(lo)
+        hi = np.maximum(lo, np.where(inclusive, np.floor(hi), np.ceil(hi) - 1))
+
+        def sample(rng, k):
+            b = alias_draw(rng, prob, alias, k)
+            return (lo[b] + np.floor(rng.random(k) * (hi[b] - lo[b] + 1))).astype(np.int64)
+        return sample
+
+    def sample(rng, k):
+        b = alias_draw(rng, prob, alias, k)
+        return lo[b] + rng.random(k) * (hi[b] - lo[b])
+    return sample
+
+
+def _durations(event, hist_key, range_key, default):
+    """非负时长：有直方图时按分布采样，否则在 range 内均匀采样（同 foolio.sample_duration）。"""
+    hist = event.get(hist_key)
+    if hist and hist.get("count"):
+        sample = _histogram(hist)
+    else:
+        lo, hi = event.get(range_key, default)
+        sample = lambda rng, k: rng.uniform(lo, hi, k)
+    return lambda rng, k: np.maximum(0.0, sample(rng, k))
+
+
+def _ints(hist, value_range):
+    """整数位移：有直方图时按分布采样，否则在 [min, max] 内均匀取整数。"""
+    if hist and hist.get("count"):
+        return _histogram(hist, integer=True)
+    lo, hi = int(value_range[0]), int(value_range[1])
+    return lambda rng, k: rng.integers(lo, hi + 1, size=k)
+
+
+############################## 编译：每个步骤为 (rng, k, 起始 offset) -> ([(offset, op, [参数...]), ...], 结束 offset)
+def _keyboard_step(event):
+    keys = _choices(event["keys"])
+    action = event.get("action", "press")
+    if action == "press":
+        return lambda rng, k, t: ([(t, KEY_TAP, [keys(rng, k)])], t)
+    if action == "hold":
+        duration = _durations(event, "hold_duration_hist", "hold_duration_range", [0.1, 0.1])
+
+        def hold(rng, k, t):
+            key = keys(rng, k)
+            end = t + duration(rng, k)
+            return [(t, KEY_DOWN, [key]), (end, KEY_UP, [key])], end
+        return hold
+    if action == "down":
+        return lambda rng, k, t: ([(t, KEY_DOWN, [keys(rng, k)])], t)
+    if action == "release":
+        return lambda rng, k, t: ([(t, KEY_UP, [keys(rng, k)])], t)
+    raise ValueError(f"Unknown keyboard action: {action}")
+
+
+def _mouse_step(event):
+    action = event.get("action")
+    buttons = _choices(event.get("buttons", ["left"]))
+    if action == "click":
+        clicks = event.get("clicks", 1)
+        if event.get("click_duration_hist"):
+            duration = _durations(event, "click_duration_hist", "interval_range", [0, 0])
+
+            def click(rng, k, t):
+                button = buttons(rng, k)
+                ops = []
+                for _ in range(clicks):
+                    end = t + duration(rng, k)
+                    ops += [(t, MOUSE_DOWN, [button]), (end, MOUSE_UP, [button])]
+                    t = end
+                return ops, t
+            return click
+        interval = _durations(event, None, "interval_range", [0, 0])
+
+        def click(rng, k, t):
+            button, gap = buttons(rng, k), interval(rng, k)
+            ops = []
+            for _ in range(clicks):
+                # 与 pyautogui.click 相同：每次点击后等待 interval
+                ops += [(t, MOUSE_DOWN, [button]), (t, MOUSE_UP, [button])]
+                t = t + gap
+            return ops, t
+        return click
+    if action == "move":
+        relative = event.get("relative")
+        x = _ints(event.get("dx_hist") if relative else None, event["x_range"])
+        y = _ints(event.get("dy_hist") if relative else None, event["y_range"])
+        duration = _durations(event, "duration_hist", "duration_range", [0, 0])
+        op = MOVE_REL if relative else MOVE_TO
+
+        def move(rng, k, t):
+            d = duration(rng, k)
+            return [(t, op, [x(rng, k), y(rng, k), d])], t + d
+        return move
+    if action == "down":
+        return lambda rng, k, t: ([(t, MOUSE_DOWN, [buttons(rng, k)])], t)
+    if action == "release":
+        return lambda rng, k, t: ([(t, MOUSE_UP, [buttons(rng, k)])], t)
+    if action == "scroll":
+        dx = _ints(None, event["dx_range"]) if event.get("dx_range") else (lambda rng, k: 0)
+        dy = _ints(None, event["dy_range"]) if event.get("dy_range") else (lambda rng, k: 0)
+        return lambda rng, k, t: ([(t, SCROLL, [dx(rng, k), dy(rng, k)])], t)
+    raise ValueError(f"Unknown mouse action: {action}")
+
+
+def compile_event(event):
+    """把一个事件编译成步骤列表，combo 按顺序展平。"""
+    etype = event.get("type")
+    if etype == "keyboard":
+        return [_keyboard_step(event)]
+    if etype == "mouse":
+        return [_mouse_step(event)]
+    if etype == "combo":
+        return [step for sub in event.get("steps", []) for step in compile_event(sub)]
+    raise ValueError(f"Unsupported event type: {etype}")
+
+
+def _column(value, k):
+    return value.tolist() if isinstance(value, np.ndarray) else repeat(value, k)
+
+
+class EventSampler:
+    """
+    编译后的事件空间。schema 为 {"events": [...], "action_gap_hist"?: ...}（即 game_event_space.json 中的一个游戏）；
+    weights 与 events 一一对应，缺省取各事件的 count（没有时按 1 计）。
+    """
+
+    def __init__(self, schema, weights=None, seed=None):
+        self.events = schema.get("events", [])
+        if not self.events:
+            raise ValueError("事件空间中没有事件")
+        if weights is None:
+            weights = [event.get("count", 1) for event in self.events]
+        if len(weights) != len(self.events):
+            raise ValueError(f"权重个数 {len(weights)} 与事件数 {len(self.events)} 不一致")
+        self.programs = [compile_event(event) for event in self.events]
+        self.prob, self.alias = alias_table(weights)
+        self.rng = np.random.default_rng(seed)
+        self._gap = _durations(schema, "action_gap_hist", "action_gap_range", DEFAULT_ACTION_GAP_RANGE)
+
+    def sample_indices(self, n):
+        """按权重选出 n 个事件下标。"""
+        return alias_draw(self.rng, self.prob, self.alias, n)
+
+    def sample_gaps(self, n):
+        """n 个相邻动作之间的间隔（秒）。"""
+        return self._gap(self.rng, n).tolist()
+
+    def sample(self, n):
+        """按权重采样 n 个计划，返回计划列表（顺序即采样顺序）。"""
+        return self.plans(self.sample_indices(n))
+
+    def sample_with_gaps(self, n):
+        """n 个计划以及每个计划之后的间隔（秒）。"""
+        return self.sample(n), self.sample_gaps(n)
+
+    def plans(self, indices):
+        """为给定的事件下标序列各生成一个计划，返回计划列表（与 indices 同序）。"""
+        indices = np.asarray(indices, dtype=np.int64)
+        n = len(indices)
+        order = np.argsort(indices, kind="stable")
+        counts = np.bincount(indices, minlength=len(self.programs))
+        position = np.empty(n, dtype=np.int64)
+        position[order] = np.arange(n)
+        # 计划只含字符串和数字，不会形成循环引用；生成期间暂停循环垃圾回收，否则大量元组的分配会反复触发它
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            # 按事件分组生成，再按采样顺序取回
+            grouped = list(chain.from_iterable(self._plans(e, int(counts[e])) for e in np.flatnonzero(counts).tolist()))
+            return [grouped[i] for i in position.tolist()]
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _plans(self, e, k):
+        """为事件 e 生成 k 个计划：逐步骤一次采样 k 组参数，再按列拼成计划元组。"""
+        t = 0.0
+        columns = []
+        for step in self.programs[e]:
+            ops, t = step(self.rng, k, t)
+            for offset, op, args in ops:
+                columns.append(zip(_column(offset, k), repeat(op, k), *(_column(a, k) for a in args)))
+        if not columns:
+            return repeat((), k)
+        return zip(*columns)
+
+    def __iter__(self, batch=1024):
+        """无限产出计划。"""
+        while True:
+            yield from self.sample(batch)
+
+
+def load_event_space(path, game=None):
+    """读取 game_event_space.json，返回指定游戏（缺省为第一个）的事件空间。"""
+    with open(path, "r", encoding="utf-8") as f:
+        spaces = json.load(f)
+    if game is None:
+        game = next(iter(spaces))
+    return spaces[game]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="编译事件空间并测量计划的采样速度")
+    parser.add_argument("event_space", help="game_event_space.json")
+    parser.add_argument("--game", help="游戏名，缺省为文件中的第一个")
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    sampler = EventSampler(load_event_space(args.event_space, args.game), seed=args.seed)
+    compile_time = time.perf_counter() - start
+    start = time.perf_counter()
+    sampler.sample_indices(args.samples)
+    index_time = time.perf_counter() - start
+    start = time.perf_counter()
+    plans = sampler.sample(args.samples)
+    plan_time = time.perf_counter() - start
+    ops = sum(len(plan) for plan in plans)
+    print(f"事件数: {len(sampler.events)}，编译 {compile_time * 1000:.1f} ms")
+    print(f"选择事件: {args.samples / index_time / 1e6:.1f} M 次/秒")
+    print(f"生成计划: {args.samples / plan_time / 1e6:.2f} M 个/秒（平均每个计划 {ops / args.samples:.1f} 个操作）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+事件空间的逐文件结果缓存。
+
+每个录制文件汇总得到的可合并部分结果（EventSpaceAggregator 的状态）按文件内容的 sha256 存成一个 JSON 文件，
+索引 index.json 记录 路径 -> (大小, 修改时间, 内容哈希, 最近使用时间)。
+大小和修改时间都没变的文件直接按索引取结果，不必重新计算哈希；变化了的文件重新计算哈希，
+内容未变（例如只是被复制或 touch）时仍可命中，只有新的或内容有变化的文件需要重新汇总。
+汇总逻辑的参数（缓存版本、HOLD_THRESHOLD 等）变化时整个缓存作废。
+"""
+import hashlib
+import json
+import os
+import time
+
+CACHE_VERSION = 4
+INDEX_NAME = "index.json"
+DEFAULT_MAX_AGE_DAYS = 30  # 超过该天数未被使用的条目在淘汰时删除
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_signature(path):
+    """文件的 (大小, 修改时间 ns)，文件不存在时抛出 FileNotFoundError。"""
+    st = os.stat(path)
+    return st.st_size, st.st_mtime_ns
+
+
+def _blob_path(directory, digest):
+    return os.path.join(directory, f"{digest}.json")
+
+
+def load_blob(directory, digest):
+    """读取内容哈希对应的部分结果，不存在或损坏时返回 None。可在子进程中调用。"""
+    try:
+        with open(_blob_path(directory, digest), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, obj):
+    # 先写临时文件再替换，中途退出不会留下半个文件
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class EventSpaceCache:
+    def __init__(self, directory, params=None, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self.directory = directory
+        self.params = {"version": CACHE_VERSION, **(params or {})}
+        self.max_age = max_age_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self._opened = time.time()
+        os.makedirs(directory, exist_ok=True)
+        self._index_path = os.path.join(directory, INDEX_NAME)
+        self._entries = {}
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        if index and index.get("params") == self.params:
+            self._entries = index.get("entries", {})
+        elif index is not None:
+            self.clear()
+
+    def lookup(self, path):
+        """大小和修改时间与索引一致时返回缓存的内容哈希（不重新计算），否则返回 None。"""
+        entry = self._entries.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        try:
+            size, mtime_ns = file_signature(path)
+        except OSError:
+            return None
+        if entry["size"] == size and entry["mtime_ns"] == mtime_ns:
+            return entry["digest"]
+        return None
+
+    def load(self, digest):
+        state = load_blob(self.directory, digest)
+        if state is not None:
+            self.hits += 1
+        return state
+
+    def store(self, path, signature, digest, state=None):
+        """记录 path 的签名与内容哈希；给出 state 时写入（或覆盖）对应的部分结果。"""
+        if state is not None:
+            _write_json(_blob_path(self.directory, digest), state)
+            self.misses += 1
+        size, mtime_ns = signature
+        self._entries[os.path.abspath(path)] = {"size": size, "mtime_ns": mtime_ns, "digest": digest, "used": time.time()}
+
+    def remember(self, path, signature, digest):
+        """文件签名变了但内容已在缓存中（由子进程读取）：只更新索引。"""
+        self.hits += 1
+        self.store(path, signature, digest)
+
+    def touch(self, path):
+        entry = self._entries.get(os.path.abspath(path))
+        if entry is not None:
+            entry["used"] = time.time()
+
+    def evict(self):
+        """
+        删除源文件已不存在或长期未使用的条目（本次用到的条目总会保留），以及不再被任何条目引用的结果文件。
+        返回删除的结果文件数。
+        """
+        now = time.time()
+        self._entries = {path: entry for path, entry in self._entries.items()
+                         if os.path.exists(path) and (entry["used"] >= self._opened or now - entry["used"] <= self.max_age)}
+        referenced = {entry["digest"] for entry in self._entries.values()}
+        removed = 0
+        for name in os.listdir(self.directory):
+            digest, ext = os.path.splitext(name)
+            if ext in (".json", ".tmp") and name != INDEX_NAME and digest not in referenced:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+
+    def clear(self):
+        self._entries = {}
+        self.evict()
+
+    def save(self):
+        _write_json(self._index_path, {"params": self.params, "entries": self._entries})
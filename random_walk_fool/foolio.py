@@ -1,8 +1,16 @@
+import argparse
 import json
+import os
 import random
-import time
 from typing import List, Dict, Any, Union
-import pyautogui
+
+import backends
+import behavior_model
+import event_sampler
+import scheduler
+from sketch import sample_histogram, sample_int
+
+PLAN_BATCH = 256  # main 每次采样的计划数
 
 # ---------- 完整 Schema 定义说明 ----------
 # 顶层字段：
@@ -12,21 +20,25 @@ import pyautogui
 # 1. Keyboard 单键事件
 #    - type: "keyboard"
 #    - keys: List[str]，候选单键
-#    - action: "press" / "hold" / "release"
+#    - action: "press" / "hold" / "down" / "release"（down / release 只按下或只松开，用于 combo）
 #    - hold_duration_range: [min, max]（action="hold" 时有效，单位秒）
+#    - hold_duration_hist: 可选，按住时长的直方图（格式见 sketch.py），给出时按其分布采样，否则在 range 内均匀采样
 #    - 说明：从 keys 随机选一个键执行。
 #
 # 2. Mouse 单按钮事件
 #    - type: "mouse"
 #    - buttons: List[str]，候选按钮（"left","right","middle"）
-#    - action: "click" / "move" / "scroll"
+#    - action: "click" / "move" / "scroll" / "down" / "release"
 #      - click:
 #          - clicks: int
 #          - interval_range: [min, max]
+#          - click_duration_hist: 可选，按下到松开的时长直方图，给出时按采样的时长按住按钮
 #      - move:
 #          - x_range: [min, max]
 #          - y_range: [min, max]
 #          - duration_range: [min, max]
+#          - relative: 可选，为 true 时 x/y 为相对当前位置的位移（moveRel），否则为屏幕坐标
+#          - dx_hist / dy_hist / duration_hist: 可选，位移与时长的直方图
 #      - scroll:
 #          - dx_range: [min, max]
 #          - dy_range: [min, max]
@@ -38,6 +50,16 @@ import pyautogui
 #    - steps: List[Event]，按序执行，每项可为 keyboard 或 mouse 子事件
 #    - 说明：每个 step 按其 own schema 随机采样。
 #
+# 所有事件都可带 count：该事件在录制中出现的次数（get_event_space 生成的 combo 已按步骤签名去重，
+# count 为同类 combo 的次数），main 按 count 加权选择事件（也可传入 weights），缺省按 1 计。
+# main 先用 event_sampler 把事件空间编译成扁平的动作计划，再由 scheduler.DeadlineScheduler 按绝对截止时间执行
+# （overlap=True 时相邻计划的按住动作可以重叠，timing_report 给出时把定时误差直方图写成 json）；
+# sample_and_execute 仍可直接执行单个事件。
+# 给出 model（behavior_model.py 从录制学到的马尔可夫模型）时不再独立地选事件，而是按前几个动作的转移概率
+# 生成动作序列，动作之后的间隔也按该动作的间隔分布采样。
+#
+# 顶层可选字段 action_gap_hist：相邻两次动作之间的间隔直方图，给出时 main 按其分布等待，否则等待 0.2~1.0 秒。
+#
 # ---------- 示例 JSON ----------
 # {
 #   "events": [
@@ -68,12 +90,22 @@ import pyautogui
 # }
 
 
-def load_events(schema_json: Union[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+def load_schema(schema_json: Union[str, Dict[str, Any]]) -> Dict[str, Any]:
     if isinstance(schema_json, str):
-        data = json.loads(schema_json)
-    else:
-        data = schema_json
-    return data.get("events", [])
+        return json.loads(schema_json)
+    return schema_json
+
+
+def load_events(schema_json: Union[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return load_schema(schema_json).get("events", [])
+
+
+def sample_duration(event: Dict[str, Any], hist_key: str, range_key: str, default: List[float]) -> float:
+    """有直方图时按分布采样，否则在 range 内均匀采样。"""
+    value = sample_histogram(event.get(hist_key))
+    if value is None:
+        value = random.uniform(*event.get(range_key, default))
+    return max(0.0, value)
 
 
 def choose_key(keys: List[str]) -> str:
@@ -84,99 +116,202 @@ def choose_button(buttons: List[str]) -> str:
     return random.choice(buttons)
 
 
-def execute_keyboard(event: Dict[str, Any]):
+def execute_keyboard(event: Dict[str, Any], backend: backends.Backend):
     key = choose_key(event["keys"])
     action = event.get("action", "press")
     if action == "press":
-        pyautogui.press(key)
+        backend.key_tap(key)
     elif action == "hold":
-        duration = random.uniform(*event.get("hold_duration_range", [0.1, 0.1]))
-        pyautogui.keyDown(key)
-        time.sleep(duration)
-        pyautogui.keyUp(key)
+        duration = sample_duration(event, "hold_duration_hist", "hold_duration_range", [0.1, 0.1])
+        backend.key_down(key)
+        backend.sleep(duration)
+        backend.key_up(key)
+    elif action == "down":
+        backend.key_down(key)
     elif action == "release":
-        pyautogui.keyUp(key)
+        backend.key_up(key)
     else:
         raise ValueError(f"Unknown keyboard action: {action}")
 
 
-def execute_mouse(event: Dict[str, Any]):
+def execute_mouse(event: Dict[str, Any], backend: backends.Backend):
     action = event.get("action")
     if action == "click":
         button = choose_button(event.get("buttons", ["left"]))
         clicks = event.get("clicks", 1)
+        if event.get("click_duration_hist"):
+            for _ in range(clicks):
+                backend.mouse_down(button)
+                backend.sleep(sample_duration(event, "click_duration_hist", "interval_range", [0, 0]))
+                backend.mouse_up(button)
+            return
         interval = random.uniform(*event.get("interval_range", [0, 0]))
-        pyautogui.click(button=button, clicks=clicks, interval=interval)
+        for i in range(clicks):
+            if i:
+                backend.sleep(interval)
+            backend.mouse_down(button)
+            backend.mouse_up(button)
     elif action == "move":
-        x = random.randint(*event["x_range"])
-        y = random.randint(*event["y_range"])
-        duration = random.uniform(*event.get("duration_range", [0, 0]))
-        pyautogui.moveTo(x, y, duration=duration)
+        x = sample_int(event.get("dx_hist") if event.get("relative") else None)
+        y = sample_int(event.get("dy_hist") if event.get("relative") else None)
+        x = random.randint(*event["x_range"]) if x is None else x
+        y = random.randint(*event["y_range"]) if y is None else y
+        duration = sample_duration(event, "duration_hist", "duration_range", [0, 0])
+        if event.get("relative"):
+            backend.move_rel(x, y, duration)
+        else:
+            backend.move_to(x, y, duration)
+    elif action == "down":
+        backend.mouse_down(choose_button(event.get("buttons", ["left"])))
+    elif action == "release":
+        backend.mouse_up(choose_button(event.get("buttons", ["left"])))
     elif action == "scroll":
-        if event.get("dx_range"):
-            pyautogui.hscroll(random.randint(*event.get("dx_range")))
-        if event.get("dy_range"):
-            pyautogui.vscroll(random.randint(*event.get("dy_range")))
+        dx = random.randint(*event["dx_range"]) if event.get("dx_range") else 0
+        dy = random.randint(*event["dy_range"]) if event.get("dy_range") else 0
+        backend.scroll(dx, dy)
     else:
         raise ValueError(f"Unknown mouse action: {action}")
 
 
-def sample_and_execute(event: Dict[str, Any]) -> None:
+def sample_and_execute(event: Dict[str, Any], backend: backends.Backend = None) -> None:
+    if backend is None:
+        backend = backends.PyAutoGuiBackend()
     etype = event.get("type")
     if etype == "keyboard":
-        execute_keyboard(event)
+        execute_keyboard(event, backend)
     elif etype == "mouse":
-        execute_mouse(event)
+        execute_mouse(event, backend)
     elif etype == "combo":
         for step in event.get("steps", []):
-            sample_and_execute(step)
+            sample_and_execute(step, backend)
     else:
         raise ValueError(f"Unsupported event type: {etype}")
 
 
-def main(schema: Union[str, Dict[str, Any]], iterations: int = None):
-    events = load_events(schema)
-    if not events:
+def iter_plans(sampler, iterations=None):
+    """按批从 sampler 采样，逐个产出 (计划, 间隔)，iterations 为 None 时不停止。"""
+    count = 0
+    while iterations is None or count < iterations:
+        batch = PLAN_BATCH if iterations is None else min(PLAN_BATCH, iterations - count)
+        yield from zip(*sampler.sample_with_gaps(batch))
+        count += batch
+
+
+def main(schema: Union[str, Dict[str, Any]], iterations: int = None, weights: List[float] = None, seed: int = None,
+         overlap: bool = False, timing_report: str = None, backend: backends.Backend = None,
+         model: behavior_model.BehaviorModel = None):
+    schema = load_schema(schema or {})
+    if model is None and not schema.get("events"):
         print("No events defined.")
         return
-    count = 0
+    if backend is None:
+        backend = backends.PyAutoGuiBackend()
+    if model is not None:
+        # 按从录制学到的转移概率生成有先后关系的动作序列，间隔取决于前一个动作
+        sampler = behavior_model.BehaviorSampler(model, seed)
+    else:
+        # 事件空间编译为动作计划，按权重（缺省为事件的出现次数 count）批量采样
+        sampler = event_sampler.EventSampler(schema, weights, seed)
+    runner = scheduler.DeadlineScheduler(backend.ops(), position=backend.position, clock=backend.clock,
+                                         overlap=overlap, wait_until=backend.wait_until,
+                                         measure=not backend.virtual)
     try:
-        while iterations is None or count < iterations:
-            evt = random.choice(events)
-            sample_and_execute(evt)
-            count += 1
-            time.sleep(random.uniform(0.2, 1.0))
+        runner.run(iter_plans(sampler, iterations))
     except KeyboardInterrupt:
         print("Execution stopped by user.")
+    finally:
+        backend.close()
+    report = runner.report()
+    error = report["error"]
+    if error["count"]:
+        print(f"{report['plans']} plans, {error['count']} ops, timing error "
+              f"p50={error['p50'] * 1e3:.3f}ms p99={error['p99'] * 1e3:.3f}ms max={error['max'] * 1e3:.3f}ms")
+    if timing_report:
+        with open(timing_report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
 
 
-if __name__ == '__main__':
-    dct = {
-      "events": [
-        {"type":"keyboard","keys":["a","b","c"],"action":"press"},
-        {"type":"keyboard","keys":["x","y"],"action":"hold","hold_duration_range":[0.2,0.5]},
-        {"type":"mouse","buttons":["left","right"],"action":"click","clicks":1,"interval_range":[0,0.1]},
-        {"type":"mouse","action":"move","x_range":[100,400],"y_range":[100,400],"duration_range":[0.05,0.2]},
-        {
-          "type":"combo",
-          "description":"复制并粘贴",
-          "steps":[
-            {"type":"keyboard","keys":["ctrl"],"action":"hold","hold_duration_range":[0.1,0.2]},
-            {"type":"keyboard","keys":["c"],"action":"press"},
-            {"type":"keyboard","keys":["v"],"action":"press"},
-            {"type":"keyboard","keys":["ctrl"],"action":"release"}
-          ]
-        },
-        {
-          "type":"combo",
-          "description":"按住 Ctrl 然后左键点击",
-          "steps":[
-            {"type":"keyboard","keys":["ctrl"],"action":"press"},
-            {"type":"mouse","buttons":["left"],"action":"click","clicks":1,"interval_range":[0,0.1]},
-            {"type":"keyboard","keys":["ctrl"],"action":"release"}
-          ]
-        }
+DEMO_SCHEMA = {
+  "events": [
+    {"type":"keyboard","keys":["a","b","c"],"action":"press"},
+    {"type":"keyboard","keys":["x","y"],"action":"hold","hold_duration_range":[0.2,0.5]},
+    {"type":"mouse","buttons":["left","right"],"action":"click","clicks":1,"interval_range":[0,0.1]},
+    {"type":"mouse","action":"move","x_range":[100,400],"y_range":[100,400],"duration_range":[0.05,0.2]},
+    {
+      "type":"combo",
+      "description":"复制并粘贴",
+      "steps":[
+        {"type":"keyboard","keys":["ctrl"],"action":"hold","hold_duration_range":[0.1,0.2]},
+        {"type":"keyboard","keys":["c"],"action":"press"},
+        {"type":"keyboard","keys":["v"],"action":"press"},
+        {"type":"keyboard","keys":["ctrl"],"action":"release"}
+      ]
+    },
+    {
+      "type":"combo",
+      "description":"按住 Ctrl 然后左键点击",
+      "steps":[
+        {"type":"keyboard","keys":["ctrl"],"action":"press"},
+        {"type":"mouse","buttons":["left"],"action":"click","clicks":1,"interval_range":[0,0.1]},
+        {"type":"keyboard","keys":["ctrl"],"action":"release"}
       ]
     }
-    main(dct)
+  ]
+}
+
 
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="按事件空间随机执行或生成键鼠动作")
+    parser.add_argument("event_space", nargs="?", help="game_event_space.json，不给出时使用内置示例")
+    parser.add_argument("--game", help="事件空间中的游戏名，缺省取第一个")
+    parser.add_argument("--iterations", type=int, default=None, help="执行的动作数，缺省不停止")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--overlap", action="store_true", help="相邻动作的按住可以重叠")
+    parser.add_argument("--timing-report", help="把定时误差直方图写成 json")
+    parser.add_argument("--backend", choices=sorted(backends.BACKENDS), default="pyautogui",
+                        help="pyautogui 注入真实输入；synthetic 以虚拟时间写出录制格式的 .jsonl；null 只计数")
+    parser.add_argument("-o", "--output", help="synthetic 后端的输出文件")
+    parser.add_argument("--model", nargs="?", const="", default=None,
+                        help="按马尔可夫模型（behavior_model.py 生成的 .npz）生成动作序列，不给路径时使用事件空间旁的模型")
+    parser.add_argument("--start-time", type=float, default=0.0, help="虚拟时间的起点（秒）")
+    args = parser.parse_args(argv)
+
+    if args.event_space:
+        with open(args.event_space, "r", encoding="utf-8") as f:
+            spaces = json.load(f)
+        game = args.game or next(iter(spaces))
+        schema = spaces[game]
+    else:
+        schema = DEMO_SCHEMA
+    model = None
+    if args.model is not None:
+        model_path = args.model or behavior_model.model_path_for(
+            args.event_space or os.path.join("data", "game_event_space.json"))
+        try:
+            model = behavior_model.load_model(model_path, args.game)
+        except FileNotFoundError:
+            parser.error(f"模型文件不存在: {model_path}，请先运行 behavior_model.py")
+        except (KeyError, ValueError) as e:
+            parser.error(e.args[0])
+    if args.backend == "synthetic":
+        if not args.output:
+            parser.error("synthetic 后端需要 -o/--output")
+        if args.iterations is None:
+            parser.error("虚拟时间的后端需要 --iterations")
+        backend = backends.SyntheticRecorderBackend(args.output, start_time=args.start_time)
+    elif args.backend == "null":
+        if args.iterations is None:
+            parser.error("虚拟时间的后端需要 --iterations")
+        backend = backends.NullBackend(start_time=args.start_time)
+    else:
+        backend = backends.PyAutoGuiBackend()
+    main(schema, args.iterations, seed=args.seed, overlap=args.overlap, timing_report=args.timing_report,
+         backend=backend, model=model)
+    if args.backend != "pyautogui":
+        print(f"virtual time {backend.now - args.start_time:.1f}s, ops {backend.counts}"
+              + (f", {backend.events} events -> {args.output}" if args.backend == "synthetic" else ""))
+
+
+if __name__ == '__main__':
+    cli()
@@ -1,85 +1,103 @@
+"""
+从录制的键鼠事件日志构建各游戏的事件空间（game_event_space.json），供 foolio.py 随机采样执行。
+
+    python get_event_space.py data/recordings --game "Black Myth: Wukong" [-o data/game_event_space.json]
+    python get_event_space.py --manifest sessions.json [--workers 8]
+
+输入可以是录制文件（.jsonl / .gtev）或目录（递归查找其中的录制文件），同一 --game 下的文件合并为一个事件空间；
+也可以用清单文件一次给出多个游戏：JSON 列表，每项为 {"recording": 路径, "game": 游戏名} 或 [路径, 游戏名]，
+相对路径相对于清单文件所在目录。各文件在进程池中独立汇总，得到的部分结果再按游戏合并。
+"""
+import argparse
 import json
-from collections import defaultdict
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from event_decode import iter_event_records
+from event_log import BINARY_SUFFIX
+from event_space_cache import DEFAULT_MAX_AGE_DAYS, EventSpaceCache, file_digest, file_signature, load_blob
+from sketch import Histogram, delta_histogram, duration_histogram
 
 # --- 常量定义 ---
 HOLD_THRESHOLD = 0.15 
+MOVE_GESTURE_GAP = 0.25  # 相邻独立移动间隔超过该秒数时算新的移动手势（与 trajectory.py 的 --gap 默认值一致）
 
 def summarize_user_actions(file_path):
-    raw_events = []
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            # 使用 enumerate 可以方便地在出错时报告行号
-            for line_number, line in enumerate(f, 1):
-                # 跳过空行
-                if not line.strip():
-                    continue
-                try:
-                    # 尝试解析当前行
-                    event = json.loads(line)
-                    raw_events.append(event)
-                except json.JSONDecodeError as e:
-                    # 如果仅当前行解析失败，打印警告并跳过，继续处理下一行
-                    print(f"警告：第 {line_number} 行JSON解析失败，已跳过。错误：{e}")
-                    print(f"   --> 内容: {line.strip()}")
-                    
-    except FileNotFoundError:
-        print(f"错误：文件未找到: {file_path}")
-        return {}
+    """
+    流式处理一个录制文件：解析 -> 分组 -> 处理 -> 聚合，逐级以生成器衔接。
+    每个动作组在按住的键全部松开时立即处理并并入累计结果，
+    内存占用只取决于最长的一个未结束的动作组，与文件长度无关。
+    """
+    aggregator = _summarize_file(file_path)
+    return aggregator.summary() if aggregator is not None else {}
 
+def summarize_events(events):
+    """对任意事件迭代器做分组、处理和聚合。"""
+    return aggregate_events(events).summary()
 
-    # 1. 事件分组
-    event_groups = []
-    consumed_indices = set()
-    i = 0
-    while i < len(raw_events):
-        if i in consumed_indices: i += 1; continue
-        event = raw_events[i]
-        
-        if event['type'] in ['mouse_move', 'mouse_scroll']:
-            event_groups.append([event]); consumed_indices.add(i); i += 1; continue
-
-        if event['type'].endswith('_press'):
-            group, end_index = extract_action_group(raw_events, i)
-            if group:
-                event_groups.append(group)
-                for j in range(i, end_index + 1): consumed_indices.add(j)
-                i = end_index + 1
-            else: i += 1
-        else: i += 1
-            
-    # 2. 处理分组
-    processed_events = []
-    for group in event_groups:
-        events_from_group = process_group_to_schema_v4(group)
-        processed_events.extend(events_from_group)
-                
-    # 3. 聚合
-    final_events = aggregate_simple_events_v3(processed_events)
-    return {"events": final_events}
-
-def extract_action_group(events, start_index):
-    """与之前版本相同：提取一个完整的动作组。"""
-    group, active_holds = [], {}
-    initial_event = events[start_index]
-    actor = initial_event.get('key') or initial_event.get('button', 'left')
-    active_holds[actor] = initial_event
-    group.append(initial_event)
-    
-    for i in range(start_index + 1, len(events)):
-        event = events[i]
-        group.append(event)
+def aggregate_events(events):
+    """分组、处理事件并返回 EventSpaceAggregator，便于与其他文件的结果合并。"""
+    aggregator = EventSpaceAggregator()
+    for group in iter_action_groups(events):
+        aggregator.observe_group(group)
+        for event in process_group_to_schema_v4(group):
+            aggregator.add(event)
+    return aggregator
+
+def iter_action_groups(events):
+    """
+    事件分组：独立的 move/scroll 各自成组；
+    按下事件开启一个动作组，直到组内按下的键/按钮全部松开（或文件结束）为止。
+    不属于任何组的松开事件被丢弃。
+    """
+    group, active_holds = None, set()
+    for event in events:
         evt_type = event['type']
-        
-        if evt_type.endswith('_press'):
-            actor = event.get('key') or event.get('button', 'left')
-            if actor not in active_holds: active_holds[actor] = event
-        elif evt_type.endswith('_release'):
-            actor = event.get('key') or event.get('button', 'left')
-            if actor in active_holds: del active_holds[actor]
-        
-        if not active_holds: return group, i
-            
-    return group, len(events) - 1
+        if group is not None:
+            group.append(event)
+            if evt_type.endswith('_press'):
+                active_holds.add(event.get('key') or event.get('button', 'left'))
+            elif evt_type.endswith('_release'):
+                active_holds.discard(event.get('key') or event.get('button', 'left'))
+            if not active_holds:
+                yield group
+                group = None
+        elif evt_type in ('mouse_move', 'mouse_scroll'):
+            yield [event]
+        elif evt_type.endswith('_press'):
+            group = [event]
+            active_holds = {event.get('key') or event.get('button', 'left')}
+    if group:
+        yield group
+
+def _scan_group(group):
+    """
+    单次遍历动作组，按 actor（键名/按钮名）收集处理所需的全部信息：
+    按下次数、最早的按下事件、所有松开时间和最晚的松开时间，以及组内第一条和最后一条鼠标移动。
+    actors 按 actor 在组内首次出现的顺序排列。
+    """
+    actors, first_move, last_move = {}, None, None
+    for e in group:
+        evt_type = e['type']
+        if evt_type == 'mouse_move':
+            if first_move is None: first_move = e
+            last_move = e
+            continue
+        is_press = evt_type.endswith('_press')
+        if not is_press and not evt_type.endswith('_release'): continue
+        actor = e.get('key') or e.get('button', 'left')
+        state = actors.get(actor)
+        if state is None:
+            state = actors[actor] = {"presses": 0, "first_press": None, "release_times": [], "last_release": None}
+        t = e['time']
+        if is_press:
+            state["presses"] += 1
+            if state["first_press"] is None or t < state["first_press"]['time']: state["first_press"] = e
+        else:
+            state["release_times"].append(t)
+            if state["last_release"] is None or t >= state["last_release"]: state["last_release"] = t
+    return actors, first_move, last_move
 
 def process_group_to_schema_v4(group):
     """
@@ -88,7 +106,8 @@ def process_group_to_schema_v4(group):
     if not group: return []
     
     events_to_return = []
-    actors_pressed = {e.get('key') or e.get('button', 'left') for e in group if e['type'].endswith('_press')}
+    actors, first_move, last_move = _scan_group(group)
+    actors_pressed = [actor for actor, state in actors.items() if state["presses"]]
     is_combo = len(actors_pressed) > 1
 
     if is_combo:
@@ -96,36 +115,28 @@ def process_group_to_schema_v4(group):
         steps_with_time = []
         
         # a. 聚合鼠标移动
-        combo_moves = [e for e in group if e['type'] == 'mouse_move']
-        if combo_moves:
-            first_move, last_move = combo_moves[0], combo_moves[-1]
+        if first_move is not None:
             total_dx = last_move['position'][0] - first_move['position'][0]
             total_dy = last_move['position'][1] - first_move['position'][1]
             duration = max(0.0, last_move['time'] - first_move['time'])
             move_step = { "type": "mouse", "action": "move", "x_range": sorted([0, total_dx]), "y_range": sorted([0, total_dy]), "duration_range": [duration, duration] }
-            steps_with_time.append({'time': first_move['time'], 'data': move_step})
+            steps_with_time.append((first_move['time'], move_step))
             
         # b. 区分 wrapper 和 inner 键盘/鼠标行为
-        actor_event_map = defaultdict(list)
-        for e in group:
-            if e['type'].endswith(('_press', '_release')):
-                actor = e.get('key') or e.get('button', 'left')
-                actor_event_map[actor].append(e)
-
         combo_start_time, combo_end_time = group[0]['time'], group[-1]['time']
         
-        for actor, event_list in actor_event_map.items():
-            presses = sorted([e for e in event_list if e['type'].endswith('_press')], key=lambda x: x['time'])
-            if not presses: continue
-            first_press = presses[0]
-            release = next((e for e in sorted(event_list, key=lambda x:x['time']) if e['type'].endswith('_release') and e['time'] > first_press['time']), None)
+        for actor in actors_pressed:
+            first_press = actors[actor]["first_press"]
+            press_time = first_press['time']
+            # 最早的按下之后的第一次松开
+            release_time = min((t for t in actors[actor]["release_times"] if t > press_time), default=None)
             
             # 判断是 "inner" 还是 "wrapper"
             is_wrapper = True
-            if release:
-                duration = release['time'] - first_press['time']
+            if release_time is not None:
+                duration = release_time - press_time
                 # 如果动作时间短，并且不是在 combo 的边缘发生，则认为是 inner
-                if duration < HOLD_THRESHOLD and (first_press['time'] - combo_start_time > 0.01) and (combo_end_time - release['time'] > 0.01):
+                if duration < HOLD_THRESHOLD and (press_time - combo_start_time > 0.01) and (combo_end_time - release_time > 0.01):
                     is_wrapper = False
             
             # c. 创建步骤
@@ -133,37 +144,28 @@ def process_group_to_schema_v4(group):
             actor_key_name = "keys" if actor_type == "keyboard" else "buttons"
 
             if is_wrapper:
-                steps_with_time.append({'time': first_press['time'], 'data': {"type": actor_type, "action": "down", actor_key_name: [actor]}})
-                if release:
-                    steps_with_time.append({'time': release['time'], 'data': {"type": actor_type, "action": "release", actor_key_name: [actor]}})
+                steps_with_time.append((press_time, {"type": actor_type, "action": "down", actor_key_name: [actor]}))
+                if release_time is not None:
+                    steps_with_time.append((release_time, {"type": actor_type, "action": "release", actor_key_name: [actor]}))
             else: # Inner action
                 if actor_type == "keyboard":
-                    steps_with_time.append({'time': first_press['time'], 'data': {"type": "keyboard", "action": "press", "keys": [actor]}})
+                    steps_with_time.append((press_time, {"type": "keyboard", "action": "press", "keys": [actor]}))
                 else:
-                    steps_with_time.append({'time': first_press['time'], 'data': {"type": "mouse", "action": "click", "buttons": [actor], "clicks": 1, "interval_range": [duration, duration]}})
+                    steps_with_time.append((press_time, {"type": "mouse", "action": "click", "buttons": [actor], "clicks": 1, "interval_range": [duration, duration]}))
 
-        steps_with_time.sort(key=lambda x: x['time'])
-        final_steps = [s['data'] for s in steps_with_time]
-        desc = "Combo: " + " + ".join(sorted(list(actors_pressed)))
+        steps_with_time.sort(key=lambda x: x[0])
+        final_steps = [step for _, step in steps_with_time]
+        desc = "Combo: " + " + ".join(sorted(actors_pressed))
         events_to_return.append({"type": "combo", "description": desc, "steps": final_steps})
 
     # --- 2. 提取所有独立的按键/点击行为 (无论是否是 combo) ---
     # (此部分逻辑与上一版相同，以实现事件双重记录)
-    actor_event_map_for_simple = defaultdict(list)
-    for e in group:
-        if e['type'].endswith(('_press', '_release')):
-            actor = e.get('key') or e.get('button', 'left')
-            actor_event_map_for_simple[actor].append(e)
-
-    for actor, event_list in actor_event_map_for_simple.items():
-        presses = sorted([e for e in event_list if e['type'].endswith('_press')], key=lambda x: x['time'])
-        if not presses: continue
-        releases = sorted([e for e in event_list if e['type'].endswith('_release')], key=lambda x: x['time'])
+    for actor in actors_pressed:
+        state = actors[actor]
+        first_press, last_release = state["first_press"], state["last_release"]
         
-        first_press, last_release = presses[0], releases[-1] if releases else None
-        
-        is_hold = (len(presses) > 1) or (not last_release)
-        duration = (last_release['time'] if last_release else group[-1]['time']) - first_press['time']
+        is_hold = (state["presses"] > 1) or (last_release is None)
+        duration = (last_release if last_release is not None else group[-1]['time']) - first_press['time']
         if duration >= HOLD_THRESHOLD: is_hold = True
 
         if 'key' in first_press:
@@ -176,7 +178,7 @@ def process_group_to_schema_v4(group):
         events_to_return.append(simple_event)
 
     # 3. 处理独立的 move/scroll
-    if not actor_event_map_for_simple and group:
+    if not actors and group:
         event = group[0]
         if event['type'] == 'mouse_move': events_to_return.append({"type": "mouse", "action": "move", "raw_event": event})
         elif event['type'] == 'mouse_scroll': events_to_return.append({"type": "mouse", "action": "scroll", "dx": 0, "dy": event.get('scroll', 0)})
@@ -184,57 +186,331 @@ def process_group_to_schema_v4(group):
     return events_to_return
 
 
-def aggregate_simple_events_v3(events):
-    """与上一版相同：聚合所有简单事件，并分离出 combo。"""
-    aggregated = defaultdict(lambda: defaultdict(list))
-    combos = [e for e in events if e['type'] == 'combo']
-    simple_events = [e for e in events if e['type'] != 'combo']
-    
-    last_pos = None
-    for e in simple_events:
+class EventSpaceAggregator:
+    """
+    简单事件的累计聚合：键/按钮只保留集合，时长保留最小/最大值和固定大小的直方图（见 sketch.py），
+    combo 按步骤签名去重并计数（见 combo_signature），每类事件都带有出现次数 count，供 foolio 加权选择。
+    add() 逐个并入 process_group_to_schema_v4 产出的事件，observe_group() 记录相邻动作之间的间隔，
+    result() 给出 aggregate_simple_events_v3 的输出，summary() 另附动作间隔的分布。
+    """
+
+    def __init__(self):
+        self.keyboard_press = set()
+        self.keyboard_press_count = 0
+        self.keyboard_hold = set()
+        self.hold_duration_range = None
+        self.mouse_click = set()
+        self.click_duration_range = None
+        self.combos = {}  # 签名 -> 合并后的 combo（含 count），按首次出现的顺序
+        self.move_gestures = 0  # 独立鼠标移动的手势数，相邻移动间隔超过 MOVE_GESTURE_GAP 时算新的一次
+        self.hists = {
+            "hold_duration": duration_histogram(),
+            "click_duration": duration_histogram(),
+            "move_dx": delta_histogram(),
+            "move_dy": delta_histogram(),
+            "move_interval": duration_histogram(),
+            "action_gap": duration_histogram(),
+        }
+        # 以下只在处理单个事件流时使用，不参与合并与序列化
+        self._last_move = None
+        self._last_action_end = None
+
+    def add(self, e):
+        if e['type'] == 'combo':
+            self._add_combo(e)
+            return
         action = e['action']
         if e['type'] == 'keyboard':
-            aggregated[f'keyboard_{action}']['keys'].extend(e['keys'])
-            if 'hold_duration' in e: aggregated[f'keyboard_{action}']['durations'].append(e['hold_duration'])
+            if action == 'press':
+                self.keyboard_press.update(e['keys'])
+                self.keyboard_press_count += 1
+            elif action == 'hold':
+                self.keyboard_hold.update(e['keys'])
+                self.hold_duration_range = _extend_range(self.hold_duration_range, e['hold_duration'])
+                self.hists["hold_duration"].add(e['hold_duration'])
         elif e['type'] == 'mouse':
             if action == 'click':
-                aggregated['mouse_click']['buttons'].extend(e['buttons'])
-                aggregated['mouse_click']['durations'].append(e['click_duration'])
-            elif action == 'scroll':
-                aggregated['mouse_scroll']['dx'].append(e['dx'])
-                aggregated['mouse_scroll']['dy'].append(e['dy'])
+                self.mouse_click.update(e['buttons'])
+                self.click_duration_range = _extend_range(self.click_duration_range, e['click_duration'])
+                self.hists["click_duration"].add(e['click_duration'])
             elif action == 'move' and 'raw_event' in e:
-                pos = e['raw_event']['position']
-                if last_pos:
-                    aggregated['mouse_move']['x'].append(pos[0] - last_pos[0])
-                    aggregated['mouse_move']['y'].append(pos[1] - last_pos[1])
-                last_pos = pos
-
-    output = []
-    # Keyboard
-    if aggregated['keyboard_press']['keys']: output.append({"type":"keyboard", "keys":sorted(list(set(aggregated['keyboard_press']['keys']))), "action":"press"})
-    if aggregated['keyboard_hold']['keys']:
-        d = aggregated['keyboard_hold']['durations']
-        output.append({"type":"keyboard", "keys":sorted(list(set(aggregated['keyboard_hold']['keys']))), "action":"hold", "hold_duration_range":[min(d), max(d)]})
-    # Mouse
-    if aggregated['mouse_click']['buttons']:
-        d = aggregated['mouse_click']['durations']
-        output.append({"type":"mouse", "buttons":sorted(list(set(aggregated['mouse_click']['buttons']))), "action":"click", "clicks":1, "interval_range":[min(d), max(d)]})
-    
-    output.extend(combos)
-    return output
-
-# Example usage based on the uploaded file
-file_paths = [
-    ("C:\\Users\\59681\\OneDrive\\桌面\\game trace\\GameTrace-main\\GameTrace-main\\data\\record_20250714_173014.jsonl", "Black Myth: Wukong")
-    ]
-output_path = "data\game_event_space.json"
-final_res = {}
-for file_path, game_name in file_paths:
-    # Get the summary of actions
-    summary = summarize_user_actions(file_path)
-    final_res[game_name] = summary
-    
-# Output the summary as JSON
-with open(output_path, "w") as f_out:
-    f_out.write(json.dumps(final_res, indent=4))
+                # 相邻两次独立鼠标移动之间的位移与间隔
+                move, last = e['raw_event'], self._last_move
+                if last and 'position' in move and 'position' in last:
+                    self.hists["move_dx"].add(move['position'][0] - last['position'][0])
+                    self.hists["move_dy"].add(move['position'][1] - last['position'][1])
+                    self.hists["move_interval"].add(move['time'] - last['time'])
+                if last is None or not 0 < move['time'] - last['time'] <= MOVE_GESTURE_GAP:
+                    self.move_gestures += 1
+                self._last_move = move
+
+    def _add_combo(self, combo):
+        signature = combo_signature(combo)
+        existing = self.combos.get(signature)
+        if existing is None:
+            self.combos[signature] = {**combo, "count": combo.get("count", 1)}
+        else:
+            merge_combo(existing, combo)
+
+    def observe_group(self, group):
+        """记录上一个按键动作组结束到这个按键动作组开始的间隔。独立的 move/scroll 不算动作。"""
+        if not group[0]['type'].endswith('_press'):
+            return
+        if self._last_action_end is not None:
+            self.hists["action_gap"].add(group[0]['time'] - self._last_action_end)
+        self._last_action_end = group[-1]['time']
+
+    def merge(self, other):
+        """
+        并入另一个聚合结果：键集合取并集，时长范围取 min/max，
+        combo 按 combo_signature 去重，签名相同的用 merge_combo 合并（count 相加），直方图逐个合并。满足结合律。
+        """
+        self.keyboard_press |= other.keyboard_press
+        self.keyboard_press_count += other.keyboard_press_count
+        self.keyboard_hold |= other.keyboard_hold
+        self.hold_duration_range = _merge_range(self.hold_duration_range, other.hold_duration_range)
+        self.mouse_click |= other.mouse_click
+        self.click_duration_range = _merge_range(self.click_duration_range, other.click_duration_range)
+        self.move_gestures += other.move_gestures
+        for combo in other.combos.values():
+            self._add_combo(combo)
+        for name, hist in self.hists.items():
+            hist.merge(other.hists[name])
+        return self
+
+    def to_state(self):
+        """可 JSON 序列化的聚合状态，用于缓存部分结果。"""
+        return {
+            "keyboard_press": sorted(self.keyboard_press),
+            "keyboard_press_count": self.keyboard_press_count,
+            "keyboard_hold": sorted(self.keyboard_hold),
+            "hold_duration_range": self.hold_duration_range,
+            "mouse_click": sorted(self.mouse_click),
+            "click_duration_range": self.click_duration_range,
+            "move_gestures": self.move_gestures,
+            "combos": list(self.combos.values()),
+            "hists": {name: hist.to_dict() for name, hist in self.hists.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        aggregator = cls()
+        aggregator.keyboard_press = set(state["keyboard_press"])
+        aggregator.keyboard_press_count = state["keyboard_press_count"]
+        aggregator.keyboard_hold = set(state["keyboard_hold"])
+        aggregator.hold_duration_range = tuple(state["hold_duration_range"]) if state["hold_duration_range"] else None
+        aggregator.mouse_click = set(state["mouse_click"])
+        aggregator.click_duration_range = tuple(state["click_duration_range"]) if state["click_duration_range"] else None
+        aggregator.move_gestures = state["move_gestures"]
+        for combo in state["combos"]:
+            aggregator._add_combo(combo)
+        aggregator.hists = {name: Histogram.from_dict(d) for name, d in state["hists"].items()}
+        return aggregator
+
+    def result(self):
+        output = []
+        # Keyboard
+        if self.keyboard_press: output.append({"type":"keyboard", "keys":sorted(self.keyboard_press), "action":"press", "count":self.keyboard_press_count})
+        if self.keyboard_hold:
+            output.append({"type":"keyboard", "keys":sorted(self.keyboard_hold), "action":"hold", "hold_duration_range":list(self.hold_duration_range),
+                           "hold_duration_hist":self.hists["hold_duration"].to_dict(), "count":self.hists["hold_duration"].count})
+        # Mouse
+        if self.mouse_click:
+            output.append({"type":"mouse", "buttons":sorted(self.mouse_click), "action":"click", "clicks":1, "interval_range":list(self.click_duration_range),
+                           "click_duration_hist":self.hists["click_duration"].to_dict(), "count":self.hists["click_duration"].count})
+        dx, dy, interval = self.hists["move_dx"], self.hists["move_dy"], self.hists["move_interval"]
+        if dx.count:
+            # 相对移动：x_range / y_range 为单次位移的范围。
+            # count 为移动手势数而不是采样点数（一次拖动有几十个采样点），否则按 count 加权时 move 会压过按键动作
+            output.append({"type":"mouse", "action":"move", "relative":True, "x_range":[dx.min, dx.max], "y_range":[dy.min, dy.max],
+                           "duration_range":[interval.min, interval.max],
+                           "dx_hist":dx.to_dict(), "dy_hist":dy.to_dict(), "duration_hist":interval.to_dict(), "count":self.move_gestures})
+
+        # 出现次数多的 combo 在前，次数相同时保持首次出现的顺序
+        output.extend(sorted(self.combos.values(), key=lambda c: -c["count"]))
+        return output
+
+    def summary(self):
+        """单个游戏的事件空间：events 以及相邻动作间隔的分布 action_gap_hist（供 foolio 决定两次动作之间的等待）。"""
+        summary = {"events": self.result()}
+        if self.hists["action_gap"].count:
+            summary["action_gap_hist"] = self.hists["action_gap"].to_dict()
+        return summary
+
+# combo 步骤中的连续取值，去重时不参与签名，合并时取并集
+_RANGE_FIELDS = ("x_range", "y_range", "duration_range", "interval_range")
+
+def combo_signature(combo):
+    """combo 的规范签名：各步骤的类型、动作和键/按钮，忽略位移与时长。签名相同的 combo 视为同一种。"""
+    return tuple((step["type"], step["action"], tuple(step.get("keys") or step.get("buttons") or ()))
+                 for step in combo["steps"])
+
+def merge_combo(target, combo):
+    """把签名相同的 combo 并入 target：次数相加，各步骤的位移/时长范围取并集。"""
+    target["count"] += combo.get("count", 1)
+    steps = []
+    for step, other in zip(target["steps"], combo["steps"]):
+        step = dict(step)
+        for field in _RANGE_FIELDS:
+            if field in step and field in other:
+                step[field] = [min(step[field][0], other[field][0]), max(step[field][1], other[field][1])]
+        steps.append(step)
+    target["steps"] = steps
+
+def _extend_range(current, value):
+    if current is None: return (value, value)
+    return (min(current[0], value), max(current[1], value))
+
+def _merge_range(a, b):
+    if a is None: return b
+    if b is None: return a
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+def aggregate_simple_events_v3(events):
+    """聚合所有简单事件，并分离出 combo。"""
+    aggregator = EventSpaceAggregator()
+    for e in events:
+        aggregator.add(e)
+    return aggregator.result()
+
+
+############################## 多文件并行构建
+RECORDING_SUFFIXES = (".jsonl", BINARY_SUFFIX)
+
+def find_recordings(path):
+    """path 为文件时原样返回，为目录时递归查找其中的录制文件（按路径排序）。"""
+    if not os.path.isdir(path):
+        return [path]
+    found = []
+    for root, _, files in os.walk(path):
+        found += [os.path.join(root, name) for name in files if name.endswith(RECORDING_SUFFIXES)]
+    return sorted(found)
+
+def load_manifest(path):
+    """读取 (录制文件, 游戏名) 清单，相对路径相对于清单所在目录。"""
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    base = os.path.dirname(os.path.abspath(path))
+    pairs = []
+    for item in items:
+        recording, game = (item["recording"], item["game"]) if isinstance(item, dict) else item
+        for file_path in find_recordings(os.path.join(base, recording)):
+            pairs.append((file_path, game))
+    return pairs
+
+def _summarize_file(file_path):
+    """汇总单个文件（也是进程池任务），返回 EventSpaceAggregator；文件不存在时返回 None。"""
+    try:
+        # 自动识别 jsonl / 二进制格式并用最快的可用解码器读成 EventRecord；jsonl 解析失败的行会报告行号并跳过
+        return aggregate_events(iter_event_records(file_path))
+    except FileNotFoundError:
+        print(f"错误：文件未找到: {file_path}")
+        return None
+
+def _summarize_for_cache(file_path, cache_directory):
+    """
+    进程池任务（启用缓存时）：计算文件签名与内容哈希，内容已在缓存中时直接读取，否则重新汇总。
+    cache_directory 为 None 时（--rebuild）总是重新汇总。返回 (签名, 哈希, 状态, 是否命中)；文件不存在时返回 None。
+    """
+    try:
+        signature = file_signature(file_path)
+        digest = file_digest(file_path)
+    except FileNotFoundError:
+        print(f"错误：文件未找到: {file_path}")
+        return None
+    state = load_blob(cache_directory, digest) if cache_directory else None
+    if state is not None:
+        return signature, digest, state, True
+    aggregator = _summarize_file(file_path)
+    return None if aggregator is None else (signature, digest, aggregator.to_state(), False)
+
+def build_event_space(pairs, workers=None, cache=None, rebuild=False):
+    """
+    并行汇总 [(录制文件, 游戏名), ...] 并按游戏合并，返回 {游戏名: {"events": [...]}}。
+    合并按输入顺序进行，因此结果与单进程逐个处理相同。workers=1 时不启动进程池。
+    给出 cache（EventSpaceCache）时，未变化的文件直接使用缓存的部分结果，只汇总新的或有变化的文件；
+    rebuild=True 时忽略已有缓存，全部重新汇总并覆盖。
+    """
+    pairs = list(pairs)
+    partials = [None] * len(pairs)
+    todo = []
+    for i, (file_path, _) in enumerate(pairs):
+        if cache is not None and not rebuild:
+            digest = cache.lookup(file_path)
+            state = cache.load(digest) if digest else None
+            if state is not None:
+                cache.touch(file_path)
+                partials[i] = EventSpaceAggregator.from_state(state)
+                continue
+        todo.append(i)
+
+    paths = [pairs[i][0] for i in todo]
+    if cache is None:
+        task, args = _summarize_file, [paths]
+    else:
+        task, args = _summarize_for_cache, [paths, [None if rebuild else cache.directory] * len(paths)]
+    if workers == 1 or len(paths) <= 1:
+        _collect(pairs, todo, map(task, *args), partials, cache)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            _collect(pairs, todo, pool.map(task, *args), partials, cache)
+    return _merge_partials(pairs, partials)
+
+def _collect(pairs, todo, results, partials, cache):
+    for i, result in zip(todo, results):
+        if cache is not None and result is not None:
+            signature, digest, state, hit = result
+            if hit:
+                cache.remember(pairs[i][0], signature, digest)
+            else:
+                cache.store(pairs[i][0], signature, digest, state)
+            result = EventSpaceAggregator.from_state(state)
+        partials[i] = result
+
+def _merge_partials(pairs, partials):
+    merged = {}
+    for (_, game), partial in zip(pairs, partials):
+        merged.setdefault(game, None)
+        if partial is not None:
+            merged[game] = partial if merged[game] is None else merged[game].merge(partial)
+    return {game: agg.summary() if agg is not None else {} for game, agg in merged.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="从键鼠事件日志构建游戏事件空间")
+    parser.add_argument("inputs", nargs="*", help="录制文件或目录（配合 --game）")
+    parser.add_argument("--game", help="inputs 对应的游戏名")
+    parser.add_argument("--manifest", help="(录制文件, 游戏名) 清单，JSON 格式")
+    parser.add_argument("-o", "--output", default=os.path.join("data", "game_event_space.json"), help="输出文件")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为 CPU 核数")
+    parser.add_argument("--cache", help="逐文件结果缓存目录，默认为输出文件旁的 .event_space_cache")
+    parser.add_argument("--no-cache", action="store_true", help="不使用缓存")
+    parser.add_argument("--rebuild", action="store_true", help="忽略已有缓存，全部重新汇总")
+    parser.add_argument("--cache-max-age", type=float, default=DEFAULT_MAX_AGE_DAYS, help="缓存条目多少天未使用后淘汰")
+    args = parser.parse_args(argv)
+
+    pairs = load_manifest(args.manifest) if args.manifest else []
+    if args.inputs:
+        if not args.game:
+            parser.error("给出录制文件或目录时需要指定 --game")
+        pairs += [(file_path, args.game) for path in args.inputs for file_path in find_recordings(path)]
+    if not pairs:
+        parser.error("没有找到录制文件")
+
+    cache = None
+    if not args.no_cache:
+        cache_dir = args.cache or os.path.join(os.path.dirname(args.output) or ".", ".event_space_cache")
+        cache = EventSpaceCache(cache_dir, params={"hold_threshold": HOLD_THRESHOLD}, max_age_days=args.cache_max_age)
+    final_res = build_event_space(pairs, args.workers, cache=cache, rebuild=args.rebuild)
+    if cache is not None:
+        evicted = cache.evict()
+        cache.save()
+        print(f"缓存命中 {cache.hits} 个文件，重新汇总 {cache.misses} 个，淘汰 {evicted} 个结果")
+    # Output the summary as JSON
+    with open(args.output, "w") as f_out:
+        f_out.write(json.dumps(final_res, indent=4))
+    print(f"已处理 {len(pairs)} 个文件，{len(final_res)} 个游戏，输出到 {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
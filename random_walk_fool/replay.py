@@ -0,0 +1,183 @@
+"""
+按原始时间精确回放一份录制（recorder_app 写出的 .jsonl，或 .gtev 二进制日志）。
+
+    python replay.py data/record_xxx.jsonl [--speed 2] [--seek 120] [--until 600] [--backend pyautogui]
+
+流式读取事件（event_decode.iter_event_records），逐个换算成注入操作交给 scheduler.DeadlineScheduler.run_at：
+    key_press / key_release     -> key_down / key_up（pynput 的 Key.shift 等由后端转成 pyautogui 键名）
+    mouse_press / mouse_release -> 先移到记录的位置，再 mouse_down / mouse_up（Button.left -> left）
+    mouse_move                  -> move_to
+    mouse_scroll                -> scroll
+第 i 个事件的截止时间为 起点 + (time_i - time_0) / speed，由录制时间直接算出，多小时的回放也没有累计漂移；
+读取、解码与等待交替进行，内存占用与录制长度无关。回放期间暂停循环垃圾回收，避免回收停顿造成的抖动。
+seek 跳到录制中的某个时刻（与事件的 time 同一时钟，新版录制即视频时间）开始，跳过的部分只用来恢复状态：
+开始时先把鼠标移到当时的位置，并按下当时仍按住的键和按钮。
+"""
+import argparse
+import gc
+import json
+import sys
+
+import backends
+from event_decode import iter_event_records
+from event_sampler import KEY_DOWN, KEY_UP, MOUSE_DOWN, MOUSE_UP, MOVE_TO, SCROLL
+from scheduler import DeadlineScheduler
+
+
+class ReplayState:
+    """回放到当前位置时仍按住的键、按钮和鼠标位置，以及回放范围内的统计。"""
+
+    def __init__(self):
+        self.keys = {}      # 键 -> None，按按下顺序排列
+        self.buttons = {}
+        self.position = None
+        self.first_time = None
+        self.last_time = None
+        self.events = 0
+        self.skipped = 0
+
+
+def _event_ops(event, state):
+    """一个事件对应的注入操作（不含时间），同时更新 state 中的按住状态和鼠标位置。"""
+    etype = event.get('type')
+    position = event.get('position')
+    ops = []
+    if position is not None:
+        position = (position[0], position[1])
+        if position != state.position and etype != 'mouse_scroll':
+            ops.append((MOVE_TO, position[0], position[1], 0))
+        state.position = position
+    if etype == 'key_press' or etype == 'key_release':
+        key = event.get('key')
+        if key is None:  # pynput 没有给出字符的按键（如死键）
+            state.skipped += 1
+            return []
+        if etype == 'key_press':
+            state.keys[key] = None
+            ops.append((KEY_DOWN, key))
+        else:
+            state.keys.pop(key, None)
+            ops.append((KEY_UP, key))
+    elif etype == 'mouse_press' or etype == 'mouse_release':
+        button = event.get('button')
+        if etype == 'mouse_press':
+            state.buttons[button] = None
+            ops.append((MOUSE_DOWN, button))
+        else:
+            state.buttons.pop(button, None)
+            ops.append((MOUSE_UP, button))
+    elif etype == 'mouse_scroll':
+        ops.append((SCROLL, event.get('dx', 0), event.get('scroll', event.get('dy', 0))))
+    elif etype != 'mouse_move':
+        state.skipped += 1
+    return ops
+
+
+def iter_timeline(events, speed=1.0, seek=None, until=None, state=None):
+    """
+    把事件流换算成 (偏移秒, 操作, *参数) 时间线，偏移从回放起点（seek 或第一个事件）算起并按 speed 缩放。
+    时间倒退的事件按上一个事件的时间计；until 之后的事件不再回放。
+    """
+    if state is None:
+        state = ReplayState()
+    t0 = None
+    last = None
+    for event in events:
+        t = event['time']
+        if last is not None and t < last:
+            t = last
+        last = t
+        if until is not None and t > until:
+            return
+        if t0 is None:
+            if seek is not None and t < seek:
+                _event_ops(event, state)  # 只恢复状态
+                continue
+            # 回放起点：恢复 seek 时刻的鼠标位置和按住的键、按钮
+            t0 = t if seek is None else seek
+            if state.position is not None:
+                yield (0.0, MOVE_TO, state.position[0], state.position[1], 0)
+            for key in state.keys:
+                yield (0.0, KEY_DOWN, key)
+            for button in state.buttons:
+                yield (0.0, MOUSE_DOWN, button)
+            state.first_time = t
+        offset = (t - t0) / speed
+        for op in _event_ops(event, state):
+            yield (offset, *op)
+        state.events += 1
+        state.last_time = t
+
+
+def replay(path, backend, speed=1.0, seek=None, until=None, decoder=None):
+    """回放 path，返回 (ReplayState, 调度器的定时报告)。"""
+    if speed <= 0:
+        raise ValueError("speed 必须为正数")
+    state = ReplayState()
+    runner = DeadlineScheduler(backend.ops(), position=backend.position, clock=backend.clock,
+                               wait_until=backend.wait_until, measure=not backend.virtual)
+    timeline = iter_timeline(iter_event_records(path, decoder), speed, seek, until, state)
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        runner.run_at(timeline)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return state, runner.report()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按原始时间回放录制的键鼠事件")
+    parser.add_argument("recording", help="录制文件（.jsonl 或 .gtev）")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放速度倍数")
+    parser.add_argument("--seek", type=float, default=None, help="从录制中的该时刻开始（与事件 time 同一时钟）")
+    parser.add_argument("--seek-from-start", action="store_true", help="--seek / --until 按距第一个事件的秒数计")
+    parser.add_argument("--until", type=float, default=None, help="回放到录制中的该时刻为止")
+    parser.add_argument("--backend", choices=sorted(backends.BACKENDS), default="pyautogui",
+                        help="pyautogui 注入真实输入；synthetic 以虚拟时间写出录制格式的 .jsonl；null 只计数")
+    parser.add_argument("-o", "--output", help="synthetic 后端的输出文件")
+    parser.add_argument("--timing-report", help="把定时误差直方图写成 json")
+    args = parser.parse_args(argv)
+    if args.speed <= 0:
+        parser.error("--speed 必须为正数")
+
+    seek, until = args.seek, args.until
+    if args.seek_from_start and (seek is not None or until is not None):
+        first = next(iter(iter_event_records(args.recording)), None)
+        if first is not None:
+            seek = None if seek is None else first['time'] + seek
+            until = None if until is None else first['time'] + until
+    if args.backend == "synthetic":
+        if not args.output:
+            parser.error("synthetic 后端需要 -o/--output")
+        backend = backends.SyntheticRecorderBackend(args.output, screen_size=None)
+    elif args.backend == "null":
+        backend = backends.NullBackend(screen_size=None)
+    else:
+        backend = backends.PyAutoGuiBackend()
+
+    try:
+        with backend:
+            state, report = replay(args.recording, backend, args.speed, seek, until)
+    except FileNotFoundError:
+        print(f"错误：文件未找到: {args.recording}")
+        return 1
+    except KeyboardInterrupt:
+        print("Replay stopped by user.")
+        return 1
+    duration = 0.0 if state.first_time is None else state.last_time - state.first_time
+    print(f"replayed {state.events} events ({duration:.1f}s of recording, speed x{args.speed:g}), "
+          f"skipped {state.skipped}")
+    error = report["error"]
+    if error["count"]:
+        print(f"timing error p50={error['p50'] * 1e3:.3f}ms p99={error['p99'] * 1e3:.3f}ms "
+              f"max={error['max'] * 1e3:.3f}ms")
+    if args.timing_report:
+        with open(args.timing_report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""
+按绝对截止时间执行动作计划的调度器，并统计计划时间与实际时间的偏差。
+
+逐个 sleep 的执行方式会把每次注入的耗时、sleep 的超时和 pyautogui 的 PAUSE 都累加进去，越跑越慢。
+这里把计划（见 event_sampler）中的每个操作换算成单调时钟上的绝对截止时间放进一个堆里，按时间顺序执行：
+    - 先 sleep 到截止时间前 spin 秒，再忙等到点，避开系统 sleep 的粒度；
+    - 按操作类型估计注入本身的耗时（指数滑动平均），提前这么多发出，使注入完成的时刻落在截止时间上；
+    - 落后时立即执行，不会把误差带到后面的操作，整体没有累计漂移；
+    - 一次移动按 move_interval 拆成多步，各步同样按截止时间执行（注入调用本身不再带 duration）；
+    - 按键和鼠标按钮按引用计数管理：多个计划重叠按住同一个键时只在第一次按下、最后一次松开时注入，
+      结束或中断时松开所有仍按住的键和按钮。
+overlap=True 时下一个计划在上一个计划最后一个非松开操作之后（加上间隔）就开始，
+按住的键在后台按时松开，不同计划的按住动作可以相互重叠；否则等上一个计划全部结束。
+run_at() 则按给定的时间线原样执行（见 replay.py 回放录制）。
+每个操作的偏差（注入完成时刻 - 截止时间）和注入耗时记入直方图（sketch.timing_error_histogram），report() 给出汇总。
+"""
+import heapq
+import time
+
+from event_sampler import KEY_DOWN, KEY_UP, MOUSE_DOWN, MOUSE_UP, MOVE_REL, MOVE_TO
+from sketch import timing_error_histogram
+
+DEFAULT_SPIN = 0.002             # 截止时间前多少秒改为忙等
+DEFAULT_MOVE_INTERVAL = 1 / 125  # 移动拆分的步长（秒）
+DEFAULT_LEAD = 0.05              # 第一个计划相对 run() 开始的提前量（秒）
+LATENCY_ALPHA = 0.1              # 注入耗时估计的平滑系数
+
+_RELEASES = (KEY_UP, MOUSE_UP)
+_MOVE_STEP = "_move_step"        # 拆分后的一步移动，参数为 (原操作, 原参数, 共享状态, 序号, 步数)
+
+
+class DeadlineScheduler:
+    """
+    ops: 操作名 -> 注入函数（参数同计划中的操作，移动的 duration 总是传 0），如 backends.Backend.ops()。
+    position: 返回当前鼠标位置的函数，move_to 的插值起点；不给出时 move_to 在最后一步直接到达目标。
+    wait_until: 等到 clock() 到达给定时刻的函数，虚拟时钟（见 backends.VirtualBackend）使用；
+    不给出时 sleep 到 spin 秒之前再忙等。
+    measure: 为 False 时不估计注入耗时、不记录偏差（虚拟时钟下没有意义），只按截止时间顺序执行。
+    """
+
+    def __init__(self, ops, position=None, clock=time.perf_counter, sleep=time.sleep, spin=DEFAULT_SPIN,
+                 move_interval=DEFAULT_MOVE_INTERVAL, overlap=False, wait_until=None,
+                 measure=True):
+        self.ops = ops
+        self.position = position
+        self.clock = clock
+        self.sleep = sleep
+        self.spin = spin
+        self.move_interval = move_interval
+        self.overlap = overlap
+        self.wait_until = wait_until or self._spin_until
+        self.measure = measure
+        self.held = {}          # (KEY_DOWN / MOUSE_DOWN, 键或按钮) -> 按住次数
+        self.latency = {}       # 操作名 -> 注入耗时的估计
+        self.errors = timing_error_histogram()
+        self.latencies = timing_error_histogram()
+        self.errors_by_op = {}
+        self.plans = 0
+        self._seq = 0
+
+    def run(self, plans, lead=DEFAULT_LEAD):
+        """
+        执行 (计划, 间隔) 序列，可以是无限的生成器：只在需要时取下一个计划，内存与序列长度无关。
+        返回时（包括被中断时）松开所有仍按住的键和按钮。
+        """
+        heap = []
+        it = iter(plans)
+        next_start = self.clock() + lead
+        exhausted = False
+        try:
+            while True:
+                # 下一个计划的所有操作都不早于 next_start，之前的操作可以放心先执行
+                while not exhausted and (not heap or next_start <= heap[0][0]):
+                    try:
+                        plan, gap = next(it)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    next_start = self._schedule(heap, plan, next_start) + gap
+                if not heap:
+                    return
+                deadline, _, op, args = heapq.heappop(heap)
+                if self.measure:
+                    self._fire(deadline, op, args)
+                else:
+                    self.wait_until(deadline)
+                    self._execute(op, args)
+        finally:
+            self.release_all()
+
+    def run_at(self, timeline, start=None, lead=DEFAULT_LEAD):
+        """
+        按 (偏移秒, 操作, *参数) 序列逐个执行，截止时间为 start + 偏移（start 缺省为当前时刻 + lead），偏移须不减。
+        截止时间都由 start 直接算出，长时间运行也不会累计漂移。与 run() 不同，操作原样注入：移动不拆分，
+        按键也不按引用计数合并（录制中按住时的自动重复会产生多次按下），只记下仍按住的键和按钮，返回时松开。
+        """
+        if start is None:
+            start = self.clock() + lead
+        try:
+            for offset, op, *args in timeline:
+                if self.measure:
+                    self._fire(start + offset, op, args, self._inject_exact)
+                else:
+                    self.wait_until(start + offset)
+                    self._inject_exact(op, args)
+        finally:
+            self.release_all()
+
+    def _push(self, heap, deadline, op, args):
+        self._seq += 1
+        heapq.heappush(heap, (deadline, self._seq, op, args))
+
+    def _schedule(self, heap, plan, start):
+        """把计划的操作放进堆，返回下一个计划可以开始的时间（不含间隔）。"""
+        self.plans += 1
+        end = start
+        for offset, op, *args in plan:
+            deadline = start + offset
+            finish = deadline
+            if op in (MOVE_TO, MOVE_REL):
+                duration = args[2]
+                finish = deadline + duration
+                steps = max(1, round(duration / self.move_interval))
+                state = {"from": None, "done": (0, 0)}
+                for i in range(1, steps + 1):
+                    self._push(heap, deadline + duration * i / steps, _MOVE_STEP, (op, args, state, i, steps))
+            else:
+                self._push(heap, deadline, op, args)
+            if not (self.overlap and op in _RELEASES):
+                end = max(end, finish)
+        return end
+
+    def _fire(self, deadline, op, args, execute=None):
+        name = op if op != _MOVE_STEP else args[0]
+        self.wait_until(deadline - self.latency.get(name, 0.0))
+        before = self.clock()
+        (execute or self._execute)(op, args)
+        after = self.clock()
+        cost = after - before
+        self.latency[name] = self.latency.get(name, cost) * (1 - LATENCY_ALPHA) + cost * LATENCY_ALPHA
+        self.latencies.add(cost)
+        self.errors.add(after - deadline)
+        hist = self.errors_by_op.get(name)
+        if hist is None:
+            hist = self.errors_by_op[name] = timing_error_histogram()
+        hist.add(after - deadline)
+
+    def _execute(self, op, args):
+        if op == _MOVE_STEP:
+            self._move_step(*args)
+        else:
+            self._inject(op, args)
+
+    def _spin_until(self, t):
+        remaining = t - self.clock()
+        if remaining > self.spin:
+            self.sleep(remaining - self.spin)
+        while self.clock() < t:
+            pass
+
+    def _inject(self, op, args):
+        if op in (KEY_DOWN, MOUSE_DOWN, KEY_UP, MOUSE_UP):
+            kind = KEY_DOWN if op in (KEY_DOWN, KEY_UP) else MOUSE_DOWN
+            key = (kind, args[0])
+            n = self.held.get(key, 0)
+            if op == kind:
+                self.held[key] = n + 1
+                if n:
+                    return  # 已被其他计划按住
+            else:
+                if n > 1:
+                    self.held[key] = n - 1
+                    return  # 还有其他计划按住
+                self.held.pop(key, None)
+        self.ops[op](*args)
+
+    def _inject_exact(self, op, args):
+        if op == KEY_DOWN or op == MOUSE_DOWN:
+            self.held[(op, args[0])] = 1
+        elif op == KEY_UP:
+            self.held.pop((KEY_DOWN, args[0]), None)
+        elif op == MOUSE_UP:
+            self.held.pop((MOUSE_DOWN, args[0]), None)
+        self.ops[op](*args)
+
+    def _move_step(self, op, args, state, i, steps):
+        """第 i 步（共 steps 步）：按比例取到目标的累计位移，只注入与上一步之差，保证总位移精确。"""
+        x, y = args[0], args[1]
+        if op == MOVE_REL:
+            tx, ty = round(x * i / steps), round(y * i / steps)
+            dx, dy = tx - state["done"][0], ty - state["done"][1]
+            state["done"] = (tx, ty)
+            if dx or dy:
+                self.ops[MOVE_REL](dx, dy, 0)
+            return
+        if state["from"] is None:
+            state["from"] = tuple(self.position()) if self.position is not None and i < steps else (x, y)
+        fx, fy = state["from"]
+        self.ops[MOVE_TO](round(fx + (x - fx) * i / steps), round(fy + (y - fy) * i / steps), 0)
+
+    def release_all(self):
+        """松开所有仍按住的键和按钮。"""
+        for (kind, key) in list(self.held):
+            self.ops[KEY_UP if kind == KEY_DOWN else MOUSE_UP](key)
+        self.held.clear()
+
+    def report(self):
+        """偏差与注入耗时的汇总（秒）：分位数、最值和直方图，以及按操作类型的偏差分位数。"""
+        def summary(hist, full=True):
+            out = {"count": hist.count}
+            if hist.count:
+                out.update({"p50": hist.quantile(0.5), "p90": hist.quantile(0.9), "p99": hist.quantile(0.99),
+                            "min": hist.min, "max": hist.max})
+            if full:
+                out["hist"] = hist.to_dict()
+            return out
+        return {
+            "plans": self.plans,
+            "error": summary(self.errors),
+            "latency": summary(self.latencies),
+            "error_by_op": {op: summary(hist, full=False) for op, hist in self.errors_by_op.items()},
+        }
@@ -0,0 +1,149 @@
+"""
+固定大小的直方图 sketch：流式累计、可合并、可序列化进事件空间，并可按分布随机采样。
+
+分桶边界在创建时确定，内存与样本数无关；低于第一条边界/高于最后一条边界的值计入首/末桶，
+同时记录精确的最小值和最大值，采样时首/末桶的范围会延伸到它们。
+序列化格式（同时也是 foolio 采样时读取的格式）：
+    {"edges": "duration", "counts": [...], "count": N, "min": 最小值, "max": 最大值}
+edges 为 EDGE_SCHEMES 中的分桶方案名（事件空间中的直方图共用几套固定边界，不必每个都写一遍），
+其他边界写成列表。读取时用 hist_edges 取得边界列表。
+"""
+import bisect
+import math
+import random
+
+
+def _geometric_edges(lo, hi, bins):
+    ratio = (hi / lo) ** (1 / (bins - 1))
+    return [0.0] + [round(lo * ratio ** i, 6) for i in range(bins)]
+
+
+# 时长（秒）：0 与 5 ms ~ 120 s 的等比分桶
+DURATION_EDGES = _geometric_edges(0.005, 120.0, 40)
+# 鼠标位移（像素，有正负）：按绝对值大致等比，正负对称
+_MAGNITUDES = [1, 2, 3, 4, 6, 8, 11, 16, 22, 32, 45, 64, 90, 128, 181, 256, 362, 512, 724, 1024, 2048, 4096]
+DELTA_EDGES = [-m for m in reversed(_MAGNITUDES)] + [0] + _MAGNITUDES
+# 定时误差（秒，有正负）：按绝对值 10 µs ~ 1 s 每 10 倍分 4 桶，正负对称
+_ERROR_MAGNITUDES = [round(1e-5 * 10 ** (i / 4), 9) for i in range(21)]
+TIMING_ERROR_EDGES = [-m for m in reversed(_ERROR_MAGNITUDES)] + [0.0] + _ERROR_MAGNITUDES
+
+EDGE_SCHEMES = {"duration": DURATION_EDGES, "delta": DELTA_EDGES, "timing_error": TIMING_ERROR_EDGES}
+_SCHEME_NAMES = {tuple(edges): name for name, edges in EDGE_SCHEMES.items()}
+
+
+def hist_edges(d):
+    """序列化直方图 d 的分桶边界列表：方案名查 EDGE_SCHEMES，列表原样返回。"""
+    edges = d["edges"]
+    return EDGE_SCHEMES[edges] if isinstance(edges, str) else edges
+
+
+class Histogram:
+    def __init__(self, edges):
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) - 1)
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def bin_index(self, value):
+        return min(max(bisect.bisect_right(self.edges, value) - 1, 0), len(self.counts) - 1)
+
+    def add(self, value):
+        self.counts[self.bin_index(value)] += 1
+        self.count += 1
+        if self.min is None or value < self.min: self.min = value
+        if self.max is None or value > self.max: self.max = value
+
+    def merge(self, other):
+        if other.edges != self.edges:
+            raise ValueError("分桶边界不同的直方图不能合并")
+        if other.count == 0:
+            return self
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    def bin_range(self, i):
+        """第 i 个桶中样本的取值范围：与 [min, max] 求交，首/末桶延伸到 min/max。"""
+        lo = self.min if i == 0 else max(self.edges[i], self.min)
+        hi = self.max if i == len(self.counts) - 1 else min(self.edges[i + 1], self.max)
+        return lo, hi
+
+    def quantile(self, q):
+        """按桶内均匀分布估计分位数。"""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c and seen + c >= target:
+                lo, hi = self.bin_range(i)
+                return lo + (hi - lo) * (target - seen) / c
+            seen += c
+        return self.max
+
+    def to_dict(self):
+        return {"edges": _SCHEME_NAMES.get(tuple(self.edges), self.edges), "counts": self.counts, "count": self.count, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, d):
+        h = cls(hist_edges(d))
+        h.counts = list(d["counts"])
+        h.count, h.min, h.max = d["count"], d["min"], d["max"]
+        return h
+
+
+def duration_histogram():
+    return Histogram(DURATION_EDGES)
+
+
+def delta_histogram():
+    return Histogram(DELTA_EDGES)
+
+
+def timing_error_histogram():
+    return Histogram(TIMING_ERROR_EDGES)
+
+
+def bin_bounds(d):
+    """
+    序列化直方图 d 每个桶中样本的取值范围 (lo, hi, hi 是否可取到) 列表：与 [min, max] 求交，首/末桶延伸到 min/max。
+    sample_histogram / sample_int 与 event_sampler 的批量采样都按它在桶内取值。计数为 0 的桶也会给出，但不会被选中。
+    """
+    counts, edges = d["counts"], hist_edges(d)
+    last = len(counts) - 1
+    bounds = []
+    for i in range(len(counts)):
+        lo = d["min"] if i == 0 else max(edges[i], d["min"])
+        if i == last or d["max"] < edges[i + 1]:
+            bounds.append((lo, d["max"], True))
+        else:
+            bounds.append((lo, edges[i + 1], False))
+    return bounds
+
+
+def _pick_bin(d, rng):
+    """按计数选桶，返回桶内取值范围 (lo, hi, hi 是否可取到)。"""
+    counts = d["counts"]
+    i = rng.choices(range(len(counts)), weights=counts)[0]
+    return bin_bounds(d)[i]
+
+
+def sample_histogram(d, rng=random):
+    """从序列化的直方图 d 中随机采样一个值：按计数选桶，桶内均匀分布。d 为空时返回 None。"""
+    if not d or not d.get("count"):
+        return None
+    lo, hi, _ = _pick_bin(d, rng)
+    return rng.uniform(lo, hi)
+
+
+def sample_int(d, rng=random):
+    """采样整数（如像素位移）：在所选桶内可能出现的整数中均匀选取。"""
+    if not d or not d.get("count"):
+        return None
+    lo, hi, inclusive = _pick_bin(d, rng)
+    lo_int = math.ceil(lo)
+    hi_int = math.floor(hi) if inclusive else math.ceil(hi) - 1
+    return rng.randint(lo_int, max(lo_int, hi_int))
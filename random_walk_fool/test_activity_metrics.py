@@ -0,0 +1,37 @@
+"""
+操作强度指标的测试：按住不放时系统自动重复产生的按下不算新动作。
+
+    python -m pytest random_walk_fool
+"""
+from activity_metrics import SlidingActivity, iter_activity
+
+
+def _hold(key, start, seconds, rate=30.0):
+    """按住 key seconds 秒：按系统自动重复的频率反复产生按下，最后松开一次。"""
+    n = int(seconds * rate)
+    events = [{"type": "key_press", "key": key, "time": start + i / rate} for i in range(n + 1)]
+    events.append({"type": "key_release", "key": key, "time": start + seconds + 0.01})
+    return events
+
+
+def test_autorepeat_counts_once():
+    activity = SlidingActivity()
+    rows = list(iter_activity(_hold("w", 1.0, 10.0), activity=activity))
+    assert rows[-1][1:4] == (1, 1.0, 1)
+    assert activity.total_actions == 1
+
+
+def test_repeated_taps_and_clicks_count_each_time():
+    events = []
+    t = 0.0
+    for _ in range(5):
+        events += [{"type": "key_press", "key": "e", "time": t}, {"type": "key_release", "key": "e", "time": t + 0.05}]
+        events += [{"type": "mouse_press", "position": [0, 0], "button": "Button.left", "time": t + 0.1},
+                   {"type": "mouse_press", "position": [0, 0], "button": "Button.left", "time": t + 0.12},
+                   {"type": "mouse_release", "position": [0, 0], "button": "Button.left", "time": t + 0.15}]
+        t += 1.0
+    events += _hold("w", t, 3.0)
+    activity = SlidingActivity()
+    list(iter_activity(events, activity=activity))
+    assert activity.total_actions == 5 + 5 + 1
+    assert activity.all_keys == {"e", "w"}
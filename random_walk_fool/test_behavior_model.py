@@ -0,0 +1,62 @@
+"""BehaviorCounts：分文件计数后 merge 与在同一个对象上逐文件计数结果一致（含 --order 0）。"""
+import os
+
+import pytest
+
+from behavior_model import BehaviorCounts
+from event_log import iter_events
+
+RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures", "recording.jsonl")
+
+
+def _files():
+    """把 fixture 录制切成三段，当作三个录制文件。"""
+    events = list(iter_events(RECORDING))
+    n = len(events)
+    return [events[:n // 3], events[n // 3:2 * n // 3], events[2 * n // 3:]]
+
+
+def _canonical(counts):
+    """与编号无关的表示：动作、转移和间隔直方图都以签名为键。"""
+    sig = counts.signatures
+    return {
+        "vocab": {sig[i]: action for i, action in enumerate(counts.vocab())},
+        "transitions": {(tuple(sig[c] for c in context), sig[j]): n for (context, j), n in counts.transitions.items()},
+        "gaps": {sig[i]: hist.to_dict() for i, hist in counts.gaps.items()},
+    }
+
+
+@pytest.mark.parametrize("order", [0, 1, 2])
+def test_merge_matches_single_pass(order):
+    files = _files()
+    single = BehaviorCounts(order)
+    for events in files:
+        single.observe(events)
+    # 倒序合并，两边的动作编号不同，merge 须按签名对齐
+    merged = BehaviorCounts(order)
+    for events in reversed(files):
+        merged.merge(BehaviorCounts(order).observe(events))
+    assert single.transitions
+    assert _canonical(merged) == _canonical(single)
+
+
+def test_merge_is_associative():
+    a, b, c = (BehaviorCounts(1).observe(events) for events in _files())
+    left = BehaviorCounts(1).merge(a).merge(b).merge(c)
+    right = BehaviorCounts(1).merge(a).merge(BehaviorCounts(1).merge(b).merge(c))
+    assert _canonical(left) == _canonical(right)
+
+
+def test_order_zero_counts_actions():
+    counts = BehaviorCounts(0)
+    for events in _files():
+        counts.observe(events)
+    assert all(context == () for context, _ in counts.transitions)
+    assert {j: n for (_, j), n in counts.transitions.items()} == {i: a["count"] for i, a in enumerate(counts.actions)}
+    # 间隔不依赖上下文，也不跨文件：每个文件中除最后一个动作外，每个动作之后都有一个间隔
+    assert sum(hist.count for hist in counts.gaps.values()) == sum(a["count"] for a in counts.actions) - len(_files())
+
+
+def test_merge_rejects_different_order():
+    with pytest.raises(ValueError):
+        BehaviorCounts(1).merge(BehaviorCounts(2))
@@ -0,0 +1,55 @@
+"""事件空间采样：别名表按权重选事件，计划与采样顺序一致。"""
+import numpy as np
+import pytest
+
+from event_sampler import EventSampler, alias_table
+
+
+def _implied(prob, alias):
+    """别名表实际给出的各项概率：每列以 prob 选自己，否则选 alias。"""
+    n = len(prob)
+    p = prob / n
+    np.add.at(p, alias, (1.0 - prob) / n)
+    return p
+
+
+@pytest.mark.parametrize("weights", [[1], [3, 1], [5, 0, 2, 1], [1] * 7, [1000, 1, 1, 1], [0.1, 0.2, 0.7]])
+def test_alias_table_matches_weights(weights):
+    prob, alias = alias_table(weights)
+    w = np.asarray(weights, dtype=np.float64)
+    assert np.allclose(_implied(prob, alias), w / w.sum())
+
+
+@pytest.mark.parametrize("weights", [[], [0, 0], [1, -1], [1, float("nan")]])
+def test_alias_table_rejects_bad_weights(weights):
+    with pytest.raises(ValueError):
+        alias_table(weights)
+
+
+def _schema(keys):
+    return {"events": [{"type": "keyboard", "keys": [k], "action": "press"} for k in keys]}
+
+
+def test_sampling_frequencies_follow_weights():
+    weights = [6, 3, 0, 1]
+    sampler = EventSampler(_schema("abcd"), weights=weights, seed=0)
+    n = 200_000
+    freq = np.bincount(sampler.sample_indices(n), minlength=4) / n
+    assert freq[2] == 0
+    # 二项分布标准差约 0.001，容差取 5 倍
+    assert np.allclose(freq, np.array(weights) / sum(weights), atol=0.005)
+
+
+def test_default_weights_are_counts():
+    schema = _schema("ab")
+    schema["events"][0]["count"] = 9
+    sampler = EventSampler(schema, seed=0)
+    freq = np.bincount(sampler.sample_indices(100_000), minlength=2) / 100_000
+    assert abs(freq[0] - 0.9) < 0.01
+
+
+def test_plans_follow_sampled_order():
+    sampler = EventSampler(_schema("abc"), seed=1)
+    indices = sampler.sample_indices(500)
+    keys = [plan[0][2] for plan in sampler.plans(indices)]
+    assert keys == ["abc"[i] for i in indices]
@@ -0,0 +1,61 @@
+"""
+事件空间构建的回归测试，数据为 data/fixtures 中提交的小录制：
+    - 分组与逐组处理（iter_action_groups / process_group_to_schema_v4）与单遍重写之前的实现逐组一致，
+      期望值 action_groups.jsonl 由重写前的代码生成，与聚合后的事件空间格式无关；
+    - 聚合得到的事件空间与 golden 文件 event_space.json 一致。
+
+    python -m pytest random_walk_fool
+
+事件空间格式有意改变时，用 bench_event_space.py --check ... --update 重新生成 event_space.json，并在提交说明中写明。
+"""
+import json
+import os
+
+from bench_event_space import run_check
+from event_log import iter_events
+from get_event_space import EventSpaceAggregator, iter_action_groups, process_group_to_schema_v4
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "fixtures")
+RECORDING = os.path.join(FIXTURES, "recording.jsonl")
+GOLDEN = os.path.join(FIXTURES, "event_space.json")
+GROUPS = os.path.join(FIXTURES, "action_groups.jsonl")
+
+
+def _normalize(events):
+    """经过一次 JSON 往返；独立 move/scroll 附带的原始事件只保留 (type, time)。"""
+    out = []
+    for event in events:
+        event = dict(event)
+        raw = event.pop("raw_event", None)
+        if raw is not None:
+            event["raw_event"] = [raw["type"], raw["time"]]
+        out.append(event)
+    return json.loads(json.dumps(out))
+
+
+def test_action_groups_match_baseline():
+    with open(GROUPS, encoding="utf-8") as f:
+        expected = [json.loads(line) for line in f]
+    actual = [{"events": [[e['type'], e['time']] for e in group], "schema": _normalize(process_group_to_schema_v4(group))}
+              for group in iter_action_groups(iter_events(RECORDING))]
+    assert len(actual) == len(expected)
+    for i, (a, e) in enumerate(zip(actual, expected)):
+        assert a == e, f"第 {i} 组不一致"
+
+
+def test_event_space_matches_golden():
+    assert run_check(GOLDEN, [(RECORDING, "fixture")]) == []
+
+
+def test_move_count_is_gestures():
+    # 两段连续拖动（各 20 个采样点），中间停顿 1 秒：count 为 2 次手势，直方图仍记录每次相邻位移
+    aggregator = EventSpaceAggregator()
+    for start in (0.0, 1.5):
+        for i in range(20):
+            raw = {"type": "mouse_move", "position": [i * 3, i], "time": start + i * 0.01}
+            aggregator.add({"type": "mouse", "action": "move", "raw_event": raw})
+    move = next(e for e in aggregator.result() if e.get("action") == "move")
+    assert move["count"] == 2
+    assert move["dx_hist"]["count"] == 39
+    state = EventSpaceAggregator.from_state(json.loads(json.dumps(aggregator.to_state())))
+    assert state.merge(EventSpaceAggregator.from_state(aggregator.to_state())).move_gestures == 4
@@ -0,0 +1,49 @@
+"""replay.iter_timeline：seek 时恢复鼠标位置和按住的键、按钮，偏移按 seek 与 speed 换算。"""
+from event_sampler import KEY_DOWN, KEY_UP, MOUSE_DOWN, MOUSE_UP, MOVE_TO
+from replay import ReplayState, iter_timeline
+
+EVENTS = [
+    {"type": "mouse_move", "position": [10, 10], "time": 0.0},
+    {"type": "key_press", "key": "w", "time": 1.0},
+    {"type": "key_press", "key": "Key.shift", "time": 2.0},
+    {"type": "mouse_press", "button": "Button.left", "position": [50, 60], "time": 3.0},
+    {"type": "key_release", "key": "Key.shift", "time": 4.0},
+    {"type": "mouse_move", "position": [70, 80], "time": 5.0},
+    {"type": "key_press", "key": "e", "time": 6.0},
+    {"type": "key_release", "key": "w", "time": 7.0},
+    {"type": "mouse_release", "button": "Button.left", "position": [70, 80], "time": 8.0},
+]
+
+
+def test_seek_restores_held_state():
+    state = ReplayState()
+    timeline = list(iter_timeline(EVENTS, seek=5.5, state=state))
+    # 5.5 秒时 w 与左键仍按住、shift 已松开，鼠标在 (70, 80)
+    assert timeline[:3] == [(0.0, MOVE_TO, 70, 80, 0), (0.0, KEY_DOWN, "w"), (0.0, MOUSE_DOWN, "Button.left")]
+    assert timeline[3:] == [(0.5, KEY_DOWN, "e"), (1.5, KEY_UP, "w"), (2.5, MOUSE_UP, "Button.left")]
+    assert state.events == 3
+    assert (state.first_time, state.last_time) == (6.0, 8.0)
+    assert state.keys == {"e": None} and state.buttons == {}
+
+
+def test_seek_keeps_press_order():
+    events = [{"type": "key_press", "key": k, "time": t} for t, k in enumerate("cab")]
+    events.append({"type": "key_press", "key": "d", "time": 10.0})
+    timeline = list(iter_timeline(events, seek=5.0))
+    assert timeline == [(0.0, KEY_DOWN, "c"), (0.0, KEY_DOWN, "a"), (0.0, KEY_DOWN, "b"), (5.0, KEY_DOWN, "d")]
+
+
+def test_seek_on_event_time_replays_that_event():
+    timeline = list(iter_timeline(EVENTS, seek=2.0))
+    assert timeline[:3] == [(0.0, MOVE_TO, 10, 10, 0), (0.0, KEY_DOWN, "w"), (0.0, KEY_DOWN, "Key.shift")]
+    assert timeline.count((0.0, KEY_DOWN, "Key.shift")) == 1
+
+
+def test_speed_and_until():
+    timeline = list(iter_timeline(EVENTS, speed=2.0, seek=5.5, until=7.0))
+    assert timeline[3:] == [(0.25, KEY_DOWN, "e"), (0.75, KEY_UP, "w")]
+
+
+def test_without_seek_starts_at_first_event():
+    timeline = list(iter_timeline(EVENTS[:3]))
+    assert timeline == [(0.0, MOVE_TO, 10, 10, 0), (1.0, KEY_DOWN, "w"), (2.0, KEY_DOWN, "Key.shift")]
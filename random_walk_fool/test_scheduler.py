@@ -0,0 +1,83 @@
+"""DeadlineScheduler 在虚拟时钟下的执行顺序、按键引用计数与退出时松开。"""
+import pytest
+
+from event_sampler import KEY_DOWN, KEY_UP, MOUSE_DOWN, MOUSE_UP, MOVE_REL
+from scheduler import DeadlineScheduler
+
+
+class FakeInput:
+    """虚拟时钟加上记录每次注入 (时刻, 操作, 参数...) 的操作表。"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.calls = []
+
+    def clock(self):
+        return self.now
+
+    def wait_until(self, t):
+        self.now = max(self.now, t)
+
+    def ops(self):
+        def record(op):
+            return lambda *args: self.calls.append((round(self.now, 6), op, *args))
+        return {op: record(op) for op in (KEY_DOWN, KEY_UP, MOUSE_DOWN, MOUSE_UP, MOVE_REL)}
+
+    def scheduler(self, **kwargs):
+        return DeadlineScheduler(self.ops(), clock=self.clock, wait_until=self.wait_until, measure=False, **kwargs)
+
+
+def _hold(key, seconds, down=KEY_DOWN, up=KEY_UP):
+    return ((0.0, down, key), (seconds, up, key))
+
+
+def test_overlapping_holds_press_and_release_once():
+    fake = FakeInput()
+    plans = [(_hold("w", 1.0), 0.2), (_hold("w", 1.0), 0.2), (_hold("left", 0.5, MOUSE_DOWN, MOUSE_UP), 0.0)]
+    fake.scheduler(overlap=True).run(plans, lead=0.0)
+    # 两次按住 w 重叠（0~1.0 与 0.2~1.2）：只在 0 按下、1.2 松开
+    assert fake.calls == [(0.0, KEY_DOWN, "w"), (0.4, MOUSE_DOWN, "left"), (0.9, MOUSE_UP, "left"), (1.2, KEY_UP, "w")]
+
+
+def test_sequential_holds_press_each_time():
+    fake = FakeInput()
+    fake.scheduler().run([(_hold("w", 1.0), 0.5), (_hold("w", 1.0), 0.0)], lead=0.0)
+    assert fake.calls == [(0.0, KEY_DOWN, "w"), (1.0, KEY_UP, "w"), (1.5, KEY_DOWN, "w"), (2.5, KEY_UP, "w")]
+
+
+def test_held_keys_released_when_plans_raise():
+    fake = FakeInput()
+
+    def plans():
+        yield _hold("w", 5.0), 0.5
+        yield _hold("left", 5.0, MOUSE_DOWN, MOUSE_UP), 0.5
+        raise KeyboardInterrupt
+
+    scheduler = fake.scheduler(overlap=True)
+    with pytest.raises(KeyboardInterrupt):
+        scheduler.run(plans(), lead=0.0)
+    assert fake.calls == [(0.0, KEY_DOWN, "w"), (0.5, MOUSE_DOWN, "left"), (0.5, KEY_UP, "w"), (0.5, MOUSE_UP, "left")]
+    assert scheduler.held == {}
+
+
+def test_held_keys_released_when_injection_fails():
+    fake = FakeInput()
+    ops = fake.ops()
+
+    def broken(*args):
+        raise OSError("注入失败")
+    ops[MOVE_REL] = broken
+    scheduler = DeadlineScheduler(ops, clock=fake.clock, wait_until=fake.wait_until, measure=False)
+    plan = ((0.0, KEY_DOWN, "shift"), (0.1, MOVE_REL, 10, 0, 0.0), (0.2, KEY_UP, "shift"))
+    with pytest.raises(OSError):
+        scheduler.run([(plan, 0.0)], lead=0.0)
+    assert fake.calls == [(0.0, KEY_DOWN, "shift"), (0.1, KEY_UP, "shift")]
+
+
+def test_move_split_into_steps_with_exact_total():
+    fake = FakeInput()
+    fake.scheduler(move_interval=0.01).run([(((0.0, MOVE_REL, 10, -3, 0.04),), 0.0)], lead=0.0)
+    assert [call[0] for call in fake.calls] == [0.01, 0.02, 0.03, 0.04]
+    assert sum(call[2] for call in fake.calls) == 10
+    assert sum(call[3] for call in fake.calls) == -3
+    assert all(call[4] == 0 for call in fake.calls)
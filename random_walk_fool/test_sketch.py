@@ -0,0 +1,39 @@
+"""直方图 sketch 的序列化与采样。"""
+import random
+
+from sketch import DURATION_EDGES, Histogram, bin_bounds, duration_histogram, sample_histogram, sample_int
+
+
+def test_shared_edges_serialize_by_name():
+    hist = duration_histogram()
+    for value in (0.01, 0.2, 0.2, 3.0):
+        hist.add(value)
+    d = hist.to_dict()
+    assert d["edges"] == "duration"
+    restored = Histogram.from_dict(d)
+    assert restored.edges == DURATION_EDGES
+    assert restored.to_dict() == d
+    # 旧格式（边界写成列表）仍可读取
+    assert Histogram.from_dict({**d, "edges": DURATION_EDGES}).to_dict() == d
+
+
+def test_custom_edges_serialize_as_list():
+    hist = Histogram([0, 10, 20])
+    hist.add(5)
+    d = hist.to_dict()
+    assert d["edges"] == [0, 10, 20]
+    assert Histogram.from_dict(d).counts == [1, 0]
+
+
+def test_samples_stay_within_bin_bounds():
+    hist = Histogram([0, 10, 20, 30])
+    for value in (2, 4, 25, 28):
+        hist.add(value)
+    d = hist.to_dict()
+    assert bin_bounds(d) == [(2, 10, False), (10, 20, False), (20, 28, True)]
+    rng = random.Random(0)
+    for _ in range(200):
+        value = sample_histogram(d, rng)
+        assert 2 <= value < 10 or 20 <= value <= 28
+        n = sample_int(d, rng)
+        assert 2 <= n <= 9 or 20 <= n <= 28
@@ -0,0 +1,225 @@
+"""
+鼠标轨迹压缩：误差有界的轨迹化简（Ramer–Douglas–Peucker）加差分 + varint 编码。
+
+    python trajectory.py data/record_xxx.jsonl [-o data/record_xxx.gttraj] [--epsilon 1.0] [--gap 0.25] [--verify]
+
+mouse_move 按时间间隔超过 gap 秒的停顿（以及时间不递增处）切成若干段，每段用 RDP 化简为关键点。
+误差按同步欧氏距离计算：被删去的点与关键点之间按时间线性插值得到的位置之差不超过 epsilon 像素，
+因此回放时在任意原始采样时刻插值得到的位置都在误差范围内（见 positions_at）。
+关键点 (时间, x, y) 在整个文件内逐点差分，zigzag 后用 varint 写出；时间为整数纳秒，可按 time_unit_ns 再取整以节省空间。
+
+文件布局：
+    MAGIC (8 字节) | 头部长度 uint32 | 头部 JSON (utf-8) | 段 ...
+每段为 varint 点数，后跟该段各点的 zigzag varint 差分 (dt, dx, dy)。头部包含 epsilon、gap 与 time_unit_ns。
+
+事件通过 event_columns 载入为 NumPy 列，切段、化简（逐层批量处理所有待分割区间）和 varint 编解码都是向量化的。
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+from event_columns import MOUSE_MOVE, load_columns, ns_to_seconds, seconds_to_ns
+from event_log import RECORD_FORMAT
+
+MAGIC = b"GTTRAJ\x00\x00"
+FORMAT_VERSION = 1
+TRAJECTORY_SUFFIX = ".gttraj"
+
+DEFAULT_EPSILON = 1.0      # 允许的最大位置误差（像素）
+DEFAULT_GAP = 0.25         # 相邻移动间隔超过该秒数时切成新的一段
+DEFAULT_TIME_UNIT_NS = 1   # 时间的取整单位（纳秒），大于 1 时更省空间但关键点时间有损
+MAX_SEGMENT_POINTS = 4096  # 每段的最大点数，限制 RDP 的最坏情况开销
+
+
+def move_segments(cols, gap=DEFAULT_GAP, max_points=MAX_SEGMENT_POINTS):
+    """
+    取出 mouse_move 的 (n, 3) 数组 (time 秒, x, y)，以及各段的起始下标（升序，首项为 0）。
+    段内时间严格递增，相邻点间隔不超过 gap，点数不超过 max_points。
+    """
+    move = cols.type == MOUSE_MOVE
+    points = np.column_stack([cols.time[move], cols.x[move], cols.y[move]])
+    dt = np.diff(points[:, 0])
+    breaks = np.concatenate(([0], np.flatnonzero((dt > gap) | (dt <= 0)) + 1, [len(points)]))
+    starts = [np.arange(a, b, max_points) for a, b in zip(breaks[:-1], breaks[1:]) if b > a]
+    starts = np.concatenate(starts) if starts else np.zeros(0, dtype=np.int64)
+    return points, starts
+
+
+def simplify(points, epsilon=DEFAULT_EPSILON, starts=None):
+    """
+    RDP 化简（同步欧氏距离）。points 为 (n, 3) 的 (time, x, y) 数组，starts 为各段起始下标（默认整体一段）。
+    返回保留点的布尔掩码，每段首尾总会保留。
+    不递归：每一轮把所有待分割的区间一起计算，取各区间中偏差最大的点（并列时取最前的），
+    偏差超过 epsilon 的区间在该点处一分为二进入下一轮。结果与逐区间递归的 RDP 相同。
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    starts = np.zeros(1, dtype=np.int64) if starts is None else np.asarray(starts, dtype=np.int64)
+    ends = np.append(starts[1:], n) - 1
+    keep[starts] = keep[ends] = True
+    t, x, y = points[:, 0], points[:, 1], points[:, 2]
+    while True:
+        inner = ends - starts - 1
+        active = inner > 0
+        starts, ends, inner = starts[active], ends[active], inner[active]
+        if len(starts) == 0:
+            return keep
+        # 所有区间的内部点，owner 为所属区间
+        offsets = np.cumsum(inner) - inner
+        owner = np.repeat(np.arange(len(starts)), inner)
+        idx = np.arange(len(owner)) - offsets[owner] + starts[owner] + 1
+        i, j = starts[owner], ends[owner]
+        span = t[j] - t[i]
+        r = np.divide(t[idx] - t[i], span, out=np.zeros(len(idx)), where=span > 0)
+        d = np.hypot(x[idx] - (x[i] + r * (x[j] - x[i])), y[idx] - (y[i] + r * (y[j] - y[i])))
+        dmax = np.maximum.reduceat(d, offsets)
+        hit = np.flatnonzero(d == dmax[owner])
+        _, first = np.unique(owner[hit], return_index=True)
+        split = idx[hit[first]]
+        over = dmax > epsilon
+        keep[split[over]] = True
+        starts = np.concatenate((starts[over], split[over]))
+        ends = np.concatenate((split[over], ends[over]))
+
+
+def positions_at(keyframes, times):
+    """回放用：在关键点 (n, 3) 之间按时间线性插值，返回 times 时刻的 (x, y)。"""
+    times = np.asarray(times, dtype=float)
+    return np.interp(times, keyframes[:, 0], keyframes[:, 1]), np.interp(times, keyframes[:, 0], keyframes[:, 2])
+
+
+def encode_varints(values):
+    """int64 数组 -> zigzag varint 字节串。"""
+    values = np.asarray(values, dtype=np.int64)
+    # zigzag：把有符号整数映射为无符号，小的负数也只占一两个字节
+    z = ((values << 1) ^ (values >> 63)).view(np.uint64)
+    nbytes = np.ones(len(z), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += z >= np.uint64(1 << (7 * k))
+    out = np.empty((len(z), 10), dtype=np.uint8)
+    for k in range(10):
+        out[:, k] = ((z >> np.uint64(7 * k)) & np.uint64(0x7F)).astype(np.uint8)
+        out[:, k] |= np.where(k < nbytes - 1, 0x80, 0).astype(np.uint8)
+    return out[np.arange(10) < nbytes[:, None]].tobytes()
+
+
+def decode_varints(data):
+    """zigzag varint 字节串 -> int64 数组。"""
+    b = np.frombuffer(data, dtype=np.uint8)
+    if len(b) == 0:
+        return np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(b < 0x80)
+    if len(ends) == 0 or ends[-1] != len(b) - 1:
+        raise ValueError("varint 数据被截断")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    shift = np.arange(len(b)) - np.repeat(starts, ends - starts + 1)
+    z = np.add.reduceat((b & 0x7F).astype(np.uint64) << (7 * shift).astype(np.uint64), starts)
+    return (z >> np.uint64(1)).view(np.int64) ^ -(z & np.uint64(1)).view(np.int64)
+
+
+def write_trajectory(path, keyframes, starts, epsilon=DEFAULT_EPSILON, gap=DEFAULT_GAP,
+                     time_unit_ns=DEFAULT_TIME_UNIT_NS, meta=None):
+    """写出压缩轨迹。keyframes 为 (n, 3) 的 (time 秒, x, y)，starts 为各段在 keyframes 中的起始下标。"""
+    ticks = seconds_to_ns(keyframes[:, 0]) // time_unit_ns
+    values = np.column_stack([ticks, keyframes[:, 1:].astype(np.int64)])
+    deltas = np.diff(values, axis=0, prepend=np.zeros((1, 3), dtype=np.int64)).ravel()
+    counts = np.diff(np.append(starts, len(keyframes)))
+    # 在每段的第一个点之前插入该段的点数
+    body = np.insert(deltas, np.asarray(starts, dtype=np.int64) * 3, counts)
+    header = {"version": FORMAT_VERSION, "epsilon": epsilon, "gap": gap, "time_unit_ns": time_unit_ns, "meta": meta or {}}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        f.write(encode_varints(body))
+
+
+def read_trajectory(path):
+    """读取压缩轨迹，返回 (头部, [每段关键点的 (n, 3) 数组 (time 秒, x, y)])。"""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"不是轨迹文件: {path}")
+        (length,) = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(length).decode("utf-8"))
+        values = decode_varints(f.read())
+    counts, chunks = [], []
+    pos = 0
+    while pos < len(values):
+        n = int(values[pos])
+        chunks.append(values[pos + 1:pos + 1 + 3 * n])
+        counts.append(n)
+        pos += 1 + 3 * n
+    if pos != len(values):
+        raise ValueError("轨迹数据被截断")
+    deltas = np.concatenate(chunks).reshape(-1, 3) if chunks else np.zeros((0, 3), dtype=np.int64)
+    values = np.cumsum(deltas, axis=0)
+    keyframes = np.column_stack([ns_to_seconds(values[:, 0] * header["time_unit_ns"]), values[:, 1:].astype(np.float64)])
+    return header, np.split(keyframes, np.cumsum(counts)[:-1]) if counts else []
+
+
+def compress_recording(src, dst=None, epsilon=DEFAULT_EPSILON, gap=DEFAULT_GAP,
+                       time_unit_ns=DEFAULT_TIME_UNIT_NS, verify=False):
+    """
+    压缩录制文件中的鼠标轨迹，写到 dst（默认为录制文件旁的 .gttraj），返回统计信息：
+    原始点数、关键点数、这些 mouse_move 在二进制日志中所占的字节数、压缩后文件字节数和压缩比。
+    verify=True 时读回写出的文件，给出所有原始采样时刻的最大插值误差（像素）。
+    """
+    if dst is None:
+        dst = os.path.splitext(src)[0] + TRAJECTORY_SUFFIX
+    points, starts = move_segments(load_columns(src), gap)
+    keep = simplify(points, epsilon, starts)
+    keyframes = points[keep]
+    key_starts = np.cumsum(keep)[starts] - 1  # 每段首点在 keyframes 中的下标
+    write_trajectory(dst, keyframes, key_starts, epsilon, gap, time_unit_ns, meta={"source": os.path.basename(src)})
+
+    size = os.path.getsize(dst)
+    binary_bytes = len(points) * struct.calcsize(RECORD_FORMAT)
+    stats = {
+        "output": dst,
+        "segments": len(starts),
+        "points": len(points),
+        "keyframes": len(keyframes),
+        "binary_bytes": binary_bytes,
+        "compressed_bytes": size,
+        "ratio": binary_bytes / size if size else 0.0,
+    }
+    if verify:
+        _, segments = read_trajectory(dst)
+        max_error = 0.0
+        for seg, original in zip(segments, np.split(points, starts[1:])):
+            x, y = positions_at(seg, original[:, 0])
+            max_error = max(max_error, float(np.hypot(x - original[:, 1], y - original[:, 2]).max()))
+        stats["max_error"] = max_error
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="压缩录制文件中的鼠标轨迹")
+    parser.add_argument("recording", help="录制文件（.jsonl 或二进制日志）")
+    parser.add_argument("-o", "--output", help="输出文件，默认为录制文件旁的 .gttraj")
+    parser.add_argument("--epsilon", type=float, default=DEFAULT_EPSILON, help="允许的最大位置误差（像素）")
+    parser.add_argument("--gap", type=float, default=DEFAULT_GAP, help="超过该秒数的停顿处切段")
+    parser.add_argument("--time-unit-ns", type=int, default=DEFAULT_TIME_UNIT_NS, help="时间取整单位（纳秒）")
+    parser.add_argument("--verify", action="store_true", help="读回输出，检查所有原始采样时刻的插值误差")
+    args = parser.parse_args(argv)
+    if args.epsilon < 0:
+        parser.error("--epsilon 不能为负数")
+    if args.time_unit_ns < 1:
+        parser.error("--time-unit-ns 必须为正整数")
+
+    stats = compress_recording(args.recording, args.output, args.epsilon, args.gap, args.time_unit_ns, args.verify)
+    print(f"原始点数 {stats['points']}，关键点 {stats['keyframes']}（{stats['segments']} 段）")
+    print(f"mouse_move 在二进制日志中 {stats['binary_bytes']} 字节 -> {stats['compressed_bytes']} 字节，"
+          f"压缩比 {stats['ratio']:.1f}x，输出到 {stats['output']}")
+    if args.verify:
+        print(f"最大插值误差 {stats['max_error']:.3f} 像素")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
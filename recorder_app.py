@@ -1,25 +1,35 @@
 import os
 import sys
-import time
-import json
 import tkinter as tk
 from tkinter import messagebox, filedialog
 import threading
 import subprocess
-from pynput import keyboard, mouse
 import ctypes
 import datetime
 import shutil
 import re
 import tkinter.ttk as ttk
-
-video_filename = "screen_recording.mp4"
-event_filename = "events.jsonl"
-ffmpeg_process = None
-recording = False
+from move_coalescer import SAMPLING_CHOICES, SAMPLING_RAW
+from capture_region import (CAPTURE_DESKTOP, CAPTURE_REGION, CAPTURE_WINDOW, capture_size, desktop_capture,
+                            fit_within, list_windows, region_capture, window_capture)
+from encoder_profiles import ENCODER_PROFILES, DEFAULT_PROFILE
+from recording_session import RecordingSession, STATE_RECORDING, STATE_PAUSED
+
+session = None  # 当前录制会话
+stopping = False  # 已开始结束录制，防止重复点击或快捷键再次触发
+stop_lock = threading.Lock()
 # ffmpeg_path_var = None  # 新增全局变量
 storage_path_var = None  # 新增全局变量
 resolution_var = None  # 新增全局变量，用于记录录制质量
+event_format_var = None  # 事件日志格式：jsonl / binary
+move_sampling_var = None  # 鼠标移动采样模式：raw / per-frame / N Hz
+segment_minutes_var = None  # 分段录制时长（分钟），0 表示不分段
+encoder_profile_var = None  # 编码配置名称
+capture_mode_var = None  # 录制范围：全屏 / 区域 / 窗口
+capture_window_var = None  # 窗口模式下的窗口标题
+selected_region = None  # 区域模式下框选的 (x, y, width, height)
+
+CAPTURE_MODES = {"全屏": CAPTURE_DESKTOP, "区域": CAPTURE_REGION, "窗口": CAPTURE_WINDOW}
 
 # 获取临时文件名
 def generate_filename():
@@ -27,6 +37,8 @@ def generate_filename():
     return now.strftime("record_%Y%m%d_%H%M%S")
 
 def get_screen_size():
+    if sys.platform != "win32":
+        return app.winfo_screenwidth(), app.winfo_screenheight()
     user32 = ctypes.windll.user32
     user32.SetProcessDPIAware()
     width = user32.GetSystemMetrics(0)
@@ -50,44 +62,6 @@ def get_ffmpeg_path():
             return ffmpeg_in_path
     return ""
 
-def write_event(event):
-    with open(event_filename, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event, ensure_ascii=False) + "\n")
-
-############################## 鼠标键盘事件录制
-def start_input_listeners():
-    def on_key_press(key):
-        try:
-            key_str = key.char
-        except AttributeError:
-            key_str = str(key)
-        write_event({"type": "key_press", "key": key_str, "time": time.time()})
-
-    def on_key_release(key):
-        try:
-            key_str = key.char
-        except AttributeError:
-            key_str = str(key)
-        write_event({"type": "key_release", "key": key_str, "time": time.time()})
-
-    def on_click(x, y, button, pressed):
-        write_event({
-            "type": "mouse_press" if pressed else "mouse_release",
-            "position": (x, y),
-            "button": str(button),
-            "time": time.time()
-        })
-    
-    def on_move(x, y):
-        write_event({
-            "type": "mouse_move",
-            "position": (x, y),
-            "time": time.time()
-        })
-
-    threading.Thread(target=lambda: keyboard.Listener(on_press=on_key_press, on_release=on_key_release).run(), daemon=True).start()
-    threading.Thread(target=lambda: mouse.Listener(on_click=on_click, on_move=on_move).run(), daemon=True).start()
-
 ############################## 录制分辨率选择
 def get_resolution_scale(resolution, screen_width, screen_height):
     """
@@ -122,6 +96,9 @@ def list_audio_devices():
     """
     返回所有可用的dshow音频设备列表
     """
+    # 非 Windows 平台使用 PulseAudio 的默认设备
+    if sys.platform != "win32":
+        return ["default"]
     try:
         proc = subprocess.Popen(
             [get_ffmpeg_path(), '-list_devices', 'true', '-f', 'dshow', '-i', 'dummy'],
@@ -162,8 +139,8 @@ def get_speaker_device():
 
 ############################## 屏幕录制
 def start_recording():
-    global ffmpeg_process, recording, video_filename, event_filename
-    if recording:
+    global session
+    if stopping or (session is not None and session.state in (STATE_RECORDING, STATE_PAUSED)):
         return
     
     # 获取ffmpeg路径
@@ -185,68 +162,132 @@ def start_recording():
         messagebox.showwarning("警告", "请先选择一个有效的存储文件夹！")
         return
 
-    base_name = generate_filename()
-    # video_filename = os.path.join(storage_path, f"{base_name}.m4a")
-    video_filename = os.path.join(storage_path, f"{base_name}.mp4")
-    event_filename = os.path.join(storage_path, f"{base_name}.jsonl")
-
-    # 删除同名文件
-    for f in [video_filename, event_filename]:
-        if os.path.exists(f):
-            os.remove(f)
-
     # 获取屏幕长宽与音频信息
     screen_width, screen_height = get_screen_size()
     speaker_device = get_speaker_device()
 
+    # 获取录制范围：区域/窗口模式只抓取对应的像素
+    try:
+        capture = get_capture(screen_width, screen_height)
+    except ValueError as e:
+        messagebox.showwarning("警告", str(e))
+        return
+
     # 获取用户选择的分辨率
     selected_resolution = resolution_var.get()
-    scale_size, target_width, target_height = get_resolution_scale(selected_resolution, screen_width, screen_height)
-    
-    if (target_width, target_height) != scale_size and scale_size != None:
-        messagebox.showinfo("提示", f"您选择的 {selected_resolution} 分辨率高于当前屏幕支持，已自动适配为 {screen_width}x{screen_height}")
-
-    # 构建 ffmpeg 命令
-    ffmpeg_cmd = [
-        ffmpeg_path,
-        '-y',
-        '-f', 'gdigrab',
-        '-framerate', '24',
-        '-video_size', f'{screen_width}x{screen_height}',
-        '-i', 'desktop',
-        '-f', 'dshow',
-        '-i', f'audio={speaker_device}',
-        '-vf', f'scale={target_width}:{target_height}',
-        '-c:v', 'libx264',
-        '-preset', 'ultrafast',
-        '-crf', '18',
-        '-pix_fmt', 'yuv420p',
-        '-c:a', 'libmp3lame', '-b:a', '192k',
-        video_filename
-    ]
-
-    ffmpeg_process = subprocess.Popen(ffmpeg_cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    recording = True
+    if capture["mode"] == CAPTURE_DESKTOP:
+        scale_size, target_width, target_height = get_resolution_scale(selected_resolution, screen_width, screen_height)
+        
+        if (target_width, target_height) != scale_size and scale_size != None:
+            messagebox.showinfo("提示", f"您选择的 {selected_resolution} 分辨率高于当前屏幕支持，已自动适配为 {screen_width}x{screen_height}")
+        output_size = (target_width, target_height)
+    elif capture_size(capture):
+        # 区域/窗口：等比缩小到所选分辨率以内，不放大
+        scale_size, _, _ = get_resolution_scale(selected_resolution, *capture_size(capture))
+        output_size = fit_within(capture_size(capture), scale_size)
+    else:
+        output_size = None
+
+    try:
+        segment_minutes = float(segment_minutes_var.get() or 0)
+        if segment_minutes < 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showwarning("警告", "分段时长必须是不小于 0 的数字（分钟），0 表示不分段。")
+        return
+
+    try:
+        new_session = RecordingSession(
+            ffmpeg_path, storage_path, generate_filename(), speaker_device,
+            screen_size=(screen_width, screen_height),
+            output_size=output_size,
+            capture=capture,
+            encoder_profile=encoder_profile_var.get(),
+            event_format=event_format_var.get(),
+            move_sampling=move_sampling_var.get(),
+            segment_minutes=segment_minutes or None,
+        )
+    except ValueError as e:
+        messagebox.showwarning("警告", f"录制参数错误：{e}\n鼠标移动采样请选择 raw / per-frame 或输入如 “60 Hz” 的采样率。")
+        return
+
+    try:
+        session = new_session.start()
+    except Exception as e:
+        # 启动失败时 start() 已结束 ffmpeg 并停止已启动的组件
+        status_var.set("录制启动失败")
+        messagebox.showerror("错误", f"无法开始录制：{e}")
+        return
     status_var.set("录制中...")
-    start_input_listeners()
+    app.after(1000, update_recording_status)
+
+def format_progress(progress):
+    """把 ffmpeg 编码进度格式化为状态栏文字。"""
+    if not progress or progress.get("frame") is None:
+        return ""
+    speed = progress.get("speed")
+    text = f"{progress['frame']} 帧 | {progress.get('fps') or 0:.1f} fps | 速度 {speed or 0:.2f}x"
+    text += f" | 重复 {progress.get('dup_frames') or 0} / 丢弃 {progress.get('drop_frames') or 0}"
+    if progress.get("bitrate"):
+        text += f" | {progress['bitrate']:.0f} kbps"
+    if speed is not None and speed < 0.98:
+        text += " ⚠ 编码跟不上实时"
+    return text
+
+def update_recording_status():
+    # 在 Tk 主线程中定时刷新状态栏，显示 ffmpeg 实时编码指标
+    if session is None or session.state not in (STATE_RECORDING, STATE_PAUSED):
+        return
+    if session.state == STATE_RECORDING:
+        status_var.set(f"录制中... {format_progress(session.progress)}")
+    app.after(1000, update_recording_status)
 
-def stop_recording():
-    global ffmpeg_process, recording
-    if not recording:
+def toggle_pause():
+    if session is None:
         return
-    recording = False
+    if session.state == STATE_RECORDING:
+        session.pause()
+        status_var.set("已暂停")
+        pause_button_var.set("继续录制")
+    elif session.state == STATE_PAUSED:
+        session.resume()
+        status_var.set("录制中...")
+        pause_button_var.set("暂停录制")
+
+def stop_recording():
+    global stopping
+    # 检查状态和置位要原子完成，否则连点或按钮与快捷键同时触发会启动两个收尾线程
+    with stop_lock:
+        if stopping or session is None or session.state not in (STATE_RECORDING, STATE_PAUSED):
+            return
+        stopping = True
     status_var.set("正在结束录制...")
 
     def finalize():
-        if ffmpeg_process:
-            try:
-                ffmpeg_process.stdin.write(b'q')
-                ffmpeg_process.stdin.flush()
-                ffmpeg_process.wait()
-            except Exception as e:
-                print("关闭 ffmpeg 失败:", e)
+        summary_info = session.stop()
         status_var.set("录制完成 ✔")
-        messagebox.showinfo("录制结束", f"✅ 视频保存为：{video_filename}\n🖱️ 键鼠事件记录：{event_filename}")
+        summary = f"✅ 视频保存为：{session.video_filename}\n🖱️ 键鼠事件记录：{session.event_filename}"
+        stats = summary_info.get("event_stats")
+        if stats:
+            summary += f"\n📊 已写入 {stats['written']} 条事件，丢弃 {stats['dropped']} 条，队列峰值 {stats['max_queue_depth']}"
+        encoder = summary_info.get("encoder", {})
+        if encoder.get("frames") is not None:
+            summary += f"\n🎞️ 编码 {encoder['frames']} 帧，重复 {encoder['dup_frames']} / 丢弃 {encoder['drop_frames']}，最低速度 {encoder['min_speed'] or 0:.2f}x"
+            summary += f"\n📈 编码指标：{session.metrics_filename}"
+        if session.manifest_filename:
+            summary += f"\n🧩 分段清单：{session.manifest_filename}"
+        if "move_coalescing" in summary_info:
+            moves = summary_info["move_coalescing"]
+            summary += f"\n🖱️ 鼠标移动 {moves['received']} 条合并为 {moves['emitted']} 条"
+        overhead = summary_info.get("overhead")
+        if overhead:
+            for name, label in [("recorder", "录制器"), ("ffmpeg", "ffmpeg")]:
+                o = overhead.get(name, {})
+                if o.get("cpu_mean") is not None:
+                    summary += (f"\n⚙️ {label} CPU 平均 {o['cpu_mean']:.0f}% / 峰值 {o['cpu_max']:.0f}%，"
+                                f"内存峰值 {o['rss_max'] / 1e6:.0f} MB，写入 {o['write_bytes'] / 1e6:.0f} MB")
+            summary += f"\n📉 资源占用记录：{session.overhead_filename}"
+        messagebox.showinfo("录制结束", summary)
         app.quit()  # 录制结束后退出主程序
 
     threading.Thread(target=finalize).start()
@@ -292,6 +333,63 @@ def stop_recording():
 #         os.makedirs(default_path)
 #     return default_path
 
+############################## 录制范围选择
+def get_capture(screen_width, screen_height):
+    """根据界面选择构造录制范围，参数不完整时抛出 ValueError。"""
+    mode = CAPTURE_MODES.get(capture_mode_var.get(), CAPTURE_DESKTOP)
+    if mode == CAPTURE_REGION:
+        if not selected_region:
+            raise ValueError("请先点击“框选区域”选择录制区域。")
+        return region_capture(*selected_region, screen_size=(screen_width, screen_height))
+    if mode == CAPTURE_WINDOW:
+        title = capture_window_var.get()
+        if not title:
+            raise ValueError("请先选择要录制的窗口。")
+        return window_capture(title)
+    return desktop_capture((screen_width, screen_height))
+
+def select_screen_region():
+    """在全屏半透明遮罩上拖拽框选录制区域，Esc 取消。"""
+    global selected_region
+    overlay = tk.Toplevel(app)
+    overlay.attributes("-fullscreen", True)
+    overlay.attributes("-alpha", 0.3)
+    overlay.attributes("-topmost", True)
+    canvas = tk.Canvas(overlay, cursor="cross", bg="black", highlightthickness=0)
+    canvas.pack(fill=tk.BOTH, expand=True)
+    drag = {}
+
+    def on_press(e):
+        drag["start"] = (e.x_root, e.y_root, e.x, e.y)
+        drag["rect"] = canvas.create_rectangle(e.x, e.y, e.x, e.y, outline="red", width=2)
+
+    def on_drag(e):
+        if "rect" in drag:
+            canvas.coords(drag["rect"], drag["start"][2], drag["start"][3], e.x, e.y)
+
+    def on_release(e):
+        if "start" in drag:
+            x0, y0 = drag["start"][:2]
+            drag["region"] = (min(x0, e.x_root), min(y0, e.y_root), abs(e.x_root - x0), abs(e.y_root - y0))
+        overlay.destroy()
+
+    canvas.bind("<ButtonPress-1>", on_press)
+    canvas.bind("<B1-Motion>", on_drag)
+    canvas.bind("<ButtonRelease-1>", on_release)
+    overlay.bind("<Escape>", lambda e: overlay.destroy())
+    overlay.focus_force()
+    overlay.grab_set()
+    app.wait_window(overlay)
+
+    if drag.get("region") and drag["region"][2] >= 2 and drag["region"][3] >= 2:
+        selected_region = drag["region"]
+        capture_mode_var.set("区域")
+        x, y, w, h = selected_region
+        capture_info_var.set(f"区域 {w}x{h} @ ({x}, {y})")
+
+def refresh_window_list():
+    capture_window_combo["values"] = list_windows()
+
 # 默认选择路径为空
 def get_storage_path():
     if storage_path_var is not None:
@@ -308,7 +406,8 @@ def browse_storage_path():
         storage_path_var.set(path)
 
 def create_gui():
-    global status_var, storage_path_var, app, audio_device_var, resolution_var
+    global status_var, storage_path_var, app, audio_device_var, resolution_var, event_format_var, move_sampling_var, pause_button_var, segment_minutes_var, encoder_profile_var
+    global capture_mode_var, capture_window_var, capture_window_combo, capture_info_var
 
     # 启动时检查 ffmpeg 是否存在
     ffmpeg_path = get_ffmpeg_path()
@@ -316,9 +415,13 @@ def create_gui():
         messagebox.showerror("错误", "未找到 ffmpeg.exe，请将其放在程序所在目录下,或在系统变量中指定ffmpeg安装路径。")
         sys.exit(1)
 
+    # 先声明 DPI 感知，保证界面、框选区域与屏幕采集使用同一套物理像素坐标
+    if sys.platform == "win32":
+        ctypes.windll.user32.SetProcessDPIAware()
+
     app = tk.Tk()
     app.title("游戏录制器")
-    app.geometry("600x360")
+    app.geometry("600x680")
     app.resizable(False, False)
 
     main_frame = tk.Frame(app)
@@ -367,6 +470,44 @@ def create_gui():
     resolution_combo = ttk.Combobox(main_frame, textvariable=resolution_var, values=resolutions, font=("Arial", 11), width=52, state="readonly")
     resolution_combo.pack(padx=24, pady=(2, 0))
 
+    # 录制范围：全屏 / 框选区域 / 指定窗口，由屏幕采集设备直接只抓取这部分像素
+    tk.Label(main_frame, text="录制范围", font=("Arial", 12), anchor="w").pack(anchor="w", padx=24, pady=(14, 0))
+    capture_row = tk.Frame(main_frame)
+    capture_row.pack(fill=tk.X, padx=24, pady=(2, 0))
+    capture_mode_var = tk.StringVar(value="全屏")
+    ttk.Combobox(capture_row, textvariable=capture_mode_var, values=list(CAPTURE_MODES), font=("Arial", 11), width=6, state="readonly").pack(side=tk.LEFT)
+    tk.Button(capture_row, text="框选区域", font=("Arial", 11), command=select_screen_region).pack(side=tk.LEFT, padx=(6, 0))
+    capture_window_var = tk.StringVar()
+    capture_window_combo = ttk.Combobox(capture_row, textvariable=capture_window_var, font=("Arial", 11), width=26, postcommand=refresh_window_list)
+    capture_window_combo.pack(side=tk.LEFT, padx=(6, 0))
+    capture_window_combo.bind("<<ComboboxSelected>>", lambda e: capture_mode_var.set("窗口"))
+    capture_info_var = tk.StringVar(value="")
+    tk.Label(main_frame, textvariable=capture_info_var, font=("Arial", 10), anchor="w").pack(anchor="w", padx=24)
+
+    # 编码配置：在 CPU 占用和磁盘占用之间取舍，可用 encoder_profiles.py --benchmark 比较
+    tk.Label(main_frame, text="编码配置", font=("Arial", 12), anchor="w").pack(anchor="w", padx=24, pady=(14, 0))
+    encoder_profile_var = tk.StringVar(value=DEFAULT_PROFILE)
+    encoder_profile_combo = ttk.Combobox(main_frame, textvariable=encoder_profile_var, values=list(ENCODER_PROFILES), font=("Arial", 11), width=52, state="readonly")
+    encoder_profile_combo.pack(padx=24, pady=(2, 0))
+
+    # 事件日志格式选择
+    tk.Label(main_frame, text="键鼠事件格式（binary 体积更小，可用 event_log.py 转回 jsonl）", font=("Arial", 12), anchor="w").pack(anchor="w", padx=24, pady=(14, 0))
+    event_format_var = tk.StringVar(value="jsonl")
+    event_format_combo = ttk.Combobox(main_frame, textvariable=event_format_var, values=["jsonl", "binary"], font=("Arial", 11), width=52, state="readonly")
+    event_format_combo.pack(padx=24, pady=(2, 0))
+
+    # 鼠标移动采样：raw 记录全部原始移动，per-frame 每个视频帧一条，也可直接输入 “N Hz”
+    tk.Label(main_frame, text="鼠标移动采样（raw / per-frame / N Hz）", font=("Arial", 12), anchor="w").pack(anchor="w", padx=24, pady=(14, 0))
+    move_sampling_var = tk.StringVar(value=SAMPLING_RAW)
+    move_sampling_combo = ttk.Combobox(main_frame, textvariable=move_sampling_var, values=SAMPLING_CHOICES, font=("Arial", 11), width=52)
+    move_sampling_combo.pack(padx=24, pady=(2, 0))
+
+    # 分段录制：每 N 分钟切一段视频和事件日志，已完成的分段可以先上传/分析
+    tk.Label(main_frame, text="分段录制（分钟，0 为不分段）", font=("Arial", 12), anchor="w").pack(anchor="w", padx=24, pady=(14, 0))
+    segment_minutes_var = tk.StringVar(value="0")
+    segment_spinbox = ttk.Spinbox(main_frame, textvariable=segment_minutes_var, from_=0, to=120, increment=1, font=("Arial", 11), width=52)
+    segment_spinbox.pack(padx=24, pady=(2, 0))
+
     # 状态栏
     status_var = tk.StringVar()
     status_var.set("准备就绪")
@@ -375,8 +516,10 @@ def create_gui():
     # 录制按钮行
     btn_row = tk.Frame(main_frame)
     btn_row.pack(pady=(18, 0))
-    tk.Button(btn_row, text="开始录制", font=("Arial", 14), width=16, command=start_recording).pack(side=tk.LEFT, padx=18)
-    tk.Button(btn_row, text="停止录制", font=("Arial", 14), width=16, command=stop_recording).pack(side=tk.LEFT, padx=18)
+    pause_button_var = tk.StringVar(value="暂停录制")
+    tk.Button(btn_row, text="开始录制", font=("Arial", 14), width=12, command=start_recording).pack(side=tk.LEFT, padx=12)
+    tk.Button(btn_row, textvariable=pause_button_var, font=("Arial", 14), width=12, command=toggle_pause).pack(side=tk.LEFT, padx=12)
+    tk.Button(btn_row, text="停止录制", font=("Arial", 14), width=12, command=stop_recording).pack(side=tk.LEFT, padx=12)
 
     app.mainloop()
 
@@ -0,0 +1,413 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from pynput import keyboard, mouse
+
+from capture_region import CAPTURE_WINDOW, capture_size, desktop_capture, even_size_filter, grabber_input_args
+from encoder_profiles import DEFAULT_PROFILE, audio_encoder_args, get_profile, video_encoder_args
+from event_writer import EventWriter
+from ffmpeg_monitor import FfmpegProgressReader, FfmpegStderrReader
+from move_coalescer import MouseMoveCoalescer, parse_move_sampling, SAMPLING_RAW, SAMPLING_PER_FRAME
+from overhead_monitor import OverheadMonitor
+from random_walk_fool.event_log import BINARY_SUFFIX
+from segment_manifest import SegmentManifest
+from session_clock import SessionClock
+
+FFMPEG_STOP_TIMEOUT = 15.0     # 发送 q 之后最多等待 ffmpeg 收尾的秒数
+
+# 会话状态
+STATE_IDLE = "idle"
+STATE_RECORDING = "recording"
+STATE_PAUSED = "paused"
+STATE_STOPPED = "stopped"
+
+
+def audio_input_args(audio_device):
+    if sys.platform == "win32":
+        return ['-f', 'dshow', '-i', f'audio={audio_device}']
+    return ['-f', 'pulse', '-i', audio_device or 'default']
+
+
+def build_ffmpeg_cmd(ffmpeg_path, output, capture, output_size, audio_device, profile,
+                     segment_seconds=None, segment_list=None):
+    """
+    构建录屏 + 录音的 ffmpeg 命令，编码参数与帧率取自编码配置 profile。
+    屏幕采集只抓取 capture 指定的范围；只有输出尺寸与采集尺寸不同时才加缩放滤镜，
+    窗口模式的实际尺寸在开始抓取时才确定，总是加滤镜把宽高变为偶数。
+    编码进度以 key=value 的形式输出到 stdout（-progress pipe:1），供 FfmpegProgressReader 解析。
+    指定 segment_seconds 时使用 segment muxer，output 为带 %03d 的文件名模板；
+    在每个分段边界强制插入关键帧，保证切分点与事件日志的轮转边界一致。
+    """
+    cmd = [
+        ffmpeg_path,
+        '-y',
+        '-nostats',
+        '-progress', 'pipe:1',
+        *grabber_input_args(capture, profile["framerate"]),
+        *audio_input_args(audio_device),
+    ]
+    if capture["mode"] == CAPTURE_WINDOW:
+        cmd += ['-vf', even_size_filter(capture, output_size)]
+    elif output_size and tuple(output_size) != capture_size(capture):
+        cmd += ['-vf', f'scale={output_size[0]}:{output_size[1]}']
+    cmd += [
+        *video_encoder_args(profile),
+        *audio_encoder_args(profile),
+    ]
+    if segment_seconds:
+        cmd += [
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+            '-f', 'segment',
+            '-segment_time', str(segment_seconds),
+            '-reset_timestamps', '1',
+            '-segment_list', segment_list,
+            '-segment_list_type', 'csv',
+        ]
+    cmd.append(output)
+    return cmd
+
+
+def _suspend_process(proc):
+    if sys.platform == "win32":
+        import ctypes
+        PROCESS_SUSPEND_RESUME = 0x0800
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_SUSPEND_RESUME, False, proc.pid)
+        try:
+            ctypes.windll.ntdll.NtSuspendProcess(handle)
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    else:
+        os.kill(proc.pid, signal.SIGSTOP)
+
+
+def _resume_process(proc):
+    if sys.platform == "win32":
+        import ctypes
+        PROCESS_SUSPEND_RESUME = 0x0800
+        handle = ctypes.windll.kernel32.OpenProcess(PROCESS_SUSPEND_RESUME, False, proc.pid)
+        try:
+            ctypes.windll.ntdll.NtResumeProcess(handle)
+        finally:
+            ctypes.windll.kernel32.CloseHandle(handle)
+    else:
+        os.kill(proc.pid, signal.SIGCONT)
+
+
+def _key_name(key):
+    try:
+        return key.char
+    except AttributeError:
+        return str(key)
+
+
+class RecordingSession:
+    """
+    一次录制会话：持有 ffmpeg 进程、键鼠监听器、事件写入器和会话时钟。
+    start() 启动全部组件，stop() 按顺序停止并回收它们（监听器 stop + join、ffmpeg 退出、写线程排空），
+    因此同一进程内可以反复创建会话而不会残留钩子或线程。也可以作为上下文管理器使用：
+
+        with RecordingSession(...) as session:
+            ...
+    """
+
+    def __init__(self, ffmpeg_path, output_dir, base_name, audio_device, screen_size, output_size, capture=None,
+                 encoder_profile=DEFAULT_PROFILE, event_format="jsonl", move_sampling=SAMPLING_RAW, segment_minutes=None):
+        # 参数不合法时在这里抛出 ValueError，不会启动任何组件
+        self.encoder_profile = encoder_profile
+        self.profile = get_profile(encoder_profile)
+        framerate = self.profile["framerate"]
+        self.move_rate = parse_move_sampling(move_sampling, framerate)
+        self.move_sampling = move_sampling if self.move_rate else SAMPLING_RAW
+        self.ffmpeg_path = ffmpeg_path
+        self.audio_device = audio_device
+        self.screen_size = tuple(screen_size)
+        # output_size 为 None 时保持采集尺寸，不缩放
+        self.output_size = tuple(output_size) if output_size else None
+        self.capture = capture or desktop_capture(self.screen_size)
+        grabber_input_args(self.capture, framerate)  # 录制范围不完整（如 Linux 窗口模式缺少 window_id）时在这里报错
+        self.framerate = framerate
+        self.event_format = event_format
+
+        # 分段录制：视频与事件日志按相同的边界切成 N 分钟一段，并维护一个清单
+        self.segment_seconds = segment_minutes * 60 if segment_minutes else None
+        if self.segment_seconds is not None and self.segment_seconds * framerate < 1:
+            raise ValueError(f"分段时长过短: {segment_minutes} 分钟")
+
+        event_suffix = BINARY_SUFFIX if event_format == "binary" else ".jsonl"
+        self.base_name = base_name
+        if self.segment_seconds:
+            self.video_filename = os.path.join(output_dir, f"{base_name}_%03d.mp4")
+            self.event_filename = os.path.join(output_dir, f"{base_name}_%03d{event_suffix}")
+            self.manifest_filename = os.path.join(output_dir, f"{base_name}.manifest.json")
+            self.segment_list_filename = os.path.join(output_dir, f"{base_name}.segments.csv")
+        else:
+            self.video_filename = os.path.join(output_dir, f"{base_name}.mp4")
+            self.event_filename = os.path.join(output_dir, f"{base_name}{event_suffix}")
+            self.manifest_filename = self.segment_list_filename = None
+        self.session_filename = os.path.join(output_dir, f"{base_name}.session.json")
+        self.metrics_filename = os.path.join(output_dir, f"{base_name}.metrics.json")
+        self.overhead_filename = os.path.join(output_dir, f"{base_name}.overhead.csv")
+
+        self.state = STATE_IDLE
+        self.clock = None
+        self.ffmpeg_process = None
+        self.writer = None
+        self.coalescer = None
+        self.manifest = None
+        self.overhead = None
+        self.pauses = []          # [[开始, 结束], ...]，单位为会话时钟秒数
+        self.summary = {}
+        self._stderr_reader = None
+        self._progress_reader = None
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    # --- 生命周期 ---
+    def start(self):
+        if self.state != STATE_IDLE:
+            raise RuntimeError(f"会话状态为 {self.state}，不能重复启动")
+
+        # 删除同名文件（分段模式下删除同名的清单，旧分段文件会被逐个覆盖）
+        for f in [self.video_filename, self.event_filename, self.session_filename, self.metrics_filename,
+                  self.overhead_filename, self.manifest_filename, self.segment_list_filename]:
+            if f and os.path.exists(f):
+                os.remove(f)
+
+        cmd = build_ffmpeg_cmd(self.ffmpeg_path, self.video_filename, self.capture, self.output_size,
+                               self.audio_device, self.profile,
+                               segment_seconds=self.segment_seconds, segment_list=self.segment_list_filename)
+        if self.segment_seconds:
+            self.manifest = SegmentManifest(self.manifest_filename, self.segment_seconds, self.framerate,
+                                            self.segment_video_path, self.segment_event_path)
+        # 时钟零点紧贴 ffmpeg 启动；stderr 中的首帧时间用于确定视频帧对齐
+        self.clock = SessionClock(self.framerate)
+        self.ffmpeg_process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            self._start_components()
+        except BaseException:
+            self._abort_start()
+            raise
+        self.state = STATE_RECORDING
+        return self
+
+    def _start_components(self):
+        # 录制器自身与 ffmpeg 的资源占用（未安装 psutil 时不采样）
+        self.overhead = OverheadMonitor({"recorder": os.getpid(), "ffmpeg": self.ffmpeg_process.pid},
+                                        self.overhead_filename, self.clock).start()
+        if self.segment_seconds:
+            self.writer = EventWriter(None, fmt=self.event_format, clock=self.clock,
+                                      segment_frames=round(self.segment_seconds * self.framerate),
+                                      segment_path=self.segment_event_path,
+                                      on_rotate=self.manifest.events_done).start()
+        else:
+            self.writer = EventWriter(self.event_filename, fmt=self.event_format, clock=self.clock).start()
+        # per-frame 模式下先以 ffmpeg 启动时刻作为帧边界的起点，首帧时间确定后再对齐
+        self.coalescer = MouseMoveCoalescer(self.writer.put, self.move_rate) if self.move_rate else None
+        # 输出读取线程最后启动：其回调（写会话头部、对齐 coalescer）用到上面创建的各个组件
+        self._progress_reader = FfmpegProgressReader(self.ffmpeg_process.stdout).start()
+        self._stderr_reader = FfmpegStderrReader(
+            self.ffmpeg_process.stderr, on_input_start=self._on_input_start,
+            on_segment_opened=self._on_segment_opened if self.manifest else None).start()
+
+        self._listeners = [
+            keyboard.Listener(on_press=self._on_key_press, on_release=self._on_key_release),
+            mouse.Listener(on_click=self._on_click, on_move=self._on_move),
+        ]
+        for listener in self._listeners:
+            listener.daemon = True
+            listener.start()
+
+    def _abort_start(self):
+        """start() 中途失败：结束 ffmpeg，停止已启动的监听器和线程，会话置为 STATE_STOPPED，不能再启动。"""
+        self.state = STATE_STOPPED
+        for listener in self._listeners:
+            if listener.is_alive():
+                listener.stop()
+                listener.join()
+        self._listeners = []
+        self.ffmpeg_process.kill()
+        self.ffmpeg_process.wait()
+        # ffmpeg 退出后管道关闭，读取线程随之结束
+        for reader in (self._progress_reader, self._stderr_reader):
+            if reader is not None:
+                reader.join()
+        if self.overhead is not None:
+            self.overhead.stop()
+        if self.writer is not None:
+            self.writer.close()
+
+    def pause(self):
+        """暂停：丢弃键鼠事件并挂起 ffmpeg。恢复后视频会以静止画面补齐暂停期间的帧，帧号对齐不受影响。"""
+        with self._lock:
+            if self.state != STATE_RECORDING:
+                return
+            self.state = STATE_PAUSED
+        if self.coalescer:
+            self.coalescer.flush()
+        self.pauses.append([self.clock.now(), None])
+        _suspend_process(self.ffmpeg_process)
+
+    def resume(self):
+        with self._lock:
+            if self.state != STATE_PAUSED:
+                return
+            self.state = STATE_RECORDING
+        _resume_process(self.ffmpeg_process)
+        self.pauses[-1][1] = self.clock.now()
+
+    def stop(self):
+        """停止全部组件并返回统计信息。可以重复调用。"""
+        with self._lock:
+            if self.state in (STATE_IDLE, STATE_STOPPED):
+                return self.summary
+            was_paused = self.state == STATE_PAUSED
+            self.state = STATE_STOPPED
+
+        # 1. 先卸载键鼠钩子，之后不会再有新事件
+        for listener in self._listeners:
+            listener.stop()
+        for listener in self._listeners:
+            listener.join()
+        self._listeners = []
+        if was_paused:
+            _resume_process(self.ffmpeg_process)
+            self.pauses[-1][1] = self.clock.now()
+
+        # 2. 停止资源采样（只统计录制期间），再通知 ffmpeg 收尾
+        self.overhead.stop()
+        try:
+            self.ffmpeg_process.stdin.write(b'q')
+            self.ffmpeg_process.stdin.flush()
+            self.ffmpeg_process.wait(FFMPEG_STOP_TIMEOUT)
+        except Exception as e:
+            print("关闭 ffmpeg 失败:", e)
+            self.ffmpeg_process.kill()
+            self.ffmpeg_process.wait()
+        self._stderr_reader.join()
+        self._progress_reader.join()
+
+        # 3. 写出合并器中最后一条移动，再等待写线程把队列中剩余的事件全部写完
+        if self.coalescer:
+            self.coalescer.flush()
+        self.writer.close()
+
+        self.summary = {
+            "duration": self.clock.now(),
+            "ffmpeg_returncode": self.ffmpeg_process.returncode,
+            "event_stats": self.writer.stats(),
+        }
+        if self.coalescer:
+            self.summary["move_coalescing"] = {"received": self.coalescer.received, "emitted": self.coalescer.emitted}
+        self.summary["encoder"] = self._progress_reader.summary()
+        if self.overhead.available:
+            self.summary["overhead"] = self.overhead.summary()
+        self._progress_reader.write_metrics(self.metrics_filename)
+        if self.manifest:
+            self.manifest.finish(self.segment_list_filename)
+        self.write_header()
+        return self.summary
+
+    @property
+    def progress(self):
+        """ffmpeg 最新一次报告的编码进度（frame / fps / speed / dup_frames / drop_frames / bitrate 等）。"""
+        return self._progress_reader.latest if self._progress_reader else {}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # --- 分段 ---
+    def segment_video_path(self, index):
+        return self.video_filename % index
+
+    def segment_event_path(self, index):
+        return self.event_filename % index
+
+    def _on_segment_opened(self, filename):
+        # segment muxer 开始写第 index 段，之前的视频分段已经完整落盘
+        name = os.path.basename(filename)
+        prefix = f"{self.base_name}_"
+        if name.startswith(prefix) and name.endswith(".mp4"):
+            index = name[len(prefix):-len(".mp4")]
+            if index.isdigit():
+                self.manifest.video_started(int(index))
+
+    # --- 会话头部 ---
+    def header(self):
+        header = {
+            "version": 1,
+            "video": os.path.basename(self.video_filename),
+            "events": os.path.basename(self.event_filename),
+            "encoder_profile": {"name": self.encoder_profile, **self.profile},
+            "event_format": self.event_format,
+            "move_sampling": self.move_sampling,
+            "screen_size": list(self.screen_size),
+            "capture": self.capture,
+            "output_size": list(self.output_size or capture_size(self.capture) or []),
+            "pauses": self.pauses,
+            "metrics": os.path.basename(self.metrics_filename),
+            "overhead": os.path.basename(self.overhead_filename) if OverheadMonitor.available else None,
+            **self.clock.header(),
+        }
+        if self.segment_seconds:
+            header["segment_seconds"] = self.segment_seconds
+            header["manifest"] = os.path.basename(self.manifest_filename)
+        header.update(self.summary)
+        return header
+
+    def write_header(self):
+        """写出会话头部 sidecar：视频/事件文件、录制参数与时钟对齐信息。"""
+        with open(self.session_filename, "w", encoding="utf-8") as f:
+            json.dump(self.header(), f, ensure_ascii=False, indent=2)
+
+    def _on_input_start(self, start):
+        # ffmpeg 报告了屏幕采集首帧的时间戳：确定首帧偏移，per-frame 采样的帧边界随之对齐
+        if self.clock.set_input_start(start):
+            if self.coalescer and self.move_sampling == SAMPLING_PER_FRAME:
+                self.coalescer.origin = self.clock.first_frame_offset
+            self.write_header()
+
+    # --- 键鼠事件回调（运行在 pynput 监听线程中） ---
+    def _on_key_press(self, key):
+        if self.state != STATE_RECORDING:
+            return
+        if self.coalescer:
+            self.coalescer.flush()
+        self.writer.put({"type": "key_press", "key": _key_name(key), "time": self.clock.now()})
+
+    def _on_key_release(self, key):
+        if self.state != STATE_RECORDING:
+            return
+        if self.coalescer:
+            self.coalescer.flush()
+        self.writer.put({"type": "key_release", "key": _key_name(key), "time": self.clock.now()})
+
+    def _on_click(self, x, y, button, pressed):
+        if self.state != STATE_RECORDING:
+            return
+        if self.coalescer:
+            self.coalescer.flush()
+        self.writer.put({
+            "type": "mouse_press" if pressed else "mouse_release",
+            "position": (x, y),
+            "button": str(button),
+            "time": self.clock.now()
+        })
+
+    def _on_move(self, x, y):
+        if self.state != STATE_RECORDING:
+            return
+        if self.coalescer:
+            self.coalescer.push(x, y, self.clock.now())
+            return
+        self.writer.put({
+            "type": "mouse_move",
+            "position": (x, y),
+            "time": self.clock.now()
+        })
@@ -0,0 +1,96 @@
+import csv
+import json
+import os
+import threading
+
+
+class SegmentManifest:
+    """
+    分段录制的清单文件。
+    每个分段对应一个视频文件和一个事件日志文件，二者按相同的时间边界切分
+    （视频时间轴上的 [index * segment_seconds, (index + 1) * segment_seconds)）。
+    视频分段在 ffmpeg 开始写下一段时完成，事件分段在写线程轮转时完成，
+    两者都完成的分段即可开始上传或分析，清单随时反映最新状态。
+    """
+
+    def __init__(self, path, segment_seconds, framerate, video_name, event_name):
+        self.path = path
+        self.segment_seconds = segment_seconds
+        self.framerate = framerate
+        self._video_name = video_name    # index -> 视频文件名
+        self._event_name = event_name    # index -> 事件日志文件名
+        self._chunks = {}
+        self._finished = False
+        self._lock = threading.Lock()
+
+    def _chunk(self, index):
+        chunk = self._chunks.get(index)
+        if chunk is None:
+            frames = round(self.segment_seconds * self.framerate)
+            chunk = {
+                "index": index,
+                "video": os.path.basename(self._video_name(index)),
+                "events": os.path.basename(self._event_name(index)),
+                "start_time": index * self.segment_seconds,
+                "end_time": (index + 1) * self.segment_seconds,
+                "start_frame": index * frames,
+                "end_frame": (index + 1) * frames,
+                "video_complete": False,
+                "events_complete": False,
+                "complete": False,
+            }
+            self._chunks[index] = chunk
+        return chunk
+
+    def _update(self, index, key):
+        with self._lock:
+            chunk = self._chunk(index)
+            chunk[key] = True
+            chunk["complete"] = chunk["video_complete"] and chunk["events_complete"]
+            self._write()
+
+    def video_started(self, index):
+        """ffmpeg 开始写第 index 段，说明之前的视频分段都已写完。"""
+        with self._lock:
+            self._chunk(index)
+            for i in range(index):
+                chunk = self._chunk(i)
+                chunk["video_complete"] = True
+                chunk["complete"] = chunk["events_complete"]
+            self._write()
+
+    def events_done(self, index):
+        self._update(index, "events_complete")
+
+    def finish(self, segment_list=None):
+        """录制结束：所有分段都已完成。若有 ffmpeg 的 segment_list，用其中的实际起止时间修正各段的时间和帧范围。"""
+        with self._lock:
+            if segment_list and os.path.exists(segment_list):
+                with open(segment_list, newline="", encoding="utf-8") as f:
+                    for row in csv.reader(f):
+                        if len(row) < 3:
+                            continue
+                        name, start, end = row[0], float(row[1]), float(row[2])
+                        for chunk in self._chunks.values():
+                            if chunk["video"] == os.path.basename(name):
+                                chunk["start_time"], chunk["end_time"] = start, end
+                                chunk["start_frame"] = round(start * self.framerate)
+                                chunk["end_frame"] = round(end * self.framerate)
+            for chunk in self._chunks.values():
+                chunk["video_complete"] = chunk["events_complete"] = chunk["complete"] = True
+            self._finished = True
+            self._write()
+
+    def _write(self):
+        manifest = {
+            "version": 1,
+            "segment_seconds": self.segment_seconds,
+            "framerate": self.framerate,
+            "finished": self._finished,
+            "segments": [self._chunks[i] for i in sorted(self._chunks)],
+        }
+        # 先写临时文件再替换，读取方不会看到写了一半的清单
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
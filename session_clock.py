@@ -0,0 +1,85 @@
+import math
+import threading
+import time
+
+_NS_PER_SEC = 1_000_000_000
+
+# 首帧时间与 ffmpeg 启动时刻之间的合理范围（秒），超出则认为解析结果不可信
+_FIRST_FRAME_MIN_OFFSET = -1.0
+_FIRST_FRAME_MAX_OFFSET = 30.0
+
+
+class SessionClock:
+    """
+    录制会话的单调时钟。
+    以 ffmpeg 启动时刻为零点，用 perf_counter_ns 计时，不受系统时间调整影响；
+    同时记录启动时刻的墙上时间，需要绝对时间时可以换算。
+    ffmpeg 报告首帧时间后，frame_index() 把事件时间换算成视频帧号。
+    """
+
+    def __init__(self, framerate):
+        self.framerate = framerate
+        self.origin_ns = time.perf_counter_ns()
+        self.wall_origin = time.time()
+        self.first_frame_offset_ns = 0
+        self.first_frame_source = None   # "wallclock" / "monotonic" / "spawn"
+        self._ready = threading.Event()
+
+    def now_ns(self):
+        """距 ffmpeg 启动的纳秒数。"""
+        return time.perf_counter_ns() - self.origin_ns
+
+    def now(self):
+        """距 ffmpeg 启动的秒数，由整数纳秒换算，可无损转回纳秒。"""
+        return (time.perf_counter_ns() - self.origin_ns) / _NS_PER_SEC
+
+    @property
+    def first_frame_offset(self):
+        return self.first_frame_offset_ns / _NS_PER_SEC
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def set_input_start(self, start):
+        """
+        根据 ffmpeg 打印的输入流 start 时间确定首帧偏移。
+        gdigrab/x11grab 在不同版本中分别使用墙上时间或单调时间作为时间戳，
+        两种解释都试一下，取落在合理范围内的那个。返回是否成功。
+        """
+        if self.ready:
+            return True
+        candidates = [
+            ("wallclock", start - self.wall_origin),
+            ("monotonic", start - self.origin_ns / _NS_PER_SEC),
+        ]
+        for source, offset in candidates:
+            if _FIRST_FRAME_MIN_OFFSET <= offset <= _FIRST_FRAME_MAX_OFFSET:
+                self.first_frame_offset_ns = round(offset * _NS_PER_SEC)
+                self.first_frame_source = source
+                self._ready.set()
+                return True
+        return False
+
+    def wait_ready(self, timeout):
+        """等待首帧偏移确定；超时则退回以 ffmpeg 启动时刻作为首帧。"""
+        if not self._ready.wait(timeout):
+            self.first_frame_source = "spawn"
+            self._ready.set()
+        return self.first_frame_offset_ns
+
+    def frame_index(self, t):
+        """事件时间（秒）对应的视频帧号；首帧之前的事件为负数。"""
+        return math.floor((t - self.first_frame_offset) * self.framerate)
+
+    def header(self):
+        """写入会话头部的时钟信息。"""
+        return {
+            "clock": "perf_counter_ns",
+            "time_unit": "seconds since ffmpeg spawn",
+            "framerate": self.framerate,
+            "ffmpeg_spawn_wall_time": self.wall_origin,
+            "ffmpeg_spawn_perf_counter_ns": self.origin_ns,
+            "first_frame_offset_ns": self.first_frame_offset_ns,
+            "first_frame_source": self.first_frame_source,
+        }